@@ -1,6 +1,7 @@
 # Server-side script to perform linear regression on the given data.
 from pathlib import Path
 from simplefhe import initialize, load_public_key, load_relin_keys, load_encrypted_value
+from simplefhe.checkpoint import Checkpointer
 
 ##### Initialization and keys ####
 initialize('float')
@@ -39,9 +40,11 @@ class LinearRegression:
 
 
 #### Process the client's encrypted data ####
-regression = LinearRegression(3)
+# Progress is checkpointed every 10 datapoints.
+# If this script is interrupted, rerunning it resumes where it left off.
+checkpointer = Checkpointer('regression.ckpt', lambda: LinearRegression(3), every=10)
 N_DATAPOINTS = 50
-for i in range(N_DATAPOINTS):
+for i in range(checkpointer.position, N_DATAPOINTS):
     # Load the ith datapoint
     xs = []
     y = load_encrypted_value(f'inputs/y-{i}.dat')
@@ -49,10 +52,11 @@ for i in range(N_DATAPOINTS):
         xs.append(load_encrypted_value(f'inputs/x{j}-{i}.dat'))
 
     # Update regression
-    regression.update(xs, y)
+    checkpointer.update(xs, y)
     print(f'Procesed datapoint {i+1} of {N_DATAPOINTS}')
+checkpointer.save()
 
 # Dump regression coefficients
-coefficients = regression.dump()
+coefficients = checkpointer.state.dump()
 for name, value in coefficients.items():
     value.save(f'outputs/{name}.dat')
@@ -1,4 +1,5 @@
 #!/bin/bash
+rm -f regression.ckpt
 python3 1_keygen.py
 python3 2_generate.py
 python3 3_process.py
@@ -23,7 +23,8 @@ setup(
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.9",
     ],
-    packages=["simplefhe"],
+    packages=["simplefhe", "simplefhe.backends"],
+    install_requires=["numpy"],
     include_package_data=True,
 )
 
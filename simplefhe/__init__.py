@@ -1,135 +1,299 @@
 import sys
-from typing import Tuple, Optional
+import hashlib
+from typing import Tuple, Optional, Dict, Iterable, List
 import types
 
-try:
-    from seal import *
-except ModuleNotFoundError:
-    raise ModuleNotFoundError('simplefhe depends on the SEAL-Python library. See https://github.com/Huelse/SEAL-Python for installation instructions.')
 
-
-PrivateKey = SecretKey
+# The module implementing the encryption primitives (see `simplefhe.backends`)
+_backend = None
 
 _keygen = None
-_public_key: Optional[PublicKey] = None
-_private_key: Optional[PrivateKey] = None
-_relin_keys: Optional[RelinKeys] = None
+_public_key: Optional['PublicKey'] = None
+_private_key: Optional['PrivateKey'] = None
+_relin_keys: Optional['RelinKeys'] = None
+_galois_keys: Optional['GaloisKeys'] = None
+# Rotations included in the Galois keys
+_galois_steps: Optional[List[int]] = None
 
 _mode = None
 _context = None
 
+# Every context initialized in this process, keyed by fingerprint.
+# Used to rebind unpickled values to a matching context.
+_contexts: Dict[str, dict] = {}
+
 _encryptor = None
 _decryptor = None
 _evaluator = None
 
 
+def __getattr__(name: str):
+    """Exposes the types of the current backend, e.g. `simplefhe.Ciphertext`."""
+    if name == 'PrivateKey':
+        name = 'SecretKey'
+    if _backend is not None and not name.startswith('_'):
+        try:
+            return getattr(_backend, name)
+        except AttributeError:
+            pass
+    raise AttributeError(f"module 'simplefhe' has no attribute '{name}'")
+
+
+
+def _is_key(key, key_type: str) -> bool:
+    """Checks that the given key is of the right type for the current mode."""
+    key_type = getattr(_backend, key_type)
+    if _mode['type'] == 'crt':
+        return isinstance(key, crt.CRTKey) and isinstance(key.keys[0], key_type)
+    return isinstance(key, key_type)
 
-def set_public_key(key: PublicKey) -> None:
-    assert key is None or isinstance(key, PublicKey)
+
+def set_public_key(key: 'PublicKey') -> None:
+    assert key is None or _is_key(key, 'PublicKey')
     global _public_key, _encryptor
     _public_key = key
     if key is None:
         _encryptor = None
+    elif _mode['type'] == 'crt':
+        _encryptor = crt.make_residues(_backend.Encryptor, key)
     else:
-        _encryptor = Encryptor(_context, key)
+        _encryptor = _backend.Encryptor(_context, key)
 
 
-def set_private_key(key: PrivateKey) -> None:
-    assert key is None or isinstance(key, PrivateKey)
+def set_private_key(key: 'PrivateKey') -> None:
+    assert key is None or _is_key(key, 'SecretKey')
     global _private_key, _decryptor
     _private_key = key
     if key is None:
         _decryptor = None
+    elif _mode['type'] == 'crt':
+        _decryptor = crt.make_residues(_backend.Decryptor, key)
     else:
-        _decryptor = Decryptor(_context, key)
+        _decryptor = _backend.Decryptor(_context, key)
 
-def set_relin_keys(key: RelinKeys) -> None:
-    assert key is None or isinstance(key, RelinKeys)
+def set_relin_keys(key: 'RelinKeys') -> None:
+    assert key is None or _is_key(key, 'RelinKeys')
     global _relin_keys
     _relin_keys = key
 
 
+def set_galois_keys(key: 'GaloisKeys') -> None:
+    assert key is None or _is_key(key, 'GaloisKeys')
+    global _galois_keys, _galois_steps
+    _galois_keys = key
+    _galois_steps = None if key is None else galois.rotation_steps(key)
+
+
+def _read_key(kind: str, filepath: str):
+    with open(filepath, 'rb') as f:
+        return load_key(_mode, kind, f.read())
+
+
 def load_public_key(filepath: str) -> None:
-    key = PublicKey()
-    key.load(_context, filepath)
-    set_public_key(key)
+    set_public_key(_read_key('PublicKey', filepath))
 
 
 def load_private_key(filepath: str) -> None:
-    key = PrivateKey()
-    key.load(_context, filepath)
-    set_private_key(key)
+    set_private_key(_read_key('SecretKey', filepath))
 
 def load_relin_keys(filepath: str) -> None:
-    key = RelinKeys()
-    key.load(_context, filepath)
-    set_relin_keys(key)
+    set_relin_keys(_read_key('RelinKeys', filepath))
+
+def load_galois_keys(filepath: str) -> None:
+    set_galois_keys(_read_key('GaloisKeys', filepath))
 
 
 def initialize(
     mode: str = 'float',
     max_int: int = 262144,
     poly_modulus_degree: int = 8192,
+    backend: Optional[str] = None,
+    depth: int = 2,
 ) -> None:
     """
     Re-initializes the FHE encryption context.
     This must be done before any other operations are performed.
 
     :param mode:
-        Must be `int` or `float`.
+        Must be `int`, `crt` or `float`.
+        `crt` is an integer mode which splits each value into residues
+        modulo several small primes, allowing a much larger `max_int`.
 
     :param max_int:
         Only integers in the range [-max_int + 1, max_int] inclusive
-        are representable. If `mode != 'int'`, this option is ignored.
+        are representable. If `mode` is `float`, this option is ignored.
 
     :param poly_modulus_degree:
         Should be a power of 2. Higher values will allow more computation
         before the noise budget is exhausted, at the cost of performance.
+
+    :param backend:
+        `seal`, or `simulation` for fast (insecure) plaintext simulation
+        during development. Defaults to the `SIMPLEFHE_BACKEND`
+        environment variable, or `seal` if unset.
+
+    :param depth:
+        Only used in `float` mode. The number of multiplications
+        a value can go through (each uses one level of the modulus chain).
+        Larger depths require a larger `poly_modulus_degree`
+        (e.g. 16384 allows up to 7).
     """
-    if mode not in ['int', 'float']:
-        raise ValueError("mode must be 'int' or 'float'")
+    if mode not in ['int', 'crt', 'float']:
+        raise ValueError("mode must be 'int', 'crt' or 'float'")
+
+    global _context, _evaluator, _mode, _keygen, _backend
+    if backend is None:
+        backend = backends.default_backend()
+    _backend = backends.load_backend(backend)
+
+    params = {
+        'mode': mode,
+        'max_int': max_int,
+        'poly_modulus_degree': poly_modulus_degree,
+        'backend': backend,
+    }
+    if mode == 'float':
+        del params['max_int']
+        params['depth'] = depth
 
     if mode == 'int':
-        parms = EncryptionParameters(scheme_type.bfv)
+        parms = _backend.EncryptionParameters(_backend.scheme_type.bfv)
         parms.set_poly_modulus_degree(poly_modulus_degree)
-        parms.set_coeff_modulus(CoeffModulus.BFVDefault(poly_modulus_degree))
+        parms.set_coeff_modulus(_backend.CoeffModulus.BFVDefault(poly_modulus_degree))
         parms.set_plain_modulus(2 * max_int)
-    else:
-        parms = EncryptionParameters(scheme_type.ckks)
+    elif mode == 'float':
+        parms = _backend.EncryptionParameters(_backend.scheme_type.ckks)
         parms.set_poly_modulus_degree(poly_modulus_degree)
-        parms.set_coeff_modulus(CoeffModulus.Create(
-            poly_modulus_degree, [60, 40, 40, 60]
-        ))
+        bit_sizes = [60] + [40] * depth + [60]
+        max_depth = (_backend.CoeffModulus.MaxBitCount(poly_modulus_degree) - 120) // 40
+        if not 1 <= depth <= max_depth:
+            raise ValueError(
+                f'depth must be between 1 and {max_depth} for poly_modulus_degree {poly_modulus_degree}.'
+                + ' Try increasing `poly_modulus_degree`.'
+            )
+        parms.set_coeff_modulus(_backend.CoeffModulus.Create(poly_modulus_degree, bit_sizes))
 
 
     # Initialize new context
-    global _context, _evaluator, _mode
-    _context = SEALContext(parms)
-    _evaluator = Evaluator(_context)
-    _mode = {'type': mode}
+    _keygen = None
+    if mode == 'crt':
+        components = crt.create_components(max_int, poly_modulus_degree)
+        _context = None
+        _evaluator = crt.Residues(c['evaluator'] for c in components)
+    else:
+        _context = _backend.SEALContext(parms)
+        _evaluator = _backend.Evaluator(_context)
+    _mode = {
+        'type': mode,
+        'params': params,
+        'fingerprint': _fingerprint(params),
+        'context': _context,
+        'backend': _backend,
+    }
+    _contexts[_mode['fingerprint']] = _mode
     set_public_key(None)
     set_private_key(None)
     set_relin_keys(None)
+    set_galois_keys(None)
 
     if mode == 'int':
         _mode['modulus'] = 2 * max_int
+    elif mode == 'crt':
+        _mode['components'] = components
+        _mode['modulus'] = 1
+        for component in components:
+            _mode['modulus'] *= component['modulus']
+        _mode['slots'] = poly_modulus_degree // 2
     else:
-        _mode['encoder'] = CKKSEncoder(_context)
+        _mode['encoder'] = _backend.CKKSEncoder(_context)
         _mode['default_scale'] = pow(2.0, 40)
+        _mode['slots'] = poly_modulus_degree // 2
+        _mode['depth'] = depth
+
 
+def _fingerprint(params: dict) -> str:
+    """Returns a short identifier for the given initialization parameters."""
+    description = repr(sorted(params.items())).encode()
+    return hashlib.sha256(description).hexdigest()[:16]
 
-def generate_keypair() -> Tuple[PublicKey, PrivateKey, RelinKeys]:
+
+def generate_keypair(rotations: Optional[Iterable[int]] = None) -> tuple:
     """
     Returns a random keyset (public, private, relin).
+
+    :param rotations:
+        Optional. If given, Galois keys for exactly these rotation steps
+        are also generated, and the keyset is (public, private, relin, galois).
+        See `generate_galois_keys`.
     """
     global _keygen
-    _keygen = KeyGenerator(_context)
-    public_key = PublicKey()
-    relin_keys = RelinKeys()
-    secret_key = _keygen.secret_key()
+    if _mode['type'] == 'crt':
+        keysets = []
+        _keygen = []
+        for component in _mode['components']:
+            _keygen.append(_backend.KeyGenerator(component['context']))
+            keysets.append(_create_keys(_keygen[-1]))
+        keyset = tuple(crt.CRTKey(keys) for keys in zip(*keysets))
+    else:
+        _keygen = _backend.KeyGenerator(_context)
+        keyset = _create_keys(_keygen)
+
+    if rotations is not None:
+        keyset += (generate_galois_keys(rotations),)
+    return keyset
 
-    _keygen.create_public_key(public_key)
-    _keygen.create_relin_keys(relin_keys)
+
+def generate_galois_keys(steps: Optional[Iterable[int]] = None) -> 'GaloisKeys':
+    """
+    Returns Galois keys, which are needed to rotate packed values.
+    Must be called after `generate_keypair`, or once the private key is set.
+    Packed values are only supported in `float` and `crt` mode.
+
+    :param steps:
+        Optional. The rotations to generate keys for, e.g. as recorded
+        by `simplefhe.galois.trace_rotations`. This is much smaller and
+        faster than the default, which covers every power of two
+        (other rotations are composed from those).
+    """
+    global _keygen
+    if _mode['type'] == 'int':
+        raise ValueError('Galois keys require `float` or `crt` mode.')
+
+    if _keygen is None:
+        if _private_key is None:
+            raise ValueError('Private key has not been set. Galois key generation not possible.')
+        if _mode['type'] == 'crt':
+            _keygen = [
+                _backend.KeyGenerator(component['context'], key)
+                for component, key in zip(_mode['components'], _private_key.keys)
+            ]
+        else:
+            _keygen = _backend.KeyGenerator(_context, _private_key)
+
+    def create(keygen):
+        if steps is None:
+            return keygen.create_galois_keys()
+        keys = _backend.GaloisKeys()
+        keygen.create_galois_keys(steps, keys)
+        return keys
+
+    if steps is not None:
+        # Validate, and drop duplicates
+        n = _mode['params']['poly_modulus_degree']
+        steps = sorted({galois.galois_element(s, n): s for s in steps}.values())
+
+    if _mode['type'] == 'crt':
+        return crt.CRTKey(create(keygen) for keygen in _keygen)
+    return create(_keygen)
+
+
+def _create_keys(keygen) -> Tuple['PublicKey', 'PrivateKey', 'RelinKeys']:
+    public_key = _backend.PublicKey()
+    relin_keys = _backend.RelinKeys()
+    secret_key = keygen.secret_key()
+
+    keygen.create_public_key(public_key)
+    keygen.create_relin_keys(relin_keys)
 
     return (public_key, secret_key, relin_keys)
 
@@ -137,27 +301,76 @@ def generate_keypair() -> Tuple[PublicKey, PrivateKey, RelinKeys]:
 def display_config() -> None:
     """Displays the current config to STDOUT."""
     print('===== simplefhe config =====' )
-    int_mode = (_mode['type'] == 'int')
+    int_mode = (_mode['type'] in ['int', 'crt'])
 
     if int_mode:
         modulus = _mode['modulus']
-        print('mode: integer (exact)')
+        if _mode['type'] == 'crt':
+            residues = len(_mode['components'])
+            print(f'mode: integer (exact, {residues} CRT residues)')
+        else:
+            print('mode: integer (exact)')
         print(f'min_int: {-modulus//2 + 1}')
         print(f'max_int: {modulus//2}')
     else:
         print('mode: float (approximate)')
+    if _mode['params']['backend'] != 'seal':
+        print(f"backend: {_mode['params']['backend']}")
 
     is_initialized = lambda key: 'missing' if key is None else 'initialized'
 
     print(f'public_key: {is_initialized(_public_key)}')
     print(f'private_key: {is_initialized(_private_key)}')
     print(f'relin_keys: {is_initialized(_relin_keys)}')
+    if _mode['type'] != 'int':
+        if _galois_keys is None:
+            print('galois_keys: missing')
+        else:
+            print(f'galois_keys: initialized ({len(_galois_steps)} rotations)')
     print()
 
 
 
+def export_context() -> dict:
+    """
+    Returns a picklable snapshot of the current initialization
+    parameters and keys.
+
+    Pass the result to `import_context` in another process
+    (e.g. as a `multiprocessing` pool initializer) to recreate
+    an identical context there.
+    """
+    def dump(key): return None if key is None else key.to_string()
+
+    return {
+        'params': dict(_mode['params']),
+        'public_key': dump(_public_key),
+        'private_key': dump(_private_key),
+        'relin_keys': dump(_relin_keys),
+        'galois_keys': dump(_galois_keys),
+    }
+
+
+def import_context(state: dict) -> None:
+    """Re-initializes the context and keys from the output of `export_context`."""
+    initialize(**state['params'])
+
+    def load(data, kind):
+        return None if data is None else load_key(_mode, kind, data)
+
+    set_public_key(load(state['public_key'], 'PublicKey'))
+    set_private_key(load(state['private_key'], 'SecretKey'))
+    set_relin_keys(load(state['relin_keys'], 'RelinKeys'))
+    set_galois_keys(load(state['galois_keys'], 'GaloisKeys'))
+
+
+
+from simplefhe import backends, crt, galois
+from simplefhe.serialization import load_key
+
 initialize('int')
 
 from simplefhe.encryptors import encrypt
 from simplefhe.decryptors import decrypt
 from simplefhe.datatypes import load_encrypted_value
+from simplefhe.arrays import EncryptedArray, encrypt_array
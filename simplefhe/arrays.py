@@ -0,0 +1,537 @@
+"""
+NumPy-compatible encrypted arrays.
+
+An `EncryptedArray` packs a 1-D or 2-D array into the slots of as few
+ciphertexts ("chunks") as possible. NumPy ufuncs (`add`, `subtract`,
+`multiply`, `negative`, `matmul`) and functions (`sum`, `mean`, `dot`)
+dispatch to packed kernels operating on whole chunks, so that existing
+NumPy-style code runs unchanged:
+
+    x = encrypt_array([1.0, 2.0, 3.0])
+    W = np.array([[1.0, 0.0, 2.0], [0.5, 0.5, 0.5]])
+    y = W @ x + 1            # a single plaintext product and a few rotations
+    decrypt(np.sum(x * x))   # 14.0
+
+Layout: element i of a 1-D array lives in slot i * stride.
+Element (i, j) of a 2-D array lives in slot i * row_stride + j * stride,
+where row_stride is a power of two, so that rows can be summed with
+a logarithmic number of rotations. Results of reductions are strided.
+Elementwise operations between encrypted 1-D arrays with different
+layouts, and broadcasting of encrypted rows (shape (n,) or (1, n)) and
+columns (shape (m, 1)) over a 2-D array, lay out the smaller operand
+like the larger one first, using a level.
+
+Products of two matrices are computed one column at a time, using one
+more level than matrix-vector products, and another if the right
+operand is encrypted.
+
+Packed arrays are only supported in `float` and `crt` mode.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+import simplefhe
+from simplefhe.datatypes import EncryptedValue
+
+
+class EncryptedArray(NDArrayOperatorsMixin):
+    def __init__(
+        self,
+        chunks: List[EncryptedValue],
+        shape: Tuple[int, ...],
+        stride: int = 1,
+        row_stride: Optional[int] = None,
+        clean: bool = True,
+    ):
+        """
+        :param clean:
+            Whether all slots not holding an element are known to be zero.
+            Reductions require clean inputs; dirty arrays are masked first.
+        """
+        if len(shape) not in [1, 2]:
+            raise ValueError('Only 1-D and 2-D encrypted arrays are supported.')
+        self.chunks = chunks
+        self.shape = tuple(shape)
+        self.stride = stride
+        self.row_stride = row_stride
+        self._clean = clean
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self):
+        return f'<encrypted array shape={self.shape}>'
+
+
+    # Layout
+    def _layout(self) -> Tuple[int, np.ndarray]:
+        """
+        Returns the number of elements (1-D) or rows (2-D) per chunk,
+        and the slot offset of each element within its chunk (for the
+        first chunk; all chunks share the same offsets).
+        """
+        slots = simplefhe._mode['slots']
+        if self.ndim == 1:
+            per_chunk = slots // self.stride
+            offsets = np.arange(min(per_chunk, self.shape[0])) * self.stride
+        else:
+            per_chunk = slots // self.row_stride
+            rows = np.arange(min(per_chunk, self.shape[0]))[:, None]
+            cols = np.arange(self.shape[1])[None, :]
+            offsets = rows * self.row_stride + cols * self.stride
+        return per_chunk, offsets
+
+    def _pack(self, values) -> List[list]:
+        """Lays out a plaintext array of this shape into per-chunk slot lists."""
+        values = np.broadcast_to(np.asarray(values), self.shape)
+        per_chunk, offsets = self._layout()
+        output = []
+        for c in range(len(self.chunks)):
+            block = values[c * per_chunk:(c + 1) * per_chunk]
+            positions = offsets[:len(block)]
+            slots = np.zeros(positions.max() + 1, dtype=values.dtype)
+            slots[positions] = block
+            output.append(slots.tolist())
+        return output
+
+    def _unpack(self, chunk_values: List[list]) -> np.ndarray:
+        per_chunk, offsets = self._layout()
+        blocks = []
+        for c, values in enumerate(chunk_values):
+            rows = min(per_chunk, self.shape[0] - c * per_chunk)
+            blocks.append(np.asarray(values, dtype=object)[offsets[:rows]])
+        output = np.concatenate(blocks)
+        if simplefhe._mode['type'] == 'float':
+            output = output.astype(float)
+        return output
+
+    def _lengths(self) -> List[int]:
+        """Returns the number of slots each chunk needs to hold its elements."""
+        per_chunk, offsets = self._layout()
+        return [
+            int(offsets[:min(per_chunk, self.shape[0] - c * per_chunk)].max()) + 1
+            for c in range(len(self.chunks))
+        ]
+
+    def _sized(self) -> 'EncryptedArray':
+        """Returns this array, with the packed length of each chunk covering its elements."""
+        chunks = [EncryptedValue(c, length) for c, length in zip(self.chunks, self._lengths())]
+        return self._with_chunks(chunks, self._clean)
+
+    def _with_chunks(self, chunks, clean: bool) -> 'EncryptedArray':
+        return EncryptedArray(chunks, self.shape, self.stride, self.row_stride, clean)
+
+    def _same_layout(self, other: 'EncryptedArray') -> bool:
+        return (
+            self.shape == other.shape
+            and self.stride == other.stride
+            and (self.ndim == 1 or self.row_stride == other.row_stride)
+        )
+
+    def cleaned(self) -> 'EncryptedArray':
+        """Returns this array with all non-element slots zeroed."""
+        if self._clean:
+            return self
+        masks = self._pack(np.ones(self.shape, dtype=int))
+        return self._with_chunks([c * m for c, m in zip(self.chunks, masks)], True)
+
+
+    def decrypt(self) -> np.ndarray:
+        """Decrypts this array (client-side)."""
+        return self._unpack([simplefhe.decrypt(chunk) for chunk in self._sized().chunks])
+
+
+    # NumPy dispatch
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+
+        if ufunc is np.negative:
+            return self._with_chunks([-c for c in self.chunks], self._clean)
+        if ufunc is np.matmul:
+            return _dot(*inputs)
+        if ufunc in _ELEMENTWISE:
+            return _elementwise(ufunc, *inputs)
+        return NotImplemented
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func in _FUNCTIONS:
+            return _FUNCTIONS[func](*args, **kwargs)
+        return NotImplemented
+
+
+    # Reductions
+    def sum(self, axis: Optional[int] = None):
+        """
+        Returns the sum over the given axis, using rotations.
+        With `axis=None`, returns a scalar `EncryptedValue`.
+        """
+        x = self.cleaned()
+        per_chunk, _ = self._layout()
+
+        if axis is None:
+            return _add_all(x.chunks).sum()
+
+        if axis < 0: axis += self.ndim
+        if self.ndim == 1 or axis not in [0, 1]:
+            raise ValueError(f'Invalid axis {axis} for array of shape {self.shape}.')
+
+        if axis == 0:
+            # Add rows: chunks share a layout, then rotate rows onto row 0
+            total = _add_all(x.chunks)
+            rows = min(per_chunk, self.shape[0])
+            total = _rotate_sum(total, self.row_stride, rows * self.row_stride)
+            return EncryptedArray([total], (self.shape[1],), self.stride, clean=False)
+        else:
+            # Add within each row, leaving row sums at the start of each row
+            chunks = [
+                _rotate_sum(chunk, self.stride, self.row_stride)
+                for chunk in x.chunks
+            ]
+            return EncryptedArray(chunks, (self.shape[0],), self.row_stride, clean=False)
+
+    def mean(self, axis: Optional[int] = None):
+        count = self.size if axis is None else self.shape[axis]
+        return self.sum(axis) * (1 / count)
+
+
+def encrypt_array(values) -> EncryptedArray:
+    """Encrypts a 1-D or 2-D array into as few packed ciphertexts as possible."""
+    values = np.asarray(values)
+    if values.ndim == 1:
+        template = EncryptedArray([], values.shape)
+    elif values.ndim == 2:
+        template = EncryptedArray([], values.shape, row_stride=_next_power_of_two(values.shape[1]))
+    else:
+        raise ValueError('Only 1-D and 2-D encrypted arrays are supported.')
+
+    per_chunk, _ = template._layout()
+    if values.ndim == 2 and per_chunk == 0:
+        raise ValueError('Rows are too long to be packed. Try increasing `poly_modulus_degree`.')
+    template.chunks = [None] * -(-values.shape[0] // per_chunk)  # Placeholders for `_pack`
+    template.chunks = [simplefhe.encrypt(chunk) for chunk in template._pack(values)]
+    return template
+
+
+# Kernels
+def _next_power_of_two(n: int) -> int:
+    return 1 << max(n - 1, 0).bit_length()
+
+
+def _nonzero(values: list):
+    """
+    Returns packed plaintext values, or the scalar 0 if they are all zero:
+    SEAL does not allow multiplication by an all-zero plaintext.
+    """
+    return values if any(values) else 0
+
+
+def _add_all(values: List[EncryptedValue]) -> EncryptedValue:
+    total = values[0]
+    for value in values[1:]:
+        total = total + value
+    return total
+
+
+def _rotate_sum(value: EncryptedValue, step: int, width: int) -> EncryptedValue:
+    """
+    Adds `value` rotated by step, 2 * step, 4 * step, ... below `width`,
+    so that each slot i holds the sum of slots i, i + step, ..., i + width - step.
+    """
+    while step < width:
+        value = value + value.rotate(step)
+        step *= 2
+    return value
+
+
+def _replicate(value: EncryptedValue, step: int, width: int) -> EncryptedValue:
+    """
+    Adds `value` rotated right by step, 2 * step, 4 * step, ... below `width`,
+    copying slot i to slots i + step, ..., i + width - step (if these are zero).
+    """
+    while step < width:
+        value = value + value.rotate(-step)
+        step *= 2
+    return value
+
+
+def _restride(vector: EncryptedArray, stride: int) -> EncryptedArray:
+    """
+    Returns a clean 1-D encrypted array with the given stride, holding the
+    elements of `vector`. Unless the strides already match, elements are
+    masked and rotated into place, using a level and one plaintext
+    multiplication per element.
+    """
+    if vector.stride == stride:
+        return vector.cleaned()
+
+    output = EncryptedArray([], vector.shape, stride)
+    per_source, _ = vector._layout()
+    per_target, _ = output._layout()
+    slots = simplefhe._mode['slots']
+
+    # Group elements by their source chunk, target chunk and rotation.
+    # Rotations are cyclic, so each is reduced into (-slots / 2, slots / 2].
+    groups = {}
+    for i in range(vector.shape[0]):
+        source = (i % per_source) * vector.stride
+        target = (i % per_target) * stride
+        steps = (source - target + slots // 2 - 1) % slots - slots // 2 + 1
+        key = (i // per_source, i // per_target, steps)
+        groups.setdefault(key, []).append(source)
+
+    chunks = [None] * -(-vector.shape[0] // per_target)
+    for (source, target, steps), slots in groups.items():
+        mask = np.zeros(max(slots) + 1, dtype=int)
+        mask[slots] = 1
+        value = vector.chunks[source] * mask.tolist()
+        if steps:
+            value = value.rotate(steps)
+        chunks[target] = value if chunks[target] is None else chunks[target] + value
+    output.chunks = chunks
+    return output._sized()
+
+
+def _broadcast(value: EncryptedArray, target: EncryptedArray) -> EncryptedArray:
+    """
+    Returns an encrypted array with the layout of `target`, holding `value`
+    broadcast to its shape. Rows and columns are replicated with rotations.
+    """
+    if value.ndim == 1 and value.shape == target.shape:
+        return _restride(value, target.stride)
+    if target.ndim != 2 or value.shape == target.shape:
+        raise ValueError(
+            f'Encrypted arrays of shape {value.shape} and {target.shape}'
+            + ' must have the same shape and layout.'
+        )
+
+    m, n = target.shape
+    per_chunk, _ = target._layout()
+    if value.shape in [(n,), (1, n)]:
+        # Row 0 of a 2-D array is laid out as a 1-D array
+        if value.ndim == 2:
+            value = EncryptedArray(value.chunks[:1], (n,), value.stride, clean=value._clean)
+        row = _restride(value, target.stride).chunks[0]
+        rows = min(per_chunk, _next_power_of_two(m))
+        row = _replicate(row, target.row_stride, rows * target.row_stride)
+        return target._with_chunks([row] * len(target.chunks), m % rows == 0)
+    if value.shape == (m, 1):
+        # Column 0 of a 2-D array is laid out as a 1-D array with stride row_stride
+        column = EncryptedArray(value.chunks, (m,), value.row_stride, clean=value._clean)
+        column = _restride(column, target.row_stride)
+        width = _next_power_of_two(n) * target.stride
+        chunks = [_replicate(chunk, target.stride, width) for chunk in column.chunks]
+        return target._with_chunks(chunks, _next_power_of_two(n) == n)
+    raise ValueError(f'Cannot broadcast an encrypted array of shape {value.shape} to {target.shape}.')
+
+
+def _elementwise(ufunc, a, b):
+    func = _ELEMENTWISE[ufunc]
+    if (
+        isinstance(a, EncryptedArray) and isinstance(b, EncryptedArray)
+        and not a._same_layout(b)
+    ):
+        # Lay out the smaller operand like the larger one
+        shape = np.broadcast_shapes(a.shape, b.shape)
+        if a.shape == shape:
+            b = _broadcast(b, a)
+        else:
+            a = _broadcast(a, b)
+
+    if isinstance(a, EncryptedArray):
+        array, other, swapped = a, b, False
+    else:
+        array, other, swapped = b, a, True
+
+    if isinstance(other, EncryptedArray):
+        if not array._same_layout(other):
+            raise ValueError(
+                f'Encrypted arrays of shape {array.shape} and {other.shape}'
+                + ' must have the same shape and layout.'
+            )
+        others = other.chunks
+        other_clean = other._clean
+    elif isinstance(other, EncryptedValue):
+        others = [other] * len(array.chunks)
+        other_clean = False
+    elif ufunc is np.multiply and np.ndim(other) == 0 and array._clean:
+        # Scalar factors keep padding zero, and use the fast paths of `EncryptedValue`.
+        # Dirty arrays are multiplied by a packed plaintext instead, which cleans them.
+        others = [np.asarray(other).item()] * len(array.chunks)
+        other_clean = False
+    else:
+        other = np.asarray(other)
+        if np.broadcast_shapes(array.shape, other.shape) != array.shape:
+            return NotImplemented
+        others = array._pack(other)
+        other_clean = True
+        if ufunc is np.multiply:
+            others = [_nonzero(x) for x in others]
+
+    if swapped:
+        chunks = [func(y, x) for x, y in zip(array.chunks, others)]
+    else:
+        chunks = [func(x, y) for x, y in zip(array.chunks, others)]
+
+    if ufunc is np.multiply:
+        clean = array._clean or other_clean
+    else:
+        clean = array._clean and other_clean
+    return array._with_chunks(chunks, clean)
+
+
+def _dot(a, b):
+    """Inner products, and products of matrices and vectors."""
+    a_encrypted = isinstance(a, EncryptedArray)
+    b_encrypted = isinstance(b, EncryptedArray)
+    if not a_encrypted: a = np.asarray(a)
+    if not b_encrypted: b = np.asarray(b)
+
+    if a.ndim == 1 and b.ndim == 1:
+        if a.shape != b.shape:
+            raise ValueError(f'Shapes {a.shape} and {b.shape} are not aligned.')
+        return np.sum(a * b)
+    if a.ndim == 2 and b.ndim == 1:
+        return _matvec(a, b)
+    if a.ndim == 1 and b.ndim == 2:
+        return _vecmat(a, b) if b_encrypted else _matvec(b.T, a)
+    if a.ndim == 2 and b.ndim == 2:
+        return _matmul(a, b)
+    return NotImplemented
+
+
+def _matvec(matrix, vector, row_stride: Optional[int] = None) -> EncryptedArray:
+    """
+    Multiplies a matrix by a vector (at least one encrypted).
+    The vector is replicated across rows (by rotation, if encrypted),
+    multiplied elementwise, and each row is summed with rotations.
+    The result has a stride equal to the row stride of the matrix layout.
+
+    :param row_stride:
+        Optional row stride to lay out a plaintext matrix with.
+        Defaults to the smallest possible.
+    """
+    m, n = matrix.shape
+    if vector.shape != (n,):
+        raise ValueError(f'Shapes {matrix.shape} and {vector.shape} are not aligned.')
+
+    if isinstance(matrix, EncryptedArray):
+        if isinstance(vector, EncryptedArray) and vector.stride != matrix.stride:
+            raise ValueError('Vector stride must match the matrix layout.')
+        stride, row_stride = matrix.stride, matrix.row_stride
+    else:
+        stride = vector.stride if isinstance(vector, EncryptedArray) else 1
+        row_stride = max(row_stride or 0, _next_power_of_two(n) * stride)
+
+    layout = EncryptedArray([], (m, n), stride, row_stride)
+    rows_per_chunk, _ = layout._layout()
+    if rows_per_chunk == 0:
+        raise ValueError('Rows are too long to be packed. Try increasing `poly_modulus_degree`.')
+    layout.chunks = [None] * -(-m // rows_per_chunk)  # Placeholders for `_pack`
+
+    if isinstance(vector, EncryptedArray):
+        if len(vector.chunks) != 1:
+            raise ValueError('Encrypted vector must fit in a single ciphertext.')
+        # Replicate into the first rows_per_chunk rows
+        rows = min(rows_per_chunk, _next_power_of_two(m))
+        replicated = _replicate(vector.cleaned().chunks[0], row_stride, rows * row_stride)
+        vectors = [replicated] * len(layout.chunks)
+    else:
+        vectors = layout._pack(np.broadcast_to(vector, (m, n)))
+
+    if isinstance(matrix, EncryptedArray):
+        rows = matrix.cleaned().chunks
+    else:
+        rows = layout._pack(matrix)
+
+    chunks = []
+    for x, w in zip(vectors, rows):
+        x = x if isinstance(x, EncryptedValue) else _nonzero(x)
+        w = w if isinstance(w, EncryptedValue) else _nonzero(w)
+        product = x * w if isinstance(x, EncryptedValue) else w * x
+        chunks.append(_rotate_sum(product, layout.stride, layout.row_stride))
+    return EncryptedArray(chunks, (m,), layout.row_stride, clean=False)
+
+
+def _vecmat(vector, matrix: EncryptedArray) -> EncryptedArray:
+    """
+    Multiplies a vector by an encrypted matrix. Each element of the vector
+    is replicated along its row of the matrix layout, and rows are summed.
+    """
+    k, n = matrix.shape
+    if vector.shape != (k,):
+        raise ValueError(f'Shapes {vector.shape} and {matrix.shape} are not aligned.')
+    if not isinstance(vector, EncryptedArray):
+        return (matrix * np.asarray(vector)[:, None]).sum(axis=0)
+
+    width = _next_power_of_two(n) * matrix.stride
+    chunks = [
+        _replicate(chunk, matrix.stride, width)
+        for chunk in _restride(vector, matrix.row_stride).chunks
+    ]
+    return (matrix._with_chunks(chunks, clean=False) * matrix).sum(axis=0)
+
+
+def _matmul(a, b) -> EncryptedArray:
+    """
+    Multiplies two matrices (at least one encrypted), one column at a time.
+    Each column of the result is a matrix-vector product, which is masked
+    and rotated into place. Columns of an encrypted right operand are
+    extracted by rotation, and laid out to match the left operand.
+    """
+    m, k = a.shape
+    if b.shape[0] != k:
+        raise ValueError(f'Shapes {a.shape} and {b.shape} are not aligned.')
+    n = b.shape[1]
+    if isinstance(a, EncryptedArray) and n > a.row_stride:
+        # Each row of the result is laid out like the row of `a` it came from
+        raise ValueError(
+            f'Products with an encrypted matrix on the left can have at most'
+            + f' {a.row_stride} columns (the row stride of its layout).'
+        )
+
+    stride = a.stride if isinstance(a, EncryptedArray) else 1
+    columns = []
+    for j in range(n):
+        if isinstance(b, EncryptedArray):
+            chunks = [chunk.rotate(j * b.stride) if j else chunk for chunk in b.chunks]
+            column = EncryptedArray(chunks, (k,), b.row_stride, clean=False)
+            column = _restride(column, stride)
+        else:
+            column = b[:, j]
+        columns.append(_matvec(a, column, _next_power_of_two(n)).cleaned())
+
+    # Element (i, j) of the result lives in slot i * row_stride + j
+    row_stride = columns[0].stride
+    chunks = []
+    for c in range(len(columns[0].chunks)):
+        total = columns[0].chunks[c]
+        for j, column in enumerate(columns[1:], 1):
+            total = total + column.chunks[c].rotate(-j)
+        chunks.append(total)
+    # Rotated columns extend past the packed length of the input chunks
+    return EncryptedArray(chunks, (m, n), 1, row_stride)._sized()
+
+
+_ELEMENTWISE = {
+    np.add: lambda x, y: x + y,
+    np.subtract: lambda x, y: x - y,
+    np.multiply: lambda x, y: x * y,
+}
+
+_FUNCTIONS = {
+    np.sum: lambda a, axis=None: a.sum(axis),
+    np.mean: lambda a, axis=None: a.mean(axis),
+    np.dot: _dot,
+    np.matmul: _dot,
+}
@@ -0,0 +1,49 @@
+"""
+Backends implementing the homomorphic encryption primitives.
+
+A backend is a module exposing the subset of the SEAL-Python API used by
+simplefhe (`EncryptionParameters`, `SEALContext`, `KeyGenerator`,
+`Encryptor`, `Decryptor`, `Evaluator`, the encoders, keys, `Plaintext`
+and `Ciphertext`). Two backends are available:
+
+- `seal`: the SEAL-Python library (default).
+- `simulation`: computes directly on plaintext values while tracking
+  levels, scales and noise. Orders of magnitude faster, but insecure;
+  for development, profiling and tests only.
+
+The backend is chosen with `simplefhe.initialize(backend=...)`,
+or process-wide with the `SIMPLEFHE_BACKEND` environment variable.
+"""
+import importlib
+import os
+
+
+BACKENDS = {
+    'seal': 'seal',
+    'simulation': 'simplefhe.backends.simulation',
+}
+
+
+def default_backend() -> str:
+    """Returns the backend selected by the `SIMPLEFHE_BACKEND` environment variable."""
+    return os.environ.get('SIMPLEFHE_BACKEND', 'seal')
+
+
+def load_backend(name: str):
+    """Imports the backend with the given name."""
+    if name not in BACKENDS:
+        raise ValueError(f'backend must be one of {", ".join(map(repr, BACKENDS))}')
+
+    try:
+        module = importlib.import_module(BACKENDS[name])
+    except ModuleNotFoundError:
+        if name != 'seal':
+            raise
+        raise ModuleNotFoundError(
+            'simplefhe depends on the SEAL-Python library. See https://github.com/Huelse/SEAL-Python for installation instructions.'
+            + " Alternatively, use backend='simulation' for development."
+        )
+
+    from simplefhe.serialization import register_key_types
+    register_key_types(module)
+    return module
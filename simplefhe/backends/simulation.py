@@ -0,0 +1,1017 @@
+"""
+Plaintext simulation backend.
+
+Implements the subset of the SEAL-Python API used by simplefhe, but
+computes directly on the encoded values. Ciphertexts track what SEAL
+would: their level in the modulus chain, CKKS scale, size (before
+relinearization) and an estimate of their noise. Parameter errors
+(mismatched levels or scales, an exhausted modulus chain, missing Galois
+keys, exhausted BFV noise budgets) surface as they would in SEAL.
+
+CKKS precision limits are modelled too: encoding rounds values to
+multiples of 1 / scale (exactly as SEAL does for constants, and per slot
+for vectors), products with plaintexts which round to zero raise
+"result ciphertext is transparent", and values whose scaled magnitude
+exceeds the coefficient modulus wrap around. Other effects, such as
+error which only shows with `ERROR_INJECTION`, are only estimated, so
+circuits should still be checked on the SEAL backend.
+
+Noise estimates are calibrated against SEAL 4 with default parameters:
+- BFV: the invariant noise budget, in bits.
+- CKKS: the standard deviation of the error in each slot.
+Set `ERROR_INJECTION = True` to also add CKKS-like error to the values.
+
+Every evaluator operation is tallied in `OPERATION_COUNTS`,
+which is useful for profiling circuits. Rotations are tallied as
+`apply_galois`, once per key switch.
+
+Nothing here is secure: ciphertexts contain their plaintext values.
+"""
+import enum
+import hashlib
+import json
+import math
+import os
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+
+from simplefhe.galois import naf
+
+
+# Add simulated CKKS error to encrypted values
+ERROR_INJECTION = False
+
+# Number of times each evaluator operation has been called
+OPERATION_COUNTS = Counter()
+
+
+# Noise model. BFV noise is in bits; CKKS error is in units of 1 / scale,
+# as multiples of the polynomial modulus degree N.
+_BFV_FRESH_NOISE = 8
+_BFV_MULTIPLY_NOISE = 12
+_BFV_MULTIPLY_PLAIN_NOISE = 5
+_BFV_ROTATE_NOISE = 3
+_CKKS_FRESH_ERROR = 1 / 6
+_CKKS_KEY_SWITCH_ERROR = 1.5
+
+_rng = np.random.default_rng()
+
+# Every context created, keyed by id
+_CONTEXTS = {}
+
+
+def reset_operation_counts() -> None:
+    OPERATION_COUNTS.clear()
+
+
+def describe(encrypted: 'Ciphertext') -> dict:
+    """Returns the simulated level, scale, size and noise of the given ciphertext."""
+    output = {
+        'level': encrypted._level,
+        'scale': encrypted._scale,
+        'size': encrypted._size,
+    }
+    if encrypted._scheme == scheme_type.ckks:
+        output['error'] = encrypted._noise
+    else:
+        output['noise_budget'] = _noise_budget(encrypted)
+    return output
+
+
+class scheme_type(enum.IntEnum):
+    none = 0
+    bfv = 1
+    ckks = 2
+
+
+# Parameters
+class Modulus:
+    def __init__(self, value: int):
+        self._value = int(value)
+
+    def value(self) -> int:
+        return self._value
+
+    def bit_count(self) -> int:
+        return self._value.bit_length()
+
+    def __repr__(self):
+        return f'Modulus({self._value})'
+
+
+class CoeffModulus:
+    # Bit sizes of SEAL's default BFV coefficient moduli (128-bit security)
+    _BFV_DEFAULT = {
+        1024: [27],
+        2048: [54],
+        4096: [36, 36, 37],
+        8192: [43, 43, 44, 44, 44],
+        16384: [48] * 9,
+        32768: [55] * 16,
+    }
+
+    @staticmethod
+    def MaxBitCount(poly_modulus_degree: int) -> int:
+        """Largest total coefficient modulus size for 128-bit security (as in SEAL)."""
+        return sum(CoeffModulus._BFV_DEFAULT.get(poly_modulus_degree, [0]))
+
+    @staticmethod
+    def BFVDefault(poly_modulus_degree: int) -> List[Modulus]:
+        if poly_modulus_degree not in CoeffModulus._BFV_DEFAULT:
+            raise ValueError('non-standard poly_modulus_degree')
+        return CoeffModulus.Create(
+            poly_modulus_degree, CoeffModulus._BFV_DEFAULT[poly_modulus_degree]
+        )
+
+    @staticmethod
+    def Create(poly_modulus_degree: int, bit_sizes: List[int]) -> List[Modulus]:
+        """Primes congruent to 1 mod 2N of the given bit sizes, chosen as in SEAL."""
+        counts = Counter(bit_sizes)
+        primes = {
+            bits: _get_primes(2 * poly_modulus_degree, bits, count)
+            for bits, count in counts.items()
+        }
+        return [Modulus(primes[bits].pop()) for bits in bit_sizes]
+
+
+class PlainModulus:
+    @staticmethod
+    def Batching(poly_modulus_degree: int, bit_size):
+        if isinstance(bit_size, int):
+            return CoeffModulus.Create(poly_modulus_degree, [bit_size])[0]
+        return CoeffModulus.Create(poly_modulus_degree, bit_size)
+
+
+class EncryptionParameters:
+    def __init__(self, scheme=scheme_type.none):
+        self._scheme = scheme_type(scheme)
+        self._poly_modulus_degree = 0
+        self._coeff_modulus = []
+        self._plain_modulus = Modulus(0)
+
+    def set_poly_modulus_degree(self, poly_modulus_degree: int) -> None:
+        self._poly_modulus_degree = poly_modulus_degree
+
+    def set_coeff_modulus(self, coeff_modulus: List[Modulus]) -> None:
+        self._coeff_modulus = list(coeff_modulus)
+
+    def set_plain_modulus(self, plain_modulus) -> None:
+        if not isinstance(plain_modulus, Modulus):
+            plain_modulus = Modulus(plain_modulus)
+        self._plain_modulus = plain_modulus
+
+    def scheme(self): return self._scheme
+    def poly_modulus_degree(self): return self._poly_modulus_degree
+    def coeff_modulus(self): return list(self._coeff_modulus)
+    def plain_modulus(self): return self._plain_modulus
+
+
+class SEALContext:
+    def __init__(self, parms: EncryptionParameters, expand_mod_chain: bool = True, sec_level=None):
+        n = parms.poly_modulus_degree()
+        if n < 2 or n & (n - 1):
+            raise ValueError('poly_modulus_degree must be a power of two')
+        if not parms.coeff_modulus():
+            raise ValueError('coeff_modulus is not set')
+        if parms.scheme() == scheme_type.bfv and parms.plain_modulus().value() < 2:
+            raise ValueError('plain_modulus is not set')
+
+        self._scheme = parms.scheme()
+        self._poly_modulus_degree = n
+        self._plain_modulus = parms.plain_modulus().value()
+        moduli = [m.value() for m in parms.coeff_modulus()]
+        # The last prime is reserved for key switching
+        self._data_moduli = moduli[:-1] if len(moduli) > 1 else moduli
+        self._id = hashlib.sha256(repr((
+            int(self._scheme), n, moduli, self._plain_modulus
+        )).encode()).hexdigest()[:16]
+        self._galois_steps = None
+        _CONTEXTS[self._id] = self
+
+    @property
+    def _top_level(self) -> int:
+        return len(self._data_moduli) - 1
+
+    @property
+    def _slots(self) -> int:
+        n = self._poly_modulus_degree
+        return n // 2 if self._scheme == scheme_type.ckks else n
+
+    def _coeff_bits(self, level: int) -> float:
+        return sum(math.log2(q) for q in self._data_moduli[:level + 1])
+
+    def parameters_set(self) -> bool:
+        return True
+
+    def first_parms_id(self):
+        return (self._id, self._top_level)
+
+    def last_parms_id(self):
+        return (self._id, 0)
+
+    # Deserialization
+    def from_cipher_str(self, data: bytes) -> 'Ciphertext':
+        return _loads(self, Ciphertext, data)
+
+    def from_public_str(self, data: bytes) -> 'PublicKey':
+        return _loads(self, PublicKey, data)
+
+    def from_secret_str(self, data: bytes) -> 'SecretKey':
+        return _loads(self, SecretKey, data)
+
+    def from_relin_str(self, data: bytes) -> 'RelinKeys':
+        return _loads(self, RelinKeys, data)
+
+    def from_galois_str(self, data: bytes) -> 'GaloisKeys':
+        return _loads(self, GaloisKeys, data)
+
+
+# Serializable objects
+class _Serializable:
+    _fields = []
+
+    def to_string(self) -> bytes:
+        state = {name: getattr(self, name) for name in self._fields}
+        state['type'] = type(self).__name__
+        if '_values' in state and state['_values'] is not None:
+            state['_values'] = state['_values'].tolist()
+        return json.dumps(state).encode()
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, 'wb') as f:
+            f.write(self.to_string())
+
+    def load(self, context: SEALContext, filepath: str) -> None:
+        with open(filepath, 'rb') as f:
+            loaded = _loads(context, type(self), f.read())
+        self.__dict__.update(loaded.__dict__)
+
+
+def _loads(context: SEALContext, cls, data: bytes):
+    try:
+        state = json.loads(bytes(data))
+    except ValueError:
+        raise ValueError('loaded data is invalid')
+    if state.pop('type', None) != cls.__name__:
+        raise ValueError(f'loaded data is not a {cls.__name__}')
+    if state['_context_id'] != context._id:
+        raise ValueError('loaded data is invalid for encryption parameters')
+
+    output = cls()
+    output.__dict__.update(state)
+    if state.get('_values') is not None:
+        output._values = _as_values(context, state['_values'])
+    if '_elements' in state:
+        output._elements = set(state['_elements'])
+    return output
+
+
+class _Key(_Serializable):
+    _fields = ['_context_id', '_key_id']
+
+    def __init__(self):
+        self._context_id = None
+        self._key_id = None
+
+
+class PublicKey(_Key): pass
+class RelinKeys(_Key): pass
+
+
+class SecretKey(_Key):
+    _fields = ['_context_id', '_key_id', '_secret']
+
+    def __init__(self):
+        super().__init__()
+        self._secret = None
+
+
+class GaloisKeys(_Key):
+    _fields = ['_context_id', '_key_id', '_elements']
+
+    def __init__(self):
+        super().__init__()
+        self._elements = set()
+
+    def has_key(self, galois_elt: int) -> bool:
+        return galois_elt in self._elements
+
+    def to_string(self) -> bytes:
+        elements = self._elements
+        self._elements = sorted(elements)
+        try:
+            return super().to_string()
+        finally:
+            self._elements = elements
+
+
+class Plaintext(_Serializable):
+    _fields = ['_context_id', '_scheme', '_level', '_scale', '_values']
+
+    def __init__(self, hex_poly: Optional[str] = None):
+        """
+        :param hex_poly:
+            A constant polynomial in hexadecimal, as in SEAL.
+            Non-constant polynomials are not supported by the simulation.
+        """
+        self._context_id = None
+        self._scheme = scheme_type.bfv
+        self._level = None
+        self._scale = 1.0
+        self._values = None
+        if hex_poly is not None:
+            try:
+                value = int(hex_poly, 16)
+            except ValueError:
+                raise ValueError('Only constant polynomials are supported by the simulation backend.')
+            self._values = np.array([value], dtype=object)
+
+    def scale(self, value: Optional[float] = None):
+        if value is None:
+            return self._scale
+        self._scale = float(value)
+
+    def parms_id(self):
+        return (self._context_id, self._level)
+
+    def to_string(self):
+        """Constant polynomials are written in hexadecimal, as in SEAL."""
+        if self._scheme == scheme_type.bfv and self._values is not None and len(self._values) == 1:
+            return format(int(self._values[0]), 'X')
+        return super().to_string()
+
+
+class Ciphertext(_Serializable):
+    _fields = [
+        '_context_id', '_scheme', '_level', '_scale',
+        '_size', '_noise', '_key_id', '_values',
+    ]
+
+    def __init__(self, copy: Optional['Ciphertext'] = None):
+        """
+        :param copy:
+            A ciphertext to copy, as in SEAL.
+        """
+        self._context_id = None
+        self._scheme = scheme_type.none
+        self._level = 0
+        self._scale = 1.0
+        self._size = 2
+        self._noise = 0.0
+        self._key_id = None
+        self._values = None
+        if copy is not None:
+            self.__dict__.update(copy.__dict__)
+            self._values = copy._values.copy()
+
+    def scale(self, value: Optional[float] = None):
+        if value is None:
+            return self._scale
+        # As in SEAL, the encrypted values are reinterpreted at the new scale.
+        # Only the power of two nearest the ratio is simulated: the remainder
+        # (e.g. after rescaling by a prime near a power of two) counts as error.
+        if self._scheme == scheme_type.ckks and self._values is not None:
+            factor = pow(2.0, round(math.log2(self._scale / float(value))))
+            self._values = self._values * factor
+            self._noise *= factor
+        self._scale = float(value)
+
+    def parms_id(self):
+        return (self._context_id, self._level)
+
+    def size(self) -> int:
+        return self._size
+
+    def coeff_modulus_size(self) -> int:
+        return self._level + 1
+
+    def _copy(self) -> 'Ciphertext':
+        return Ciphertext(self)
+
+
+# Keys
+class KeyGenerator:
+    def __init__(self, context: SEALContext, secret_key: Optional[SecretKey] = None):
+        self._context = context
+        if secret_key is None:
+            self._secret = os.urandom(16).hex()
+        else:
+            _check_context(context, secret_key)
+            self._secret = secret_key._secret
+
+    def _fill(self, key: _Key) -> _Key:
+        key._context_id = self._context._id
+        key._key_id = _key_id(self._secret)
+        return key
+
+    def secret_key(self) -> SecretKey:
+        key = self._fill(SecretKey())
+        key._secret = self._secret
+        return key
+
+    def create_public_key(self, destination: Optional[PublicKey] = None):
+        return _fill_destination(self._fill(PublicKey()), destination)
+
+    def create_relin_keys(self, destination: Optional[RelinKeys] = None):
+        return _fill_destination(self._fill(RelinKeys()), destination)
+
+    def create_galois_keys(self, *args) -> Optional[GaloisKeys]:
+        """
+        Generates keys for all positive and negative powers of two.
+        As in SEAL, `create_galois_keys(steps, destination)` instead
+        generates keys for the given rotation steps only.
+        """
+        steps, destination = None, None
+        if len(args) == 1:
+            destination, = args
+        elif len(args) == 2:
+            steps, destination = args
+        if self._context._scheme == scheme_type.none:
+            raise ValueError('unsupported scheme')
+        n = self._context._poly_modulus_degree
+        if steps is None:
+            steps = [0]
+            step = 1
+            while step < n // 2:
+                steps.extend([step, -step])
+                step *= 2
+        keys = self._fill(GaloisKeys())
+        keys._elements = {galois_elt_from_step(step, n) for step in steps}
+        return _fill_destination(keys, destination)
+
+
+def galois_elt_from_step(step: int, poly_modulus_degree: int) -> int:
+    """The Galois element rotating slots left by `step` (as in SEAL)."""
+    n = poly_modulus_degree
+    m = 2 * n
+    if step == 0:
+        return m - 1
+    if abs(step) >= n // 2:
+        raise ValueError('step count too large')
+    if step < 0:
+        step = n // 2 + step
+    return pow(3, step, m)
+
+
+def _key_id(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
+def _fill_destination(item, destination):
+    """Mimics SEAL's optional output arguments."""
+    if destination is None:
+        return item
+    destination.__dict__.update(item.__dict__)
+
+
+# Encryption
+class Encryptor:
+    def __init__(self, context: SEALContext, public_key: PublicKey):
+        _check_context(context, public_key)
+        self._context = context
+        self._key_id = public_key._key_id
+
+    def encrypt(self, plain: Plaintext, destination: Optional[Ciphertext] = None):
+        context = self._context
+        n = context._poly_modulus_degree
+
+        output = Ciphertext()
+        output._context_id = context._id
+        output._scheme = context._scheme
+        output._key_id = self._key_id
+        output._scale = plain._scale
+
+        if context._scheme == scheme_type.ckks:
+            _check_context(context, plain)
+            output._level = plain._level
+            output._noise = _CKKS_FRESH_ERROR * n / plain._scale
+            output._values = _inject_error(plain._values, output._noise)
+        else:
+            output._level = context._top_level
+            output._noise = _BFV_FRESH_NOISE
+            output._values = _as_values(context, plain._values)
+        return _fill_destination(output, destination)
+
+
+class Decryptor:
+    def __init__(self, context: SEALContext, secret_key: SecretKey):
+        _check_context(context, secret_key)
+        self._context = context
+        self._key_id = secret_key._key_id
+
+    def decrypt(self, encrypted: Ciphertext, destination: Optional[Plaintext] = None):
+        context = self._context
+        _check_context(context, encrypted)
+
+        output = Plaintext()
+        output._context_id = context._id
+        output._scheme = context._scheme
+        output._scale = encrypted._scale
+
+        garbage = encrypted._key_id != self._key_id
+        if context._scheme == scheme_type.ckks:
+            output._level = encrypted._level
+            values = encrypted._values
+            if garbage:
+                values = _rng.normal(scale=2.0 ** 60 / encrypted._scale, size=values.shape)
+        else:
+            garbage = garbage or _noise_budget(encrypted) <= 0
+            values = encrypted._values
+            if garbage:
+                values = _random_values(context, values.shape)
+        output._values = values.copy()
+
+        return _fill_destination(output, destination)
+
+    def invariant_noise_budget(self, encrypted: Ciphertext) -> int:
+        if self._context._scheme != scheme_type.bfv:
+            raise ValueError('unsupported scheme')
+        if encrypted._key_id != self._key_id:
+            return 0
+        return _noise_budget(encrypted)
+
+
+def _noise_budget(encrypted: Ciphertext) -> int:
+    context = _CONTEXTS[encrypted._context_id]
+    budget = (
+        context._coeff_bits(encrypted._level)
+        - math.log2(context._plain_modulus)
+        - encrypted._noise
+    )
+    return max(0, int(budget))
+
+
+# Encoding
+class CKKSEncoder:
+    def __init__(self, context: SEALContext):
+        if context._scheme != scheme_type.ckks:
+            raise ValueError('unsupported scheme')
+        self._context = context
+
+    def slot_count(self) -> int:
+        return self._context._slots
+
+    def encode(self, values, scale: Optional[float] = None, destination: Optional[Plaintext] = None):
+        """
+        Encodes a float or sequence of floats at the given scale.
+        Integers given without a scale are encoded exactly, at scale 1.
+
+        Values are rounded to multiples of 1 / scale. SEAL encodes a constant
+        as a constant polynomial, so this is exact for scalars; for vectors,
+        SEAL rounds the coefficients instead, which is approximated per slot.
+        """
+        context = self._context
+        slots = context._slots
+
+        if scale is None:
+            if not isinstance(values, (int, np.integer)):
+                raise TypeError('encode() requires a scale for non-integer values')
+            if not -pow(2, 63) <= values < pow(2, 63):
+                # As with the 64-bit integer overload of SEAL
+                raise TypeError('encode(): incompatible function arguments')
+            scale = 1.0
+        if math.log2(scale) >= context._coeff_bits(context._top_level):
+            raise ValueError('scale out of bounds')
+
+        total_bits = sum(q.bit_length() for q in context._data_moduli)
+        if np.ndim(values) == 0:
+            value = float(values) * scale
+            if value and int(math.log2(abs(value))) + 2 >= total_bits:
+                raise ValueError('encoded value is too large')
+            encoded = np.full(slots, float(values))
+        else:
+            values = np.asarray(values, dtype=np.float64)
+            if len(values) > slots:
+                raise ValueError('values has invalid size')
+            # Coefficients are at most 2 / N times the sum of the scaled values
+            bound = 2 * np.abs(values).sum() * scale / context._poly_modulus_degree
+            if bound and int(math.log2(bound)) + 2 >= total_bits:
+                raise ValueError('encoded values are too large')
+            encoded = np.zeros(slots)
+            encoded[:len(values)] = values
+        encoded = np.round(encoded * scale) / scale
+
+        if scale > 1:
+            encoded = _inject_error(encoded, math.sqrt(context._poly_modulus_degree) / 4 / scale)
+
+        output = Plaintext()
+        output._context_id = context._id
+        output._scheme = scheme_type.ckks
+        output._level = context._top_level
+        output._scale = float(scale)
+        output._values = encoded
+        return _fill_destination(output, destination)
+
+    def decode(self, plain: Plaintext) -> np.ndarray:
+        _check_context(self._context, plain)
+        return plain._values.copy()
+
+
+class BatchEncoder:
+    def __init__(self, context: SEALContext):
+        if context._scheme != scheme_type.bfv:
+            raise ValueError('unsupported scheme')
+        t = context._plain_modulus
+        if t % (2 * context._poly_modulus_degree) != 1:
+            raise ValueError('encryption parameters are not valid for batching')
+        self._context = context
+
+    def slot_count(self) -> int:
+        return self._context._slots
+
+    def encode(self, values, destination: Optional[Plaintext] = None):
+        context = self._context
+        t = context._plain_modulus
+        values = np.asarray(values)
+        if len(values) > context._slots:
+            raise ValueError('values_matrix size is too large')
+        if values.dtype == np.uint64 and np.any(values >= t):
+            raise ValueError('input value is larger than plain_modulus')
+        if values.dtype != np.uint64 and np.any(np.abs(values.astype(object)) > t // 2):
+            raise ValueError('input value is larger than plain_modulus')
+
+        encoded = np.zeros(context._slots, dtype=_dtype(context))
+        encoded[:len(values)] = [int(x) % t for x in values]
+
+        output = Plaintext()
+        output._context_id = context._id
+        output._values = encoded
+        return _fill_destination(output, destination)
+
+    def decode(self, plain: Plaintext) -> np.ndarray:
+        t = self._context._plain_modulus
+        values = np.array([int(x) for x in plain._values], dtype=object)
+        return np.where(values > t // 2, values - t, values).astype(np.int64)
+
+
+# Evaluation
+class Evaluator:
+    def __init__(self, context: SEALContext):
+        self._context = context
+
+    @property
+    def _is_ckks(self) -> bool:
+        return self._context._scheme == scheme_type.ckks
+
+    def _result(self, name: str, *operands: Ciphertext) -> Ciphertext:
+        OPERATION_COUNTS[name] += 1
+        for x in operands:
+            _check_context(self._context, x)
+        return operands[0]._copy()
+
+    def _check_match(self, a, b) -> None:
+        if a.parms_id() != b.parms_id() and a._level is not None and b._level is not None:
+            raise ValueError('encrypted1 and encrypted2 parameter mismatch')
+        if self._is_ckks and not math.isclose(a._scale, b._scale, rel_tol=1e-10):
+            raise ValueError('scale mismatch')
+
+    def _reduce(self, values: np.ndarray) -> np.ndarray:
+        if self._is_ckks:
+            return values
+        return values % self._context._plain_modulus
+
+    def _wrap(self, output: Ciphertext) -> Ciphertext:
+        """
+        CKKS values whose scaled magnitude exceeds half the coefficient modulus
+        wrap around (as the coefficients do in SEAL), giving garbage.
+        """
+        if not self._is_ckks:
+            return output
+        modulus = math.prod(self._context._data_moduli[:output._level + 1])
+        overflow = np.abs(output._values) * output._scale >= modulus / 2
+        if np.any(overflow):
+            values = output._values.copy()
+            for i in np.flatnonzero(overflow):
+                coefficient = int(round(values[i] * output._scale))
+                coefficient = (coefficient + modulus // 2) % modulus - modulus // 2
+                values[i] = coefficient / output._scale
+            output._values = values
+        return output
+
+    # Addition
+    def add(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+        self._check_match(a, b)
+        output = self._result('add', a, b)
+        output._values = self._reduce(a._values + b._values)
+        output._size = max(a._size, b._size)
+        output._noise = self._add_noise(a._noise, b._noise)
+        output._key_id = _combine_keys(a, b)
+        return self._wrap(output)
+
+    def sub(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+        output = self.add(a, self.negate(b))
+        OPERATION_COUNTS['add'] -= 1
+        OPERATION_COUNTS['negate'] -= 1
+        OPERATION_COUNTS['sub'] += 1
+        return output
+
+    def add_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+        self._check_plain(a, b)
+        output = self._result('add_plain', a)
+        output._values = self._reduce(a._values + _as_values(self._context, b._values))
+        return self._wrap(output)
+
+    def sub_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+        self._check_plain(a, b)
+        output = self._result('sub_plain', a)
+        output._values = self._reduce(a._values - _as_values(self._context, b._values))
+        return self._wrap(output)
+
+    def negate(self, a: Ciphertext) -> Ciphertext:
+        output = self._result('negate', a)
+        output._values = self._reduce(-a._values)
+        return output
+
+    def add_many(self, values: List[Ciphertext]) -> Ciphertext:
+        output = values[0]
+        for value in values[1:]:
+            output = self.add(output, value)
+        return output
+
+    def _add_noise(self, a: float, b: float) -> float:
+        if self._is_ckks:
+            return math.hypot(a, b)
+        # BFV noise (in bits) grows with the sum of the magnitudes
+        return max(a, b) + math.log2(1 + pow(2.0, -abs(a - b)))
+
+    def _check_plain(self, a: Ciphertext, b: Plaintext) -> None:
+        if self._is_ckks:
+            _check_context(self._context, b)
+            self._check_match(a, b)
+
+    # Multiplication
+    def multiply(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+        if a.parms_id() != b.parms_id():
+            raise ValueError('encrypted1 and encrypted2 parameter mismatch')
+        output = self._result('multiply', a, b)
+        output._values = self._reduce(a._values * b._values)
+        output._size = a._size + b._size - 1
+        output._key_id = _combine_keys(a, b)
+        if self._is_ckks:
+            output._scale = self._check_scale(a._scale * b._scale, a._level)
+            output._noise = math.hypot(
+                _magnitude(a._values) * b._noise,
+                _magnitude(b._values) * a._noise,
+            )
+        else:
+            t_bits = math.log2(self._context._plain_modulus)
+            output._noise = max(a._noise, b._noise) + t_bits + _BFV_MULTIPLY_NOISE
+        return self._wrap(output)
+
+    def square(self, a: Ciphertext) -> Ciphertext:
+        output = self.multiply(a, a)
+        OPERATION_COUNTS['multiply'] -= 1
+        OPERATION_COUNTS['square'] += 1
+        return output
+
+    def multiply_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+        if self._is_ckks:
+            _check_context(self._context, b)
+            if a.parms_id() != b.parms_id():
+                raise ValueError('encrypted_ntt and plain_ntt parameter mismatch')
+        output = self._result('multiply_plain', a)
+        plain = _as_values(self._context, b._values)
+        if not np.any(plain):
+            raise RuntimeError('result ciphertext is transparent')
+        output._values = self._reduce(a._values * plain)
+        if self._is_ckks:
+            output._scale = self._check_scale(a._scale * b._scale, a._level)
+            output._noise = _magnitude(plain) * a._noise
+        elif len(plain) == 1 or np.all(plain == plain[0]):
+            # Constant polynomial: noise grows by the size of the constant
+            output._noise = a._noise + max(int(plain[0]).bit_length(), 1)
+        else:
+            t_bits = math.log2(self._context._plain_modulus)
+            output._noise = a._noise + t_bits + _BFV_MULTIPLY_PLAIN_NOISE
+        return self._wrap(output)
+
+    def _check_scale(self, scale: float, level: int) -> float:
+        if math.log2(scale) >= self._context._coeff_bits(level):
+            raise ValueError('scale out of bounds')
+        return scale
+
+    def relinearize(self, a: Ciphertext, relin_keys: RelinKeys) -> Ciphertext:
+        _check_context(self._context, relin_keys)
+        if a._size < 2:
+            raise ValueError('encrypted size must be at least 2')
+        output = self._result('relinearize', a)
+        if a._size > 2:
+            output._size = 2
+            if relin_keys._key_id != a._key_id:
+                output._key_id = None
+        return output
+
+    # Modulus switching
+    def rescale_to_next(self, a: Ciphertext) -> Ciphertext:
+        if not self._is_ckks:
+            raise ValueError('unsupported operation for scheme type')
+        if a._level == 0:
+            raise ValueError('end of modulus switching chain reached')
+        output = self._result('rescale_to_next', a)
+        output._scale = a._scale / self._context._data_moduli[a._level]
+        output._level = a._level - 1
+
+        rounding = math.sqrt(self._context._poly_modulus_degree) / output._scale
+        output._noise = math.hypot(a._noise, rounding)
+        output._values = _inject_error(output._values, rounding)
+        return output
+
+    def mod_switch_to_next(self, a: Ciphertext) -> Ciphertext:
+        if a._level == 0:
+            raise ValueError('end of modulus switching chain reached')
+        return self.mod_switch_to(a, (self._context._id, a._level - 1))
+
+    def mod_switch_to(self, a, parms_id):
+        _check_context(self._context, a)
+        context_id, level = parms_id
+        if context_id != self._context._id:
+            raise ValueError('parms_id is not valid for encryption parameters')
+        if a._level is None or level > a._level:
+            raise ValueError('cannot switch to higher level modulus')
+
+        OPERATION_COUNTS['mod_switch'] += 1
+        output = type(a)()
+        output.__dict__.update(a.__dict__)
+        if isinstance(a, Ciphertext) and not self._is_ckks:
+            # BFV modulus switching scales the noise down with the modulus
+            dropped = self._context._coeff_bits(a._level) - self._context._coeff_bits(level)
+            output._noise = max(a._noise - dropped, 0)
+        output._level = level
+        if isinstance(a, Ciphertext):
+            return self._wrap(output)
+        return output
+
+    # Rotation
+    def rotate_vector(self, a: Ciphertext, steps: int, galois_keys: GaloisKeys) -> Ciphertext:
+        if not self._is_ckks:
+            raise ValueError('unsupported scheme')
+        return self._rotate(a, steps, galois_keys)
+
+    def rotate_rows(self, a: Ciphertext, steps: int, galois_keys: GaloisKeys) -> Ciphertext:
+        if self._is_ckks:
+            raise ValueError('unsupported scheme')
+        return self._rotate(a, steps, galois_keys)
+
+    def rotate_columns(self, a: Ciphertext, galois_keys: GaloisKeys) -> Ciphertext:
+        if self._is_ckks:
+            raise ValueError('unsupported scheme')
+        return self.apply_galois(a, 2 * self._context._poly_modulus_degree - 1, galois_keys)
+
+    def complex_conjugate(self, a: Ciphertext, galois_keys: GaloisKeys) -> Ciphertext:
+        if not self._is_ckks:
+            raise ValueError('unsupported scheme')
+        return self.apply_galois(a, 2 * self._context._poly_modulus_degree - 1, galois_keys)
+
+    def _rotate(self, a: Ciphertext, steps: int, galois_keys: GaloisKeys) -> Ciphertext:
+        n = self._context._poly_modulus_degree
+        element = galois_elt_from_step(steps, n)
+        if galois_keys.has_key(element):
+            return self.apply_galois(a, element, galois_keys)
+
+        # Fall back to a sequence of rotations by powers of two, as SEAL does
+        naf_steps = naf(steps)
+        if len(naf_steps) == 1:
+            raise ValueError('Galois key not present')
+        for step in naf_steps:
+            a = self._rotate(a, step, galois_keys)
+        return a
+
+    def apply_galois(self, a: Ciphertext, galois_elt: int, galois_keys: GaloisKeys) -> Ciphertext:
+        _check_context(self._context, galois_keys)
+        if a._size != 2:
+            raise ValueError('encrypted size must be 2')
+        if not galois_keys.has_key(galois_elt):
+            raise ValueError('Galois key not present')
+
+        output = self._result('apply_galois', a)
+        n = self._context._poly_modulus_degree
+        if galois_elt == 2 * n - 1:
+            if not self._is_ckks:
+                # Swap the two rows of BFV slots
+                output._values = np.roll(a._values.reshape(2, -1), 1, axis=0).ravel()
+        else:
+            steps = self._galois_steps()[galois_elt]
+            if self._is_ckks:
+                output._values = np.roll(a._values, -steps)
+            else:
+                output._values = np.roll(a._values.reshape(2, -1), -steps, axis=1).ravel()
+
+        if galois_keys._key_id != a._key_id:
+            output._key_id = None
+        if self._is_ckks:
+            error = _CKKS_KEY_SWITCH_ERROR * n / a._scale
+            output._noise = math.hypot(a._noise, error)
+            output._values = _inject_error(output._values, error)
+        else:
+            output._noise = a._noise + _BFV_ROTATE_NOISE
+        return output
+
+    def _galois_steps(self) -> dict:
+        """Maps each Galois element (other than conjugation) to its left rotation."""
+        context = self._context
+        if context._galois_steps is None:
+            n = context._poly_modulus_degree
+            context._galois_steps = {
+                pow(3, step, 2 * n): step for step in range(n // 2)
+            }
+        return context._galois_steps
+
+
+# SEAL provides in-place variants of most evaluator methods
+def _make_inplace(name: str):
+    method = getattr(Evaluator, name)
+
+    def inplace(self, destination, *args):
+        result = method(self, destination, *args)
+        destination.__dict__.update(result.__dict__)
+    inplace.__name__ = f'{name}_inplace'
+    return inplace
+
+
+for _name in [
+    'add', 'sub', 'add_plain', 'sub_plain', 'negate',
+    'multiply', 'square', 'multiply_plain', 'relinearize',
+    'rescale_to_next', 'mod_switch_to_next', 'mod_switch_to',
+    'rotate_vector', 'rotate_rows', 'rotate_columns',
+    'complex_conjugate', 'apply_galois',
+]:
+    setattr(Evaluator, f'{_name}_inplace', _make_inplace(_name))
+
+
+# Helpers
+
+
+def _check_context(context: SEALContext, item) -> None:
+    if item._context_id is not None and item._context_id != context._id:
+        raise ValueError(f'{type(item).__name__} is not valid for encryption parameters')
+
+
+def _combine_keys(a: Ciphertext, b: Ciphertext) -> Optional[str]:
+    """Combining ciphertexts under different keys yields garbage."""
+    return a._key_id if a._key_id == b._key_id else None
+
+
+def _dtype(context: SEALContext):
+    return np.int64 if context._plain_modulus < 2 ** 31 else object
+
+
+def _as_values(context: SEALContext, values) -> np.ndarray:
+    if context._scheme == scheme_type.ckks:
+        return np.asarray(values, dtype=np.float64)
+    return np.asarray(values).astype(_dtype(context))
+
+
+def _random_values(context: SEALContext, shape) -> np.ndarray:
+    t = context._plain_modulus
+    return np.array([int(x) for x in _rng.integers(0, t, size=shape)], dtype=_dtype(context))
+
+
+def _magnitude(values: np.ndarray) -> float:
+    return float(np.max(np.abs(values))) if len(values) else 0.0
+
+
+def _inject_error(values: np.ndarray, std: float) -> np.ndarray:
+    if not ERROR_INJECTION:
+        return values
+    return values + _rng.normal(scale=std, size=values.shape)
+
+
+def _is_prime(value: int) -> bool:
+    """Deterministic Miller-Rabin for values below 2^64."""
+    if value < 2:
+        return False
+    small = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]
+    for p in small:
+        if value % p == 0:
+            return value == p
+    d, r = value - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in small:
+        x = pow(a, d, value)
+        if x in [1, value - 1]:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, value)
+            if x == value - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _get_primes(factor: int, bit_size: int, count: int) -> List[int]:
+    """The largest `count` primes of the given bit size congruent to 1 mod `factor`."""
+    primes = []
+    value = (1 << bit_size) - factor + 1
+    lower_bound = 1 << (bit_size - 1)
+    while len(primes) < count:
+        if value <= lower_bound:
+            raise ValueError('failed to find enough qualifying primes')
+        if _is_prime(value):
+            primes.append(value)
+        value -= factor
+    return primes
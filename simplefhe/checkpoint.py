@@ -0,0 +1,160 @@
+"""
+Checkpointing for long-running aggregation jobs.
+
+A `Checkpointer` wraps any picklable object with an `update` method
+(such as the accumulators in `simplefhe.stats`), counts the inputs it
+has consumed, and periodically writes both to disk. Writes are atomic:
+a crash mid-write leaves the previous checkpoint intact.
+
+Typical usage on the server:
+
+    checkpointer = Checkpointer('state.ckpt', Moments, every=100)
+    for i in range(checkpointer.position, n_inputs):
+        checkpointer.update(load_encrypted_value(f'inputs/{i}.dat'))
+    checkpointer.save()
+
+If the job is restarted, it resumes after the last checkpointed input.
+
+Checkpoint files hold a JSON header (version, context fingerprint and
+position), which is checked before the pickled state is loaded. As with
+any pickle, only load checkpoints written by a trusted process.
+"""
+import json
+import os
+import pickle
+import struct
+import tempfile
+import time
+from typing import Callable, Optional
+
+import simplefhe
+from simplefhe import crt
+
+
+CHECKPOINT_VERSION = 2
+
+
+def atomic_write(filepath: str, data: bytes, prefix: str = '.tmp-') -> None:
+    """
+    Writes the given data to a file atomically and durably:
+    a crash mid-write leaves any previous version of the file intact.
+
+    :param prefix:
+        Prefix of the temporary file, created next to `filepath`.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=prefix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    # Persist the rename itself
+    if os.name == 'posix':
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def save_checkpoint(state, filepath: str, position: int = 0) -> None:
+    """
+    Atomically saves the given state, along with the number of
+    inputs consumed so far, to the given file.
+    """
+    header = {
+        'version': CHECKPOINT_VERSION,
+        'fingerprint': simplefhe._mode['fingerprint'],
+        'position': position,
+    }
+    data = crt.pack([
+        json.dumps(header).encode(),
+        pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL),
+    ])
+    atomic_write(filepath, data, prefix='.checkpoint-')
+
+
+def load_checkpoint(filepath: str) -> dict:
+    """
+    Loads a checkpoint saved by `save_checkpoint`.
+    Returns a dict with keys `state` and `position`.
+
+    The current context must match the one the checkpoint was saved under.
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    try:
+        header, body = crt.unpack(data)
+        header = json.loads(header)
+    except (struct.error, ValueError):
+        raise ValueError(f'{filepath} is not a checkpoint.')
+
+    # The state is only unpickled once the header has been checked
+    if not isinstance(header, dict) or header.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'Unsupported checkpoint version in {filepath}.')
+    if header['fingerprint'] != simplefhe._mode['fingerprint']:
+        raise ValueError(
+            f'Checkpoint {filepath} was saved under different initialization parameters.'
+        )
+    return {'position': header['position'], 'state': pickle.loads(body)}
+
+
+class Checkpointer:
+    def __init__(
+        self,
+        filepath: str,
+        factory: Callable[[], object],
+        every: Optional[int] = 100,
+        interval: Optional[float] = None,
+    ):
+        """
+        Resumes from the checkpoint at `filepath` if it exists,
+        and otherwise starts from `factory()`.
+
+        :param every:
+            Save a checkpoint after this many inputs. None to disable.
+
+        :param interval:
+            Save a checkpoint once this many seconds have passed
+            since the last one. None to disable.
+        """
+        self.filepath = filepath
+        self.every = every
+        self.interval = interval
+
+        if os.path.exists(filepath):
+            payload = load_checkpoint(filepath)
+            self.state = payload['state']
+            self.position = payload['position']
+        else:
+            self.state = factory()
+            self.position = 0
+
+        self._saved_position = self.position
+        self._saved_time = time.monotonic()
+
+    def update(self, *args, **kwargs) -> None:
+        """
+        Passes a single input to `state.update`,
+        saving a checkpoint if one is due.
+        """
+        self.state.update(*args, **kwargs)
+        self.position += 1
+
+        due = (self.every is not None and self.position - self._saved_position >= self.every)
+        if self.interval is not None:
+            due = due or (time.monotonic() - self._saved_time >= self.interval)
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        """Saves a checkpoint now."""
+        save_checkpoint(self.state, self.filepath, self.position)
+        self._saved_position = self.position
+        self._saved_time = time.monotonic()
@@ -0,0 +1,157 @@
+"""
+Packed kernels for encrypted k-means clustering.
+
+Points are packed with `encrypt_array(points)` (one point per row).
+Squared distances to all centroids are computed with one multiplication
+and a logarithmic number of rotations per centroid, and cluster
+assignments use a polynomial approximation of the comparison function:
+
+    X = encrypt_array(points)                       # n x d
+    distances = squared_distances(X, centroids)     # k arrays of shape (n,)
+    assignments = assign(distances, bound=100.0)    # approximately one-hot
+    sums, counts = centroid_sums(X, assignments)    # for the next centroids
+
+Multiplicative depth: `squared_distances` and `centroid_sums` use one
+level each, and `assign` uses 2 * iterations + ceil(log2(k - 1)).
+Assignment needs a deeper context, e.g.
+`initialize('float', poly_modulus_degree=16384, depth=7)`.
+"""
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+import simplefhe
+from simplefhe.arrays import EncryptedArray, _next_power_of_two, _rotate_sum
+from simplefhe.compare import less_than
+from simplefhe.datatypes import EncryptedValue
+
+
+def squared_distances(
+    points: EncryptedArray,
+    centroids: Union[np.ndarray, Sequence[EncryptedArray]],
+) -> List[EncryptedArray]:
+    """
+    Returns the squared Euclidean distance from each point to each centroid,
+    as one array of shape (n,) per centroid (with the row stride of `points`).
+
+    :param centroids:
+        A plaintext array of shape (k, d), or a sequence of k encrypted
+        1-D arrays of length d (e.g. `encrypt_array(c)`).
+    """
+    if points.ndim != 2:
+        raise ValueError('Points must be a 2-D encrypted array (one point per row).')
+    n, d = points.shape
+
+    if isinstance(centroids, (list, tuple)) and centroids and isinstance(centroids[0], EncryptedArray):
+        return [_encrypted_distances(points, centroid) for centroid in centroids]
+
+    centroids = np.atleast_2d(np.asarray(centroids))
+    if centroids.shape[1] != d:
+        raise ValueError(f'Centroids of shape {centroids.shape} do not match points of dimension {d}.')
+
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, sharing |x|^2 between centroids
+    norms = _row_sums(points * points)
+    output = []
+    for centroid in centroids:
+        norm = centroid @ centroid
+        norm = float(norm) if simplefhe._mode['type'] == 'float' else int(norm)
+        output.append(norms + _row_sums(points * (-2 * centroid)) + norm)
+    return output
+
+
+def _encrypted_distances(points: EncryptedArray, centroid: EncryptedArray) -> EncryptedArray:
+    if centroid.shape != (points.shape[1],) or len(centroid.chunks) != 1:
+        raise ValueError('Each encrypted centroid must be a single-chunk array of the point dimension.')
+    if centroid.stride != points.stride:
+        raise ValueError('Centroid stride must match the layout of the points.')
+
+    # Replicate the centroid into every row (padding columns stay zero)
+    rows_per_chunk, _ = points._layout()
+    replicated = centroid.cleaned().chunks[0]
+    width = points.row_stride
+    while width < min(rows_per_chunk, _next_power_of_two(points.shape[0])) * points.row_stride:
+        replicated = replicated + replicated.rotate(-width)
+        width *= 2
+
+    difference = [chunk - replicated for chunk in points.cleaned().chunks]
+    return _row_sums(points._with_chunks([x * x for x in difference], clean=False))
+
+
+def _row_sums(array: EncryptedArray) -> EncryptedArray:
+    """
+    Sums each row with rotations. Padding columns must be zero,
+    but padding rows need not be (unlike `EncryptedArray.sum`).
+    """
+    chunks = [_rotate_sum(chunk, array.stride, array.row_stride) for chunk in array.chunks]
+    return EncryptedArray(chunks, (array.shape[0],), array.row_stride, clean=False)
+
+
+def assign(distances: List[EncryptedArray], bound: float, iterations: int = 2) -> List[EncryptedArray]:
+    """
+    Returns approximately one-hot cluster assignments (1 for the closest
+    centroid, 0 for the others), as one array per centroid.
+
+    :param bound:
+        An upper bound on all distances. Differences between distances
+        which are small relative to the bound give fractional assignments.
+
+    :param iterations:
+        Number of polynomial iterations approximating each comparison.
+        More iterations sharpen the assignments, using 2 levels each.
+    """
+    if simplefhe._mode['type'] != 'float':
+        raise ValueError('Approximate assignment requires `float` mode.')
+    k = len(distances)
+    if k < 2:
+        raise ValueError('At least two centroids are required.')
+
+    # steps[a][b] ~ 1 if distance a < distance b, computed once per pair
+    steps = [[None] * k for _ in range(k)]
+    for a in range(k):
+        for b in range(a + 1, k):
+            steps[a][b] = less_than(distances[a], distances[b], bound, iterations)
+            steps[b][a] = 1 - steps[a][b]
+
+    return [
+        _product([steps[a][b] for b in range(k) if b != a])
+        for a in range(k)
+    ]
+
+
+def _product(values: List[EncryptedArray]) -> EncryptedArray:
+    """Multiplies the given values in a balanced tree."""
+    while len(values) > 1:
+        values = [a * b for a, b in zip(values[::2], values[1::2])] + values[len(values) // 2 * 2:]
+    return values[0]
+
+
+def centroid_sums(
+    points: EncryptedArray,
+    assignments: List[EncryptedArray],
+) -> Tuple[List[EncryptedArray], List[EncryptedValue]]:
+    """
+    Returns, for each cluster, the sum of the points weighted by their
+    assignments, and the sum of the assignments (the cluster size).
+    The next centroids are sums / counts, after decryption.
+    """
+    points = points.cleaned()
+
+    sums, counts = [], []
+    for assignment in assignments:
+        assignment = assignment.cleaned()
+        if assignment.shape != (points.shape[0],) or assignment.stride != points.row_stride:
+            raise ValueError('Assignments must have the layout of `squared_distances` outputs.')
+
+        # Broadcast each assignment across its row
+        chunks = []
+        for chunk in assignment.chunks:
+            width = points.stride
+            while width < points.row_stride:
+                chunk = chunk + chunk.rotate(-width)
+                width *= 2
+            chunks.append(chunk)
+        weights = points._with_chunks(chunks, clean=False)
+
+        sums.append((points * weights).sum(axis=0))
+        counts.append(assignment.sum())
+    return sums, counts
@@ -0,0 +1,232 @@
+"""
+Encrypted comparisons, evaluated on all packed slots at once.
+
+In `crt` mode with a single plaintext prime p (`max_int` below 2^18),
+comparisons are exact, using polynomials over the integers modulo p:
+
+    equal(a, b)                 # 1 where a == b, else 0 (Fermat: 1 - (a - b)^(p - 1))
+    equal(a, b, bound=64)       # cheaper, if |a - b| < 64
+    less_than(a, b, bound=64)   # 1 where a < b, else 0, if |a - b| < 64
+
+Fermat equality multiplies about log2(p) times in sequence, and needs
+`poly_modulus_degree=32768`. Bounded comparisons interpolate the
+comparison on (-bound, bound), using about bound multiplications
+with a depth of about log2(bound) + 2.
+
+In `float` mode, comparisons are approximate: `sign` iterates odd
+polynomials which converge to the sign function on [-bound, bound]:
+
+    sign(a - b, bound=100)      # ~ +-1 (0 where a == b)
+    less_than(a, b, bound=100)  # ~ 0 or 1 (0.5 where a == b)
+    maximum(a, b, bound=100)
+
+Each iteration uses 2 levels, so a deeper context is needed,
+e.g. `initialize('float', poly_modulus_degree=16384, depth=7)`.
+Differences which are small relative to the bound give intermediate results.
+
+Inputs may be `EncryptedValue`s (scalar or packed) or `EncryptedArray`s.
+"""
+from typing import List, Optional
+
+import simplefhe
+
+
+# Odd polynomials a -> alpha * a - beta * a^3 approximating sign(a) on [-1, 1].
+# The first has a steep slope at 0 (Cheon et al.); the second converges to +-1.
+FAST_SIGN = (2126 / 1024, 1359 / 1024)
+REFINE_SIGN = (3 / 2, 1 / 2)
+
+
+def equal(a, b, bound: Optional[int] = None):
+    """
+    Returns 1 where a == b, and 0 elsewhere (`crt` mode only).
+
+    :param bound:
+        Optional bound on |a - b|. Small bounds are much cheaper
+        than the general (Fermat) test.
+    """
+    p = _prime()
+    difference = a - b
+    if bound is None:
+        return 1 - _power(difference, p - 1)
+    return _lookup(difference, bound, lambda z: int(z == 0))
+
+
+def less_than(a, b, bound, iterations: int = 3):
+    """
+    Returns 1 where a < b, and 0 elsewhere.
+
+    :param bound:
+        A bound on |a - b|. In `crt` mode, |a - b| < bound is required.
+        In `float` mode, differences near 0 (relative to the bound)
+        give results between 0 and 1.
+
+    :param iterations:
+        Number of polynomial iterations (`float` mode only).
+    """
+    if simplefhe._mode['type'] == 'float':
+        return _compare(b - a, bound, iterations, 0.5, 0.5)
+    _prime()
+    return _lookup(a - b, bound, lambda z: int(z < 0))
+
+
+def greater_than(a, b, bound, iterations: int = 3):
+    """Returns 1 where a > b, and 0 elsewhere (see `less_than`)."""
+    return less_than(b, a, bound, iterations)
+
+
+def maximum(a, b, bound, iterations: int = 3):
+    """Returns the elementwise maximum of a and b (see `less_than`)."""
+    return b + (a - b) * less_than(b, a, bound, iterations)
+
+
+def minimum(a, b, bound, iterations: int = 3):
+    """Returns the elementwise minimum of a and b (see `less_than`)."""
+    return a - (a - b) * less_than(b, a, bound, iterations)
+
+
+def sign(value, bound: float, iterations: int = 3):
+    """Returns the sign of each value in [-bound, bound], approximately (`float` mode only)."""
+    if simplefhe._mode['type'] != 'float':
+        raise ValueError('Approximate sign requires `float` mode. Use `less_than` in `crt` mode.')
+    return _compare(value, bound, iterations, 1.0, 0.0)
+
+
+# CKKS
+def _compare(value, bound: float, iterations: int, factor: float, offset: float):
+    """
+    Returns factor * sign(value) + offset (approximately), for values
+    in [-bound, bound], using 2 * iterations levels.
+    Each iteration a -> alpha a - beta a^3 is computed on y = s * a as
+    (beta / s^3 * y) * (alpha / beta * s^2 - y^2), where both factors
+    take one level, so that constants never need a separate multiplication.
+    """
+    if iterations < 1:
+        raise ValueError('At least one iteration is required.')
+    y, s = value, float(bound)
+    for i in range(iterations):
+        alpha, beta = FAST_SIGN if i < iterations - 1 else REFINE_SIGN
+        c = beta / s**3
+        if i == iterations - 1:
+            c *= factor
+        y = (c * y) * (alpha / beta * s**2 - y * y)
+        s = 1.0
+    return y + offset if offset else y
+
+
+# BFV
+def _prime() -> int:
+    """Returns the plaintext prime, if there is exactly one."""
+    mode = simplefhe._mode
+    if mode['type'] != 'crt' or len(mode['components']) != 1:
+        raise ValueError(
+            'Exact comparisons require `crt` mode with a single plaintext prime.'
+            + ' Try `max_int` below 2^18.'
+        )
+    return mode['modulus']
+
+
+def _power(value, exponent: int):
+    """Exponentiation by squaring, multiplying the squares in a balanced tree."""
+    factors = []
+    while True:
+        if exponent % 2:
+            factors.append(value)
+        exponent //= 2
+        if not exponent:
+            break
+        value = value * value
+    while len(factors) > 1:
+        factors = [x * y for x, y in zip(factors[::2], factors[1::2])] + factors[len(factors) // 2 * 2:]
+    return factors[0]
+
+
+def _lookup(difference, bound: int, function):
+    """
+    Evaluates the polynomial which agrees with the given function
+    on the integers in (-bound, bound), modulo the plaintext prime.
+    """
+    p = _prime()
+    if not 2 <= bound <= p // 2:
+        raise ValueError(f'Bound must be between 2 and {p // 2}.')
+    points = list(range(-bound + 1, bound))
+    coefficients = _interpolate(points, [function(z) for z in points], p)
+    coefficients = [c - p if c > p // 2 else c for c in coefficients]
+    return _evaluate(difference, coefficients)
+
+
+def _interpolate(points: List[int], values: List[int], p: int) -> List[int]:
+    """Returns the coefficients (lowest first) of the Lagrange interpolant modulo p."""
+    # N(z) = prod_k (z - z_k)
+    full = [1]
+    for z in points:
+        full = [(low - z * high) % p for low, high in zip([0] + full, full + [0])]
+
+    output = [0] * len(points)
+    for j, zj in enumerate(points):
+        if values[j] % p == 0:
+            continue
+        # N(z) / (z - z_j), by synthetic division
+        quotient = [0] * len(points)
+        carry = 0
+        for i in range(len(points), 0, -1):
+            carry = (full[i] + carry * zj) % p
+            quotient[i - 1] = carry
+        denominator = 1
+        for zk in points:
+            if zk != zj:
+                denominator = denominator * (zj - zk) % p
+        weight = values[j] * pow(denominator, -1, p) % p
+        output = [(c + weight * q) % p for c, q in zip(output, quotient)]
+    return output
+
+
+def _evaluate(z, coefficients: List[int]):
+    """
+    Evaluates a polynomial as E(z^2) + z O(z^2), where E and O share
+    baby steps (z^2)^i, i < k, and giant steps (z^2)^(j k), with k about
+    the square root of their degree (Paterson-Stockmeyer). This takes about
+    3 sqrt(degree / 2) multiplications, with a depth of about log2(degree) + 2.
+    """
+    even, odd = coefficients[::2], coefficients[1::2]
+    terms = max(len(even), len(odd))
+    baby = 1 << ((terms - 1).bit_length() + 1) // 2
+
+    square = z * z
+    powers = _powers(square, baby - 1)
+    step = square if baby == 1 else powers[baby // 2] * powers[baby // 2]
+    giants = _powers(step, (terms - 1) // baby)
+
+    def combine(coefficients):
+        output = 0
+        for j in range(0, len(coefficients), baby):
+            block = coefficients[j]
+            for i, c in enumerate(coefficients[j + 1:j + baby], 1):
+                if c:
+                    block = powers[i] * c + block
+            if j and not _is_zero(block):
+                block = giants[j // baby] * block
+            output = block + output
+        return output
+
+    output = combine(even)
+    odd = combine(odd)
+    if _is_zero(odd):
+        return output
+    return output + z * odd
+
+
+def _powers(value, n: int) -> list:
+    """Returns [None, value, value^2, ..., value^n], with balanced products."""
+    powers = [None, value]
+    for i in range(2, n + 1):
+        high = 1 << (i.bit_length() - 1)
+        if high == i:
+            powers.append(powers[i // 2] * powers[i // 2])
+        else:
+            powers.append(powers[high] * powers[i - high])
+    return powers
+
+
+def _is_zero(value) -> bool:
+    return isinstance(value, int) and value == 0
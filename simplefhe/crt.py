@@ -0,0 +1,234 @@
+"""
+Large-integer support via the Chinese Remainder Theorem.
+
+In `crt` mode, every value is represented by its residues modulo several
+batching-friendly primes. Each residue lives in an independent BFV
+context with a small plaintext modulus, so the exact integer range is the
+product of the primes, while the noise growth of each component is that
+of a small modulus.
+"""
+import struct
+from typing import List
+
+import numpy as np
+
+import simplefhe
+
+
+# Bit size of each plaintext prime.
+# Smaller primes leave more noise budget for computation.
+PRIME_BITS = 20
+
+
+class CRTCiphertext(tuple):
+    """One ciphertext per residue."""
+
+
+class CRTPlaintext(tuple):
+    """One plaintext per residue."""
+
+
+class CRTKey:
+    """One key (public, private or relinearization) per residue."""
+    def __init__(self, keys: list):
+        self.keys = list(keys)
+
+    def to_string(self) -> bytes:
+        return pack([key.to_string() for key in self.keys])
+
+    def save(self, filepath: str) -> None:
+        with open(filepath, 'wb') as f:
+            f.write(self.to_string())
+
+    def __reduce__(self):
+        return (_rebuild_key, (
+            type(self.keys[0]).__name__,
+            simplefhe._mode['fingerprint'],
+            self.to_string(),
+        ))
+
+
+class Residues:
+    """
+    Applies each method call to every residue component.
+
+    Arguments which are per-residue (`CRTCiphertext`, `CRTPlaintext`
+    or `CRTKey`) are split across components; all other arguments are
+    passed to each component unchanged.
+    """
+    def __init__(self, items):
+        self.items = list(items)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        methods = [getattr(item, name) for item in self.items]
+
+        def apply(*args):
+            results = [
+                method(*[_select(arg, i) for arg in args])
+                for i, method in enumerate(methods)
+            ]
+            return _combine(results)
+        return apply
+
+
+def _select(arg, i: int):
+    if isinstance(arg, (CRTCiphertext, CRTPlaintext)):
+        return arg[i]
+    if isinstance(arg, CRTKey):
+        return arg.keys[i]
+    return arg
+
+
+def _combine(results: list):
+    backend = simplefhe._backend
+    if all(isinstance(x, backend.Ciphertext) for x in results):
+        return CRTCiphertext(results)
+    if all(isinstance(x, backend.Plaintext) for x in results):
+        return CRTPlaintext(results)
+    if all(x is None for x in results):
+        return None
+    return results
+
+
+def create_components(max_int: int, poly_modulus_degree: int) -> List[dict]:
+    """
+    Creates one BFV context per plaintext prime,
+    using as many primes as needed to represent [-max_int + 1, max_int].
+    """
+    backend = simplefhe._backend
+    primes = []
+    while np.prod([p.value() for p in primes], dtype=object) <= 2 * max_int:
+        try:
+            primes = backend.PlainModulus.Batching(poly_modulus_degree, [PRIME_BITS] * (len(primes) + 1))
+        except (RuntimeError, ValueError):
+            # There are only a few batching-friendly primes of each size
+            largest = (np.prod([p.value() for p in primes], dtype=object) - 1) // 2
+            raise ValueError(
+                f'With poly_modulus_degree={poly_modulus_degree}, max_int can be at most'
+                + f' {largest} (about 2^{largest.bit_length() - 1}).'
+                + ' Smaller values of `poly_modulus_degree` admit more primes.'
+            )
+
+    components = []
+    for prime in primes:
+        parms = backend.EncryptionParameters(backend.scheme_type.bfv)
+        parms.set_poly_modulus_degree(poly_modulus_degree)
+        parms.set_coeff_modulus(backend.CoeffModulus.BFVDefault(poly_modulus_degree))
+        parms.set_plain_modulus(prime)
+
+        context = backend.SEALContext(parms)
+        components.append({
+            'context': context,
+            'evaluator': backend.Evaluator(context),
+            'encoder': backend.BatchEncoder(context),
+            'modulus': prime.value(),
+        })
+    return components
+
+
+def make_residues(cls, key: CRTKey) -> Residues:
+    """Constructs `cls(context, key)` for each residue."""
+    components = simplefhe._mode['components']
+    return Residues(
+        cls(component['context'], k)
+        for component, k in zip(components, key.keys)
+    )
+
+
+def encode_crt(item) -> CRTPlaintext:
+    """
+    Encodes the given integer into one batched plaintext per residue.
+    A scalar fills every slot; a sequence is packed into the first
+    row of slots, so that rotations act on it cyclically.
+    """
+    mode = simplefhe._mode
+    modulus = mode['modulus']
+    values = [item] if np.ndim(item) == 0 else [int(x) for x in item]
+
+    for value in values:
+        if value <= -modulus//2 or value > modulus//2:
+            raise ValueError(
+                f'Integer {value} is too large to be represented.'
+                + ' Try increasing `max_int` during initialization.'
+            )
+
+    plaintexts = []
+    for component in mode['components']:
+        encoder = component['encoder']
+        p = component['modulus']
+        if np.ndim(item) == 0:
+            slots = np.full(encoder.slot_count(), item % p, dtype=np.uint64)
+        else:
+            slots = np.zeros(encoder.slot_count(), dtype=np.uint64)
+            slots[:len(values)] = [value % p for value in values]
+        plaintexts.append(encoder.encode(slots))
+    return CRTPlaintext(plaintexts)
+
+
+def decode_crt(mode: dict, plaintexts: CRTPlaintext, length: int = 1) -> List[int]:
+    """Reconstructs the first `length` integers represented by the given residues."""
+    modulus = mode['modulus']
+    results = [0] * length
+    for component, pt in zip(mode['components'], plaintexts):
+        p = component['modulus']
+        residues = component['encoder'].decode(pt)[:length]
+        cofactor = modulus // p
+        weight = cofactor * pow(cofactor, -1, p)
+        for i, residue in enumerate(residues):
+            results[i] += (int(residue) % p) * weight
+
+    for i in range(length):
+        results[i] %= modulus
+        if results[i] > modulus // 2:
+            results[i] -= modulus
+    return results
+
+
+def load_ciphertext(mode: dict, data: bytes) -> CRTCiphertext:
+    """Deserializes the output of `pack` into a ciphertext."""
+    return CRTCiphertext(
+        component['context'].from_cipher_str(part)
+        for component, part in zip(mode['components'], unpack(data))
+    )
+
+
+def load_key(mode: dict, kind: str, data: bytes) -> CRTKey:
+    """Deserializes a key of the given kind (e.g. `PublicKey`)."""
+    from simplefhe.serialization import KEY_LOADERS
+    return CRTKey(
+        getattr(component['context'], KEY_LOADERS[kind])(part)
+        for component, part in zip(mode['components'], unpack(data))
+    )
+
+
+def _rebuild_key(kind: str, fingerprint: str, data: bytes) -> CRTKey:
+    from simplefhe.serialization import lookup_mode
+    return load_key(lookup_mode(fingerprint), kind, data)
+
+
+# Serialization of per-residue data
+def pack(parts: List[bytes]) -> bytes:
+    """Concatenates the given byte strings with length prefixes."""
+    output = [struct.pack('<I', len(parts))]
+    for part in parts:
+        output.append(struct.pack('<Q', len(part)))
+        output.append(part)
+    return b''.join(output)
+
+
+def unpack(data: bytes) -> List[bytes]:
+    """Inverse of `pack`."""
+    data = memoryview(data)
+    count, = struct.unpack_from('<I', data)
+    offset = 4
+    parts = []
+    for i in range(count):
+        length, = struct.unpack_from('<Q', data, offset)
+        offset += 8
+        if offset + length > len(data):
+            raise ValueError('Packed data is truncated.')
+        parts.append(bytes(data[offset:offset + length]))
+        offset += length
+    return parts
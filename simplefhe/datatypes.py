@@ -1,17 +1,38 @@
-from typing import List
-
-from seal import Ciphertext, Plaintext
+import math
+import numbers
+from typing import List, Optional
 
 import simplefhe
+from simplefhe import galois
+from simplefhe.crt import CRTCiphertext, CRTPlaintext
+from simplefhe.serialization import (
+    wrap_buffer, lookup_mode,
+    dump_ciphertext, load_ciphertext
+)
+
+
+# In `int` and `crt` mode, integer constants up to this size are
+# multiplied by repeated doubling, rather than by an encoded plaintext
+SMALL_CONSTANT = 16
 
 
 class EncryptedValue:
-    def __init__(self, value):
-        if isinstance(value, EncryptedValue): value = value._ciphertext
-        if not isinstance(value, Ciphertext):
-            value = simplefhe.encrypt(value)._ciphertext
+    def __init__(self, value, length: Optional[int] = None):
+        """
+        :param length:
+            The number of values packed into this ciphertext,
+            or None if it holds a single scalar.
+        """
+        if isinstance(value, EncryptedValue):
+            length = value._length if length is None else length
+            value = value._ciphertext
+        if not isinstance(value, (simplefhe._backend.Ciphertext, CRTCiphertext)):
+            encrypted = simplefhe.encrypt(value)
+            length = encrypted._length if length is None else length
+            value = encrypted._ciphertext
 
         self._ciphertext = value
+        self._length = length
         self._mode = simplefhe._mode
 
     @property
@@ -38,19 +59,20 @@ class EncryptedValue:
             for performance improvement.
             If omitted, `other` will be encrypted and passed into
             `cipher_func`.
+            `other` may also be a pre-encoded plaintext (see `encode_item`),
+            which is reused without modification.
         """
+        length = _combined_length(self, other)
         if isinstance(other, EncryptedValue):
             other = other._ciphertext
+        is_encrypted = isinstance(other, (simplefhe._backend.Ciphertext, CRTCiphertext))
 
         # Must normalize floats to same scale before adding/subtracting
         evaluator = simplefhe._evaluator
 
         # If adding, we need to match scale and modulus
         if self._is_float:
-            target_scale = simplefhe._mode['default_scale']
-            if not _is_mult:
-                self._ciphertext.scale(target_scale)
-
+            exponent = _snap_scale(self._ciphertext)
             parms = self._ciphertext.parms_id()
             def normalize(x, p=parms):
                 simplefhe._evaluator.mod_switch_to_inplace(x, p)
@@ -64,35 +86,61 @@ class EncryptedValue:
                         evaluator.rescale_to_next_inplace(x)
 
             # Determine type of other operand
-        if not isinstance(other, Ciphertext):
+        if not is_encrypted:
+            from simplefhe.arrays import EncryptedArray
             from simplefhe.encryptors import encode_item
+            if isinstance(other, EncryptedArray):
+                return NotImplemented
             if plain_func is not None:
                 # Use plain_func for performance
-                pt = encode_item(other)
-                if self._is_float: normalize(pt)
+                if _is_plaintext(other):
+                    pt = other
+                    if self._is_float and pt.parms_id() != parms:
+                        pt = evaluator.mod_switch_to(pt, parms)
+                else:
+                    # Added plaintexts are encoded at the scale of self.
+                    # Multiplied plaintexts absorb any power of two in the scale of self,
+                    # so that the product is rescaled to the default scale.
+                    scale = None
+                    if self._is_float:
+                        scale = self._ciphertext.scale()
+                        if _is_mult:
+                            scale = simplefhe._mode['default_scale'] / pow(2.0, exponent)
+                    pt = encode_item(other, scale)
+                    if self._is_float: normalize(pt)
                 result = plain_func(self._ciphertext, pt)
                 renormalize(result)
-                return EncryptedValue(result)
+                return EncryptedValue(result, length)
+            elif _is_plaintext(other):
+                raise TypeError('Pre-encoded plaintexts are not supported by this operation.')
             else:
                 # Fallback to encrypting and using cipher_func
                 other = simplefhe.encrypt(other)._ciphertext
 
-        # If adding, we need to match scale and modulus
-        #if self._is_float and not _is_mult:
+        # If adding, we need to match scale and modulus.
+        # The operand at the higher level is switched down as a copy,
+        # so that it remains usable in other computations.
+        ciphertext = self._ciphertext
         if self._is_float:
-            other.scale(target_scale)
-            try:
-                normalize(other)
-            except:
-                self._ciphertext.scale(target_scale)
-                normalize(self._ciphertext, p=other.parms_id())
+            other_exponent = _snap_scale(other)
+            if other.parms_id() != parms:
+                try:
+                    other = evaluator.mod_switch_to(other, parms)
+                except:
+                    ciphertext = evaluator.mod_switch_to(ciphertext, other.parms_id())
+
+            # Lift the operand at the lower scale, without using a level
+            if not _is_mult and other_exponent < exponent:
+                other = _lift_scale(other, exponent - other_exponent)
+            elif not _is_mult and exponent < other_exponent:
+                ciphertext = _lift_scale(ciphertext, other_exponent - exponent)
 
 
         # Compute binary operation
-        result = cipher_func(self._ciphertext, other)
+        result = cipher_func(ciphertext, other)
 
         renormalize(result)
-        return EncryptedValue(result)
+        return EncryptedValue(result, length)
 
 
     # Arithmetic
@@ -114,6 +162,10 @@ class EncryptedValue:
 
 
     def __mul__(self, other):
+        if isinstance(other, numbers.Real):
+            output = self._multiply_constant(other)
+            if output is not None:
+                return output
         return self._binop(
             other,
             simplefhe._evaluator.multiply,
@@ -121,13 +173,56 @@ class EncryptedValue:
             _is_mult = True
         )
 
+    def _multiply_constant(self, constant) -> Optional['EncryptedValue']:
+        """
+        Multiplies by an unencrypted scalar without using a level (`float`)
+        or encoding a plaintext (small integers in `int` and `crt` mode).
+        Returns None if no fast path applies.
+        """
+        if constant == 0:
+            # SEAL does not allow transparent (identically zero) results
+            return EncryptedValue(simplefhe.encrypt(0), self._length)
+        if constant < 0:
+            output = self._multiply_constant(-constant)
+            return None if output is None else -output
+        if constant == 1:
+            return EncryptedValue(self._ciphertext, self._length)
+
+        is_integer = float(constant).is_integer()
+        if not self._is_float:
+            if is_integer and constant <= SMALL_CONSTANT:
+                return _double_and_add(self, int(constant))
+            return None
+
+        mantissa, exponent = math.frexp(constant)
+        if mantissa == 0.5:
+            # Powers of two are applied to the scale, as far as it stays
+            # at or above the default scale, and otherwise as integers
+            bits = exponent - 1
+            shift = bits if bits < 0 else min(bits, max(_snap_scale(self._ciphertext), 0))
+            if bits - shift >= 62:
+                # Too large to encode as an integer
+                return None
+            if bits > shift:
+                output = _multiply_integer(self._ciphertext, pow(2, bits - shift))
+            else:
+                output = simplefhe._backend.Ciphertext(self._ciphertext)
+            output.scale(self._ciphertext.scale() / pow(2.0, shift))
+            return EncryptedValue(output, self._length)
+        if is_integer and constant < pow(2, 62):
+            # Integers are encoded exactly, at scale 1, so need no rescaling
+            output = _multiply_integer(self._ciphertext, int(constant))
+            return EncryptedValue(output, self._length)
+        return None
+
     def __neg__(self):
-        return 0 - self
+        output = simplefhe._evaluator.negate(self._ciphertext)
+        return EncryptedValue(output, self._length)
 
     __radd__ = __add__
     __rmul__ = __mul__
     def __rsub__(self, other):
-        return EncryptedValue(other) - self
+        return -self + other
 
 
     def __truediv__(self, other):
@@ -144,7 +239,7 @@ class EncryptedValue:
         evaluator.relinearize_inplace(output, simplefhe._relin_keys)
         if self._is_float:
             evaluator.rescale_to_next_inplace(output)
-        return EncryptedValue(output)
+        return EncryptedValue(output, self._length)
 
 
     def __pow__(self, other):
@@ -165,19 +260,142 @@ class EncryptedValue:
             else:
                 raise TypeError('Only non-negative, unencrypted integer exponents are supported in integer mode!')
 
+    # Packed values
+    def rotate(self, steps: int) -> 'EncryptedValue':
+        """
+        Cyclically rotates the packed slots left by the given number of steps
+        (right, if negative). Requires Galois keys.
+        """
+        galois_keys = simplefhe._galois_keys
+        if galois.record_rotation(steps) and galois_keys is None:
+            # Tracing: only the rotation steps matter
+            return EncryptedValue(self._ciphertext, self._length)
+        if galois_keys is None:
+            raise ValueError('Galois keys have not been set. Rotation not possible.')
+        if not galois.can_rotate(galois_keys, steps):
+            raise ValueError(
+                f'The Galois keys do not support rotation by {steps} steps.'
+                + ' Include it in `generate_galois_keys(steps)`,'
+                + ' or find the steps needed with `simplefhe.galois.trace_rotations`.'
+            )
+
+        evaluator = simplefhe._evaluator
+        if self._is_float:
+            output = evaluator.rotate_vector(self._ciphertext, steps, galois_keys)
+        else:
+            output = evaluator.rotate_rows(self._ciphertext, steps, galois_keys)
+        return EncryptedValue(output, self._length)
+
+    def sum(self) -> 'EncryptedValue':
+        """
+        Returns the sum of all packed values, as a scalar.
+        Uses a logarithmic number of rotations.
+        """
+        total = self
+        steps = 1
+        while steps < self._mode['slots']:
+            total = total + total.rotate(steps)
+            steps *= 2
+        return EncryptedValue(total._ciphertext)
+
+
     def __repr__(self):
         type_string = self._mode['type']
+        if self._length is not None:
+            return f'<encrypted {type_string}[{self._length}]>'
         return f'<encrypted {type_string}>'
 
 
     def save(self, filepath: str):
         """Saves this encrypted value to the given file."""
-        self._ciphertext.save(filepath)
+        if isinstance(self._ciphertext, CRTCiphertext):
+            with open(filepath, 'wb') as f:
+                f.write(dump_ciphertext(self._mode, self._ciphertext))
+        else:
+            self._ciphertext.save(filepath)
+
+
+    # Pickling
+    def __reduce_ex__(self, protocol):
+        data = dump_ciphertext(self._mode, self._ciphertext)
+        return (_rebuild_encrypted_value, (
+            self._mode['fingerprint'],
+            wrap_buffer(data, protocol),
+            self._length,
+        ))
+
+
+def _rebuild_encrypted_value(fingerprint: str, data, length=None) -> EncryptedValue:
+    mode = lookup_mode(fingerprint)
+    value = EncryptedValue(load_ciphertext(mode, data), length)
+    value._mode = mode
+    return value
+
+
+def _combined_length(a: EncryptedValue, b) -> Optional[int]:
+    """Returns the packed length of the result of a binary operation."""
+    from simplefhe.encryptors import packed_length
+    if isinstance(b, EncryptedValue):
+        b_length = b._length
+    elif _is_plaintext(b):
+        b_length = None
+    else:
+        b_length = packed_length(b)
+    if a._length is None: return b_length
+    if b_length is None: return a._length
+    return max(a._length, b_length)
+
+
+def _snap_scale(ciphertext) -> int:
+    """
+    Rounds the scale of the given (float) ciphertext to the default scale
+    times a power of two, and returns the exponent. Rescaling divides by
+    primes close to (but not exactly) the default scale.
+    """
+    default_scale = simplefhe._mode['default_scale']
+    exponent = round(math.log2(ciphertext.scale() / default_scale))
+    ciphertext.scale(default_scale * pow(2.0, exponent))
+    return exponent
+
+
+def _multiply_integer(ciphertext, constant: int):
+    """Multiplies a float ciphertext by an integer encoded at scale 1."""
+    evaluator = simplefhe._evaluator
+    plaintext = simplefhe._mode['encoder'].encode(constant)
+    evaluator.mod_switch_to_inplace(plaintext, ciphertext.parms_id())
+    return evaluator.multiply_plain(ciphertext, plaintext)
+
+
+def _lift_scale(ciphertext, bits: int):
+    """Returns the given float ciphertext, at 2^bits times its scale."""
+    output = _multiply_integer(ciphertext, pow(2, bits))
+    output.scale(ciphertext.scale() * pow(2.0, bits))
+    return output
+
+
+def _double_and_add(value: EncryptedValue, constant: int) -> EncryptedValue:
+    """Multiplies by a positive integer with additions only."""
+    output = None
+    while constant:
+        if constant % 2:
+            output = value if output is None else output + value
+        constant //= 2
+        if constant:
+            value = value + value
+    return output
+
+
+def _is_plaintext(value) -> bool:
+    return isinstance(value, (simplefhe._backend.Plaintext, CRTPlaintext))
 
 
 def load_encrypted_value(filepath: str) -> EncryptedValue:
     """Loads a saved encrypted value from the given file."""
-    ciphertext = Ciphertext()
+    if simplefhe._mode['type'] == 'crt':
+        with open(filepath, 'rb') as f:
+            return EncryptedValue(load_ciphertext(simplefhe._mode, f.read()))
+
+    ciphertext = simplefhe._backend.Ciphertext()
     ciphertext.load(simplefhe._context, filepath)
     return EncryptedValue(ciphertext)
 
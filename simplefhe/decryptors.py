@@ -1,6 +1,6 @@
-from seal import Plaintext, Ciphertext
-
 import simplefhe
+from simplefhe.crt import decode_crt
+from simplefhe.arrays import EncryptedArray
 
 
 def decrypt(item):
@@ -12,16 +12,21 @@ def decrypt(item):
     if simplefhe._relin_keys is None:
         raise ValueError('Relinearization keys have not been set. Decryption not possible.')
 
-    result = Plaintext()
-    decryptor.decrypt(item._ciphertext, result)
+    if isinstance(item, EncryptedArray):
+        return item.decrypt()
 
     mode = item._mode
+    length = item._length
+    if mode['type'] == 'crt':
+        _check_noise_budget(min(decryptor.invariant_noise_budget(item._ciphertext)))
+        decoded = decode_crt(mode, decryptor.decrypt(item._ciphertext), length or 1)
+        return decoded if length is not None else decoded[0]
+
+    result = mode['backend'].Plaintext()
+    decryptor.decrypt(item._ciphertext, result)
+
     if mode['type'] == 'int':
-        if decryptor.invariant_noise_budget(item._ciphertext) == 0:
-            raise ValueError(
-                'The noise budget has been exhausted.'
-                + ' Try calling `simplefhe.initialize` with a larger `poly_modulus_degree` or a smaller `max_int`.'
-            )
+        _check_noise_budget(decryptor.invariant_noise_budget(item._ciphertext))
         result = result.to_string()
         result = int(result, 16) 
         if result > mode['modulus'] // 2:
@@ -29,4 +34,14 @@ def decrypt(item):
         return result
     else:
         decoded = item._mode['encoder'].decode(result)
+        if length is not None:
+            return [float(x) for x in decoded[:length]]
         return float(decoded[0])
+
+
+def _check_noise_budget(budget: int):
+    if budget == 0:
+        raise ValueError(
+            'The noise budget has been exhausted.'
+            + ' Try calling `simplefhe.initialize` with a larger `poly_modulus_degree` or a smaller `max_int`.'
+        )
@@ -0,0 +1,338 @@
+"""
+Distributed execution of encrypted computations over TCP.
+
+Each node runs a worker:
+
+    python -m simplefhe.distributed --port 9000 --authkey secret
+
+A coordinator, holding the current context, ships the context and keys
+(never the private key) once to each worker, streams shards of encrypted
+inputs to whichever workers are free, and merges the partial results in a
+balanced tree, so that combining n partials uses depth log2(n):
+
+    def partial_sum(values): return sum(values[1:], values[0])
+
+    paths = (f'inputs/{i}.dat' for i in range(n_inputs))
+    shards = shard((load_encrypted_value(p) for p in paths), 100)
+    with Coordinator([('node1', 9000), ('node2', 9000)], b'secret') as coordinator:
+        total = coordinator.map_reduce(partial_sum, shards)
+
+Functions must be importable (module-level) on the workers,
+as with `multiprocessing`. Failed shards are retried, on another worker
+if the original one died. For testing, `LocalCluster` starts workers
+on localhost.
+"""
+import argparse
+import itertools
+import multiprocessing
+import operator
+import os
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import Client, Listener, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import simplefhe
+
+
+Address = Tuple[str, int]
+
+
+# Workers
+def serve(address: Address, authkey: bytes, ready=None) -> None:
+    """
+    Runs a worker, handling one coordinator connection at a time.
+
+    :param ready:
+        Optional. A connection to which the listening address
+        is sent once the worker is ready (useful with port 0).
+    """
+    with Listener(address, authkey=authkey) as listener:
+        if ready is not None:
+            ready.send(listener.address)
+            ready.close()
+        while True:
+            try:
+                conn = listener.accept()
+            except (multiprocessing.AuthenticationError, OSError):
+                continue
+            with conn:
+                if _handle(conn) == 'shutdown':
+                    return
+
+
+def _handle(conn) -> Optional[str]:
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return None
+        except Exception:
+            # The message could not be unpickled
+            reply, task_id = ('error', None, traceback.format_exc()), None
+        else:
+            kind, task_id = message[0], None
+            try:
+                if kind == 'context':
+                    simplefhe.import_context(message[1])
+                    reply = ('ready',)
+                elif kind == 'task':
+                    _, task_id, func, args = message
+                    reply = ('result', task_id, func(*args))
+                elif kind == 'shutdown':
+                    return 'shutdown'
+                else:
+                    raise ValueError(f'Unknown message type {kind!r}.')
+            except Exception:
+                reply = ('error', task_id, traceback.format_exc())
+
+        if not _send(conn, reply, task_id):
+            # The coordinator has gone (e.g. it dropped this worker after a timeout)
+            return None
+
+
+def _send(conn, reply: tuple, task_id) -> bool:
+    """Sends a reply, or the error if it cannot be sent. Returns False if the connection is lost."""
+    try:
+        conn.send(reply)
+        return True
+    except (EOFError, OSError):
+        return False
+    except Exception:
+        # The result could not be pickled
+        pass
+    try:
+        conn.send(('error', task_id, traceback.format_exc()))
+        return True
+    except Exception:
+        return False
+
+
+# Coordinator
+class _Task:
+    _ids = itertools.count()
+
+    def __init__(self, func: Callable, args: tuple, height: int):
+        """
+        :param height:
+            The height of the result in the reduction tree
+            (0 for a mapped shard).
+        """
+        self.id = next(_Task._ids)
+        self.func = func
+        self.args = args
+        self.height = height
+        self.attempts = 0
+
+
+class Coordinator:
+    def __init__(
+        self,
+        addresses: List[Address],
+        authkey: bytes,
+        retries: int = 2,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Connects to the workers at the given addresses
+        and ships them the current context and public keys.
+
+        :param retries:
+            Number of times a failed task is retried before giving up.
+
+        :param timeout:
+            Seconds after which an unresponsive worker is considered dead.
+            None to wait indefinitely.
+        """
+        self.retries = retries
+        self.timeout = timeout
+
+        state = simplefhe.export_context()
+        state['private_key'] = None
+
+        self._workers = []
+        try:
+            for address in addresses:
+                conn = Client(address, authkey=authkey)
+                self._workers.append(conn)
+                conn.send(('context', state))
+                reply = conn.recv()
+                if reply[0] != 'ready':
+                    raise RuntimeError(f'Worker at {address} could not import the context:\n{reply[2]}')
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        for conn in self._workers:
+            conn.close()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def map_reduce(
+        self,
+        func: Callable,
+        shards: Iterable,
+        reduce: Callable = operator.add,
+    ):
+        """
+        Applies `func` to each shard on the workers, and combines the
+        results pairwise with `reduce` (also on the workers) in a
+        balanced tree. Shards are sent lazily as workers become free.
+
+        Use `merge` as `reduce` to combine `simplefhe.stats` accumulators.
+        """
+        shards = iter(shards)
+        tasks = deque()
+        idle = list(self._workers)
+        busy = {}  # conn -> (task, deadline)
+        partials = {}  # height -> result awaiting a partner
+        exhausted = False
+
+        def add_partial(value, height: int):
+            if height in partials:
+                # Reduce first, to free memory
+                tasks.appendleft(_Task(reduce, (partials.pop(height), value), height + 1))
+            else:
+                partials[height] = value
+
+        def fail(task: _Task, reason: str):
+            task.attempts += 1
+            if task.attempts > self.retries:
+                raise RuntimeError(f'Task failed after {task.attempts} attempts:\n{reason}')
+            tasks.append(task)
+
+        def drop(conn, reason: str):
+            conn.close()
+            self._workers.remove(conn)
+            task, _ = busy.pop(conn)
+            fail(task, reason)
+
+        try:
+            while True:
+                # Dispatch work to idle workers
+                while idle:
+                    if not tasks and not exhausted:
+                        try:
+                            tasks.append(_Task(func, (next(shards),), 0))
+                        except StopIteration:
+                            exhausted = True
+                    if not tasks and exhausted and not busy and len(partials) > 1:
+                        # Combine leftover partials, lowest first
+                        a, b = sorted(partials)[:2]
+                        tasks.append(_Task(reduce, (partials.pop(a), partials.pop(b)), b + 1))
+                    if not tasks:
+                        break
+
+                    conn = idle.pop()
+                    task = tasks.popleft()
+                    deadline = None if self.timeout is None else time.monotonic() + self.timeout
+                    busy[conn] = (task, deadline)
+                    try:
+                        conn.send(('task', task.id, task.func, task.args))
+                    except OSError as e:
+                        drop(conn, repr(e))
+
+                if not busy:
+                    if tasks:
+                        raise RuntimeError('All workers have failed.')
+                    if not partials:
+                        raise ValueError('No shards were given.')
+                    return partials.popitem()[1]
+
+                # Wait for results
+                timeout = None
+                if self.timeout is not None:
+                    timeout = max(0, min(d for _, d in busy.values()) - time.monotonic())
+                for conn in wait(list(busy), timeout):
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError) as e:
+                        drop(conn, f'Worker connection lost: {e!r}')
+                        continue
+
+                    task, _ = busy.pop(conn)
+                    idle.append(conn)
+                    if message[0] == 'result':
+                        add_partial(message[2], task.height)
+                    else:
+                        fail(task, message[2])
+
+                now = time.monotonic()
+                for conn, (task, deadline) in list(busy.items()):
+                    if deadline is not None and now > deadline:
+                        drop(conn, f'Worker timed out after {self.timeout} seconds.')
+        except BaseException:
+            # Busy workers would send stale results on the next call
+            for conn in busy:
+                conn.close()
+                self._workers.remove(conn)
+            raise
+
+
+def merge(a, b):
+    """Merges two accumulators (see `simplefhe.stats`)."""
+    return a.merge(b)
+
+
+def shard(items: Iterable, size: int) -> Iterator[list]:
+    """Lazily splits the given items into lists of the given size."""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Local testing
+class LocalCluster:
+    def __init__(self, n_workers: int = 2, authkey: Optional[bytes] = None):
+        """Starts the given number of worker processes on localhost."""
+        self.authkey = os.urandom(16) if authkey is None else authkey
+        self.processes = []
+        self.addresses = []
+
+        context = multiprocessing.get_context('spawn')
+        for i in range(n_workers):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=serve,
+                args=(('127.0.0.1', 0), self.authkey, sender),
+                daemon=True,
+            )
+            process.start()
+            sender.close()
+            self.addresses.append(receiver.recv())
+            self.processes.append(process)
+
+    def coordinator(self, **kwargs) -> Coordinator:
+        """Returns a coordinator connected to every local worker."""
+        return Coordinator(self.addresses, self.authkey, **kwargs)
+
+    def close(self) -> None:
+        for process in self.processes:
+            process.terminate()
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a simplefhe worker.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--authkey', required=True)
+    args = parser.parse_args()
+    serve((args.host, args.port), args.authkey.encode())
@@ -1,8 +1,11 @@
-from seal import Plaintext, Ciphertext
+from typing import Optional
+
+import numpy as np
 
 import simplefhe
 
 from simplefhe.datatypes import EncryptedValue
+from simplefhe.crt import encode_crt
 
 
 def encrypt(item) -> EncryptedValue:
@@ -19,22 +22,55 @@ def encrypt(item) -> EncryptedValue:
 
     # Return encrypted result
     output = encryptor.encrypt(pt)
-    return EncryptedValue(output)
-
-
-def encode_item(item) -> Plaintext:
-    """Encode the given item to plaintext, depending on the current mode."""
-    if simplefhe._mode['type'] == 'int':
-        if isinstance(item, float):
+    return EncryptedValue(output, length=packed_length(item))
+
+
+def packed_length(item) -> Optional[int]:
+    """
+    Returns the number of values in the given item if it is a sequence
+    (to be packed into the slots of a single plaintext), or None if it is a scalar.
+    """
+    if isinstance(item, (list, tuple, np.ndarray)):
+        return len(item)
+    return None
+
+
+def encode_item(item, scale: Optional[float] = None) -> 'Plaintext':
+    """
+    Encode the given item to plaintext, depending on the current mode.
+
+    Sequences are packed into the slots of a single plaintext.
+    Scalars are encoded into every slot.
+
+    :param scale:
+        The scale to encode floats at (`float` mode only).
+        Defaults to the default scale of the context.
+    """
+    length = packed_length(item)
+    if length is not None:
+        if simplefhe._mode['type'] == 'int':
+            raise ValueError('Packed values require `float` or `crt` mode.')
+        if length > simplefhe._mode['slots']:
+            raise ValueError(
+                f'At most {simplefhe._mode["slots"]} values can be packed.'
+                + ' Try increasing `poly_modulus_degree` during initialization.'
+            )
+
+    if simplefhe._mode['type'] in ['int', 'crt']:
+        if isinstance(item, float) or (
+            length is not None and np.asarray(item).dtype.kind == 'f'
+        ):
             raise ValueError('Float computations require floating point mode to be enabled.')
+        elif simplefhe._mode['type'] == 'crt':
+            return encode_crt(item)
         else:
             return encode_int(item)
     else:
         # Encrypt as float
-        return encode_float(item)
+        return encode_float(item, scale)
 
 
-def encode_int(item: int) -> Plaintext:
+def encode_int(item: int) -> 'Plaintext':
     """Encodes the given integer into a plaintext."""
     modulus = simplefhe._mode['modulus']
 
@@ -46,14 +82,17 @@ def encode_int(item: int) -> Plaintext:
 
     item = item % modulus
     item_str = hex(item)[2:]
-    return Plaintext(item_str)
+    return simplefhe._backend.Plaintext(item_str)
 
 
-def encode_float(item: float) -> Plaintext:
-    """Encodes the given float into a plaintext.""" 
+def encode_float(item: float, scale: Optional[float] = None) -> 'Plaintext':
+    """Encodes the given float (or sequence of floats) into a plaintext.""" 
     mode = simplefhe._mode
     encoder = mode['encoder']
-    scale = mode['default_scale']
+    if scale is None:
+        scale = mode['default_scale']
     
+    if packed_length(item) is not None:
+        return encoder.encode(np.ascontiguousarray(item, dtype=np.float64), scale)
     output = encoder.encode(float(item), scale)
     return output
@@ -0,0 +1,106 @@
+"""
+Circuit-aware Galois key generation.
+
+Galois keys for every power-of-two rotation are large (tens of MB with
+the default parameters), but most computations only use a few rotations.
+Trace the rotations a computation performs, then generate keys for
+exactly those:
+
+    with trace_rotations() as steps:
+        process(encrypt([0.0] * 16))
+    galois_keys = generate_galois_keys(steps)
+
+Tracing works without Galois keys (rotations are then skipped, so the
+traced values are meaningless), and is fastest with the simulation backend.
+Computations must not branch on the number of rotations they perform.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Set
+
+import simplefhe
+
+
+# Sets of rotation steps recorded by active traces
+_traces: List[Set[int]] = []
+
+
+@contextmanager
+def trace_rotations() -> Iterator[Set[int]]:
+    """Records the steps of every rotation performed in this context."""
+    steps = set()
+    _traces.append(steps)
+    try:
+        yield steps
+    finally:
+        _traces.remove(steps)
+
+
+def record_rotation(steps: int) -> bool:
+    """Records a rotation in all active traces. Returns whether any are active."""
+    for trace in _traces:
+        trace.add(steps)
+    return bool(_traces)
+
+
+def galois_element(steps: int, poly_modulus_degree: int) -> int:
+    """
+    Returns the Galois element which rotates slots left by the given
+    number of steps (right, if negative), as in SEAL.
+    A step of 0 denotes swapping the rows (`crt`) or conjugating (`float`).
+    """
+    n = poly_modulus_degree
+    if steps == 0:
+        return 2 * n - 1
+    if abs(steps) >= n // 2:
+        raise ValueError(f'Cannot rotate by {steps} steps. At most {n // 2 - 1} steps are possible.')
+    if steps < 0:
+        steps += n // 2
+    return pow(3, steps, 2 * n)
+
+
+def naf(value: int) -> List[int]:
+    """Returns the non-adjacent form of the given integer, as signed powers of two."""
+    output = []
+    bit = 1
+    while value:
+        if value % 2:
+            digit = 2 - (value % 4)
+            output.append(digit * bit)
+            value -= digit
+        value //= 2
+        bit *= 2
+    return output
+
+
+def can_rotate(galois_keys, steps: int) -> bool:
+    """
+    Returns whether the given keys support rotation by the given steps,
+    either directly, or (as SEAL falls back to) as a sequence of
+    rotations by signed powers of two.
+    """
+    keys = _first_key(galois_keys)
+    n = simplefhe._mode['params']['poly_modulus_degree']
+    if keys.has_key(galois_element(steps, n)):
+        return True
+    parts = naf(steps)
+    return len(parts) > 1 and all(keys.has_key(galois_element(s, n)) for s in parts)
+
+
+def rotation_steps(galois_keys) -> List[int]:
+    """
+    Returns the rotations the given keys were generated for,
+    as left rotations in [0, slots).
+    """
+    keys = _first_key(galois_keys)
+    n = simplefhe._mode['params']['poly_modulus_degree']
+    return [
+        steps for steps in range(n // 2)
+        if keys.has_key(galois_element(steps, n))
+    ]
+
+
+def _first_key(galois_keys):
+    # In `crt` mode, every residue has keys for the same elements
+    if isinstance(galois_keys, simplefhe.crt.CRTKey):
+        return galois_keys.keys[0]
+    return galois_keys
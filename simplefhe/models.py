@@ -0,0 +1,518 @@
+"""
+Encrypted inference for plaintext linear and polynomial models.
+
+The server holds a plaintext model, and evaluates it on encrypted inputs:
+
+    model = Model([Linear(W1, b1), Polynomial([0, 0, 1]), Linear(W2, b2)])
+
+    batch = model.encrypt(X)     # client: one row of X per sample
+    output = model(batch)        # server
+    output.decrypt()             # client: approximately model applied to X
+
+Compilation folds each polynomial activation into the preceding linear
+layer (so that a quadratic costs a single squaring, and a cubic two
+multiplications), and merges consecutive linear layers. Weights are
+encoded once per level and reused for every batch; the products of each
+linear layer are summed before a single rescale.
+
+Two input layouts are supported, and `Model.layout` picks the cheaper
+one for a given batch size:
+
+- `features`: each ciphertext holds one feature of up to `slots` samples.
+  Linear layers use one plaintext multiplication per nonzero weight,
+  and no rotations.
+- `diagonal`: each ciphertext holds a single sample, replicated with a
+  period of `model.period` slots. Linear layers use one plaintext
+  multiplication per nonzero (generalized) diagonal of the weight matrix,
+  and baby-step giant-step rotations by 1 and by `model.baby_steps`.
+
+Each linear layer uses one multiplicative level, and each activation of
+degree 2 or 3 uses another one or two. Check `model.depth` against the
+`depth` given to `initialize`. Models are only supported in `float` mode.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import simplefhe
+from simplefhe.datatypes import EncryptedValue, _lift_scale, _snap_scale
+
+
+# Cost of a rotation relative to a plaintext multiplication,
+# used to choose between layouts
+ROTATION_COST = 10
+
+
+# Layers
+class Linear:
+    def __init__(self, weights, bias=None):
+        """
+        :param weights:
+            Matrix of shape (outputs, inputs). A vector is treated
+            as a single output.
+        """
+        self.weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if bias is None:
+            bias = 0.0
+        self.bias = np.broadcast_to(np.asarray(bias, dtype=float), (len(self.weights),)).copy()
+
+
+class Polynomial:
+    def __init__(self, coefficients: Sequence[float]):
+        """
+        An activation applied elementwise.
+
+        :param coefficients:
+            Lowest degree first. Degrees of at most 3 are supported.
+        """
+        coefficients = np.trim_zeros(np.asarray(coefficients, dtype=float), 'b')
+        if len(coefficients) > 4:
+            raise ValueError('Only polynomials of degree at most 3 are supported.')
+        self.coefficients = np.pad(coefficients, (0, max(2 - len(coefficients), 0)))
+
+
+def sigmoid_polynomial(degree: int = 3, interval: float = 8.0) -> Polynomial:
+    """
+    Returns the least-squares polynomial approximation of the logistic
+    function on [-interval, interval].
+    """
+    t = np.linspace(-interval, interval, 1001)
+    return Polynomial(np.polynomial.polynomial.polyfit(t, 1 / (1 + np.exp(-t)), degree))
+
+
+# Compiled stages
+class _Stage:
+    """
+    One or two linear maps, followed by a compiled activation:
+    - `linear`: u
+    - `square`: sign * u^2 + constants[0]
+    - `cubic`: u * (sign * v^2 + constants[0]) + constants[1]
+    where u and v are the outputs of the first and second map.
+    """
+    def __init__(self, layer: Linear):
+        self.weights = [layer.weights]
+        self.biases = [layer.bias]
+        self.kind = 'linear'
+        self.sign = 1.0
+        self.constants = ()
+
+    @property
+    def depth(self) -> int:
+        return {'linear': 1, 'square': 2, 'cubic': 3}[self.kind]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.weights[0].shape
+
+    def then(self, layer: Linear) -> None:
+        """Composes the following linear layer into this one."""
+        W, b = self.weights[0], self.biases[0]
+        self.weights = [layer.weights @ W]
+        self.biases = [layer.weights @ b + layer.bias]
+
+    def fold(self, polynomial: Polynomial) -> None:
+        """Folds the given activation into this (linear) stage."""
+        W, b = self.weights[0], self.biases[0]
+        a = polynomial.coefficients
+        if len(a) == 2:
+            self.weights = [a[1] * W]
+            self.biases = [a[1] * b + a[0]]
+        elif len(a) == 3:
+            # a2 x^2 + a1 x + a0 = a2 (x + c)^2 + e
+            c = a[1] / (2 * a[2])
+            scale = np.sqrt(abs(a[2]))
+            self.weights = [scale * W]
+            self.biases = [scale * (b + c)]
+            self.kind = 'square'
+            self.sign = np.sign(a[2])
+            self.constants = (a[0] - a[2] * c * c,)
+        else:
+            # Substituting x = u - h removes the quadratic term:
+            # p(x) = u (a3 u^2 + e1) + e0
+            h = a[2] / (3 * a[3])
+            shifted = np.polynomial.Polynomial(a)(np.polynomial.Polynomial([-h, 1])).coef
+            scale = np.sqrt(abs(a[3]))
+            self.weights = [W, scale * W]
+            self.biases = [b + h, scale * (b + h)]
+            self.kind = 'cubic'
+            self.sign = np.sign(a[3])
+            self.constants = (shifted[1], shifted[0])
+
+    def activate(self, outputs: List[EncryptedValue], model: 'Model', key) -> EncryptedValue:
+        """Applies the compiled activation to the outputs of the linear maps."""
+        if self.kind == 'linear':
+            return outputs[0]
+        if self.kind == 'square':
+            u, = outputs
+            return _add_constant(_signed(u.square(), self.sign), self.constants[0], model, key + (0,))
+        u, v = outputs
+        w = _add_constant(_signed(v.square(), self.sign), self.constants[0], model, key + (0,))
+        return _add_constant(u * w, self.constants[1], model, key + (1,))
+
+
+def _signed(value: EncryptedValue, sign: float) -> EncryptedValue:
+    return value if sign >= 0 else -value
+
+
+def _add_constant(value: EncryptedValue, constant: float, model: 'Model', key) -> EncryptedValue:
+    if constant == 0:
+        return value
+    [value], parms_id, exponent = _normalize([value])
+    scale = simplefhe._mode['default_scale'] * pow(2.0, exponent)
+    plaintext = model._encoded(key + (exponent,), parms_id, lambda: [(constant, scale)])[0]
+    return EncryptedValue(simplefhe._evaluator.add_plain(value._ciphertext, plaintext), value._length)
+
+
+# Models
+class Model:
+    def __init__(self, layers: Sequence):
+        """
+        Compiles the given sequence of `Linear` and `Polynomial` layers.
+        Every polynomial must directly follow a linear layer.
+        """
+        self._stages: List[_Stage] = []
+        for layer in layers:
+            previous = self._stages[-1] if self._stages else None
+            if isinstance(layer, Linear):
+                if previous is not None and layer.weights.shape[1] != previous.shape[0]:
+                    raise ValueError(
+                        f'Layer of shape {layer.weights.shape} does not match'
+                        + f' the {previous.shape[0]} outputs of the previous layer.'
+                    )
+                if previous is not None and previous.kind == 'linear':
+                    previous.then(layer)
+                else:
+                    self._stages.append(_Stage(layer))
+            elif isinstance(layer, Polynomial):
+                if previous is None or previous.kind != 'linear':
+                    raise ValueError('Polynomial layers must directly follow a Linear layer.')
+                previous.fold(layer)
+            else:
+                raise TypeError(f'Unsupported layer type {type(layer).__name__}.')
+        if not self._stages:
+            raise ValueError('A model needs at least one Linear layer.')
+
+        dims = [n for stage in self._stages for n in stage.shape]
+        self.period = _next_power_of_two(max(dims))
+        self.baby_steps = _next_power_of_two(int(np.ceil(np.sqrt(self.period))))
+        self._plaintexts: Dict[tuple, list] = {}
+
+    @property
+    def input_size(self) -> int:
+        return self._stages[0].shape[1]
+
+    @property
+    def output_size(self) -> int:
+        return self._stages[-1].shape[0]
+
+    @property
+    def depth(self) -> int:
+        """The number of multiplicative levels used."""
+        return sum(stage.depth for stage in self._stages)
+
+    def __repr__(self):
+        return f'<model {self.input_size} -> {self.output_size}, depth {self.depth}>'
+
+
+    # Layouts
+    def layout(self, batch_size: int) -> str:
+        """Returns the cheaper layout (`features` or `diagonal`) for the given number of samples."""
+        slots = simplefhe._mode['slots']
+        if self.period > slots:
+            return 'features'
+        features = -(-batch_size // slots) * sum(
+            np.count_nonzero(W) for stage in self._stages for W in stage.weights
+        )
+        giant_steps = self.period // self.baby_steps
+        diagonal = batch_size * sum(
+            len(_diagonals(W, self.period, self.baby_steps))
+            + ROTATION_COST * (self.baby_steps + giant_steps - 2)
+            for stage in self._stages for W in stage.weights
+        )
+        return 'diagonal' if diagonal < features else 'features'
+
+    def encrypt(self, samples, layout: Optional[str] = None) -> 'EncryptedBatch':
+        """
+        Encrypts the given samples (client-side), one per row,
+        in the given layout (by default, the cheapest one).
+        """
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        if samples.shape[1] != self.input_size:
+            raise ValueError(f'Expected {self.input_size} features, got {samples.shape[1]}.')
+        if layout is None:
+            layout = self.layout(len(samples))
+        return encrypt_batch(samples, layout, self.period)
+
+
+    # Evaluation
+    def __call__(self, batch: 'EncryptedBatch') -> 'EncryptedBatch':
+        """Evaluates this model on the given encrypted batch (server-side)."""
+        if simplefhe._mode['type'] != 'float':
+            raise ValueError('Models require `float` mode.')
+        if self.depth > simplefhe._mode['depth']:
+            raise ValueError(
+                f'This model needs {self.depth} multiplicative levels,'
+                + f' but only {simplefhe._mode["depth"]} are available.'
+                + f" Try `initialize('float', poly_modulus_degree=16384, depth={self.depth})`."
+            )
+        if batch.width != self.input_size:
+            raise ValueError(f'Expected {self.input_size} features, got {batch.width}.')
+
+        if batch.layout == 'features':
+            chunks = [self._evaluate_features(chunk) for chunk in batch.chunks]
+        else:
+            if batch.period != self.period:
+                raise ValueError(f'Expected a diagonal layout with period {self.period}.')
+            chunks = [[self._evaluate_diagonal(chunk[0])] for chunk in batch.chunks]
+        return EncryptedBatch(chunks, batch.size, self.output_size, batch.layout, batch.period)
+
+    def _encoded(self, key: tuple, parms_id, values) -> list:
+        """
+        Returns the plaintexts for the given key at the given level,
+        encoding them on first use. `values` returns (value, scale) pairs.
+        """
+        full_key = key + (tuple(parms_id),)
+        if full_key not in self._plaintexts:
+            self._plaintexts[full_key] = [
+                _encode(value, scale, parms_id)
+                for value, scale in values()
+            ]
+        return self._plaintexts[full_key]
+
+    def _evaluate_features(self, columns: List[EncryptedValue]) -> List[EncryptedValue]:
+        length = columns[0]._length
+        scale = simplefhe._mode['default_scale']
+        for s, stage in enumerate(self._stages):
+            columns, parms_id, exponent = _normalize(columns)
+            outputs = []
+            for m, (W, b) in enumerate(zip(stage.weights, stage.biases)):
+                # Each distinct weight is encoded once; the bias is added before rescaling
+                distinct = np.unique(W[W != 0])
+                plaintexts = self._encoded(
+                    ('features', s, m, exponent), parms_id,
+                    lambda: [(w, scale / pow(2.0, exponent)) for w in distinct] + [(x, scale ** 2) for x in b]
+                )
+                weights = dict(zip(distinct, plaintexts))
+                biases = plaintexts[len(distinct):]
+                outputs.append([
+                    _linear_combination(
+                        [(columns[i], weights[w]) for i, w in enumerate(row) if w != 0],
+                        biases[j], parms_id, length, b[j]
+                    )
+                    for j, row in enumerate(W)
+                ])
+            columns = [
+                stage.activate(list(parts), self, ('activation', s))
+                for parts in zip(*outputs)
+            ]
+        return columns
+
+    def _evaluate_diagonal(self, x: EncryptedValue) -> EncryptedValue:
+        n, baby = self.period, self.baby_steps
+        slots = simplefhe._mode['slots']
+        scale = simplefhe._mode['default_scale']
+        for s, stage in enumerate(self._stages):
+            [x], parms_id, exponent = _normalize([x])
+            diagonals = [_diagonals(W, n, baby) for W in stage.weights]
+
+            # Baby steps: x rotated by 0, 1, ..., shared by all maps
+            rotated = [x]
+            needed = max([b for d in diagonals for (g, b) in d] + [0])
+            while len(rotated) <= needed:
+                rotated.append(rotated[-1].rotate(1))
+
+            outputs = []
+            for m, (d, b) in enumerate(zip(diagonals, stage.biases)):
+                tiled_bias = np.tile(np.pad(b, (0, n - len(b))), slots // n)
+                plaintexts = self._encoded(
+                    ('diagonal', s, m, exponent), parms_id,
+                    lambda: (
+                        [(np.tile(d[k], slots // n), scale / pow(2.0, exponent)) for k in sorted(d)]
+                        + [(tiled_bias, scale ** 2)]
+                    )
+                )
+                encoded = dict(zip(sorted(d), plaintexts))
+
+                # Giant steps, in Horner form: rotations by `baby` only
+                total = None
+                for g in reversed(range(n // baby)):
+                    if total is not None:
+                        total = total.rotate(baby)
+                    terms = [(rotated[k[1]], encoded[k]) for k in sorted(d) if k[0] == g]
+                    if terms:
+                        inner = _products(terms)
+                        total = inner if total is None else _sum(total, inner)
+                outputs.append(_rescale(total, plaintexts[-1], parms_id, x._length, tiled_bias))
+            x = stage.activate(outputs, self, ('activation', s))
+        return x
+
+
+def _next_power_of_two(n: int) -> int:
+    return 1 << max(n - 1, 0).bit_length()
+
+
+def _diagonals(W: np.ndarray, n: int, baby: int) -> Dict[Tuple[int, int], np.ndarray]:
+    """
+    Returns the nonzero generalized diagonals of W (zero-padded to n x n),
+    keyed by (giant step, baby step), each pre-rotated by its giant step.
+    Diagonal k holds W[i, (i + k) % n] in position i.
+    """
+    padded = np.zeros((n, n))
+    padded[:W.shape[0], :W.shape[1]] = W
+    i = np.arange(n)
+    rows, columns = np.nonzero(padded)
+    output = {}
+    for k in np.unique((columns - rows) % n):
+        g, b = divmod(int(k), baby)
+        output[g, b] = np.roll(padded[i, (i + k) % n], g * baby)
+    return output
+
+
+def _encode(value, scale: float, parms_id) -> 'Plaintext':
+    encoder = simplefhe._mode['encoder']
+    if np.ndim(value) == 0:
+        plaintext = encoder.encode(float(value), scale)
+    else:
+        plaintext = encoder.encode(np.ascontiguousarray(value, dtype=np.float64), scale)
+    return simplefhe._evaluator.mod_switch_to(plaintext, parms_id)
+
+
+def _normalize(values: List[EncryptedValue]):
+    """
+    Returns copies of the values at their lowest level, and at a common scale
+    of the default scale times a power of two (see `_snap_scale`),
+    along with that level and exponent. Multiplied plaintexts should
+    absorb the power of two, so that products are at the default scale.
+    """
+    evaluator = simplefhe._evaluator
+    parms_id = values[0]._ciphertext.parms_id()
+    ciphertexts = []
+    for value in values:
+        try:
+            ciphertexts.append(evaluator.mod_switch_to(value._ciphertext, parms_id))
+        except ValueError:
+            # At a lower level than the previous values
+            parms_id = value._ciphertext.parms_id()
+            ciphertexts = [evaluator.mod_switch_to(c, parms_id) for c in ciphertexts]
+            ciphertexts.append(evaluator.mod_switch_to(value._ciphertext, parms_id))
+
+    exponents = [_snap_scale(c) for c in ciphertexts]
+    exponent = max(exponents)
+    ciphertexts = [
+        c if e == exponent else _lift_scale(c, exponent - e)
+        for c, e in zip(ciphertexts, exponents)
+    ]
+    values = [EncryptedValue(c, value._length) for c, value in zip(ciphertexts, values)]
+    return values, parms_id, exponent
+
+
+def _products(terms) -> EncryptedValue:
+    """Sums the products of (value, plaintext) pairs, without rescaling."""
+    evaluator = simplefhe._evaluator
+    total = None
+    for value, plaintext in terms:
+        product = evaluator.multiply_plain(value._ciphertext, plaintext)
+        if total is None:
+            total = product
+        else:
+            evaluator.add_inplace(total, product)
+    return EncryptedValue(total, terms[0][0]._length)
+
+
+def _sum(a: EncryptedValue, b: EncryptedValue) -> EncryptedValue:
+    return EncryptedValue(simplefhe._evaluator.add(a._ciphertext, b._ciphertext), a._length)
+
+
+def _linear_combination(terms, bias, parms_id, length, bias_value) -> EncryptedValue:
+    return _rescale(_products(terms) if terms else None, bias, parms_id, length, bias_value)
+
+
+def _rescale(total: Optional[EncryptedValue], bias, parms_id, length, bias_value) -> EncryptedValue:
+    """Adds the bias to a sum of products, and rescales once."""
+    evaluator = simplefhe._evaluator
+    if total is None:
+        # No nonzero weights: a fresh encryption of the bias, at the output level
+        ciphertext = simplefhe.encrypt(np.broadcast_to(bias_value, (length,)).tolist())._ciphertext
+        evaluator.mod_switch_to_inplace(ciphertext, parms_id)
+        evaluator.mod_switch_to_next_inplace(ciphertext)
+        return EncryptedValue(ciphertext, length)
+
+    ciphertext = total._ciphertext
+    if np.any(bias_value):
+        evaluator.add_plain_inplace(ciphertext, bias)
+    evaluator.rescale_to_next_inplace(ciphertext)
+    _snap_scale(ciphertext)
+    return EncryptedValue(ciphertext, length)
+
+
+# Batches
+class EncryptedBatch:
+    def __init__(
+        self,
+        chunks: List[List[EncryptedValue]],
+        size: int,
+        width: int,
+        layout: str,
+        period: Optional[int] = None,
+    ):
+        """
+        :param chunks:
+            In the `features` layout, one ciphertext per feature for each
+            chunk of up to `slots` samples. In the `diagonal` layout,
+            a single ciphertext for each sample.
+
+        :param period:
+            In the `diagonal` layout, the period with which each sample
+            is replicated across the slots.
+        """
+        if layout not in ['features', 'diagonal']:
+            raise ValueError("layout must be 'features' or 'diagonal'")
+        self.chunks = chunks
+        self.size = size
+        self.width = width
+        self.layout = layout
+        self.period = period
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self):
+        return f'<encrypted batch {self.size} x {self.width} ({self.layout})>'
+
+    def decrypt(self) -> np.ndarray:
+        """Decrypts this batch (client-side), one row per sample."""
+        if self.layout == 'features':
+            blocks = [
+                np.column_stack([simplefhe.decrypt(value) for value in chunk])
+                for chunk in self.chunks
+            ]
+            return np.concatenate(blocks).astype(float)
+        return np.array([
+            simplefhe.decrypt(chunk[0])[:self.width] for chunk in self.chunks
+        ], dtype=float)
+
+
+def encrypt_batch(samples, layout: str = 'features', period: Optional[int] = None) -> EncryptedBatch:
+    """
+    Encrypts the given samples (one per row) in the given layout.
+    The `diagonal` layout requires the period of the model (see `Model.encrypt`).
+    """
+    samples = np.atleast_2d(np.asarray(samples, dtype=float))
+    size, width = samples.shape
+    slots = simplefhe._mode['slots']
+
+    if layout == 'features':
+        chunks = [
+            [simplefhe.encrypt(column) for column in samples[start:start + slots].T]
+            for start in range(0, size, slots)
+        ]
+    elif layout == 'diagonal':
+        if period is None or period < width or slots % period != 0:
+            raise ValueError('The diagonal layout requires a power-of-two period of at least the sample width.')
+        chunks = [
+            [simplefhe.encrypt(np.tile(np.pad(sample, (0, period - width)), slots // period))]
+            for sample in samples
+        ]
+    else:
+        raise ValueError("layout must be 'features' or 'diagonal'")
+    return EncryptedBatch(chunks, size, width, layout, period)
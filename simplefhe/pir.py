@@ -0,0 +1,165 @@
+"""
+Private lookups (PIR) against a plaintext table held by the server.
+
+The client encrypts a selection vector, and the server returns the
+selected rows without learning which rows were requested:
+
+    # Server
+    database = Database(table)        # 1-D values, or 2-D records
+
+    # Client
+    query = Query([17, 4200], database.shape)
+    response = database.answer(query.ciphertexts)   # on the server
+    rows = query.decrypt(response)                  # table[[17, 4200]]
+
+Layout: the table is split into chunks of `rows_per_chunk` rows, each
+pre-encoded into a single plaintext with row r of the chunk at slot
+r * width (width being the record size, rounded up to a power of two).
+The query is a packed one-hot vector selecting row position j within
+every chunk. Each chunk is multiplied by the query (one plaintext
+multiplication), and the products are shifted by (chunk index) * width
+and added in a balanced tree (one rotation per chunk, by powers of two),
+so the response is a single ciphertext holding the selected row of every
+chunk, side by side. Work is one plaintext multiplication per chunk
+(rather than per row), and each query and response is one ciphertext.
+
+Several queries are answered at once when their response positions
+do not overlap; `Query` groups indices into as few ciphertexts as possible.
+
+Private lookups are only supported in `float` and `crt` mode.
+Rotations are by multiples of `width` times powers of two.
+"""
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+import simplefhe
+from simplefhe.datatypes import EncryptedValue
+from simplefhe.encryptors import encode_item
+
+
+def layout(shape: Tuple[int, ...]) -> Tuple[int, int, int]:
+    """
+    Returns the slot width of each record, the number of rows per chunk,
+    and the number of chunks, for a table of the given shape.
+    """
+    if len(shape) not in [1, 2]:
+        raise ValueError('Only 1-D and 2-D tables are supported.')
+    if simplefhe._mode['type'] == 'int':
+        raise ValueError('Private lookups require `float` or `crt` mode.')
+
+    if shape[0] == 0:
+        raise ValueError('Table must not be empty.')
+
+    fields = shape[1] if len(shape) == 2 else 1
+    width = 1 << max(fields - 1, 0).bit_length()
+    rows_per_chunk = simplefhe._mode['slots'] // width
+    if rows_per_chunk == 0:
+        raise ValueError('Records are too long to be packed. Try increasing `poly_modulus_degree`.')
+    n_chunks = -(-shape[0] // rows_per_chunk)
+    if n_chunks > rows_per_chunk:
+        raise ValueError(
+            'Table is too large for private lookups.'
+            + ' Try increasing `poly_modulus_degree`, or split the table.'
+        )
+    return width, rows_per_chunk, n_chunks
+
+
+class Database:
+    def __init__(self, table):
+        """
+        Pre-encodes the given plaintext table (server-side).
+        Each row of a 2-D table is a record, returned as a whole.
+        """
+        table = np.asarray(table)
+        self.shape = table.shape
+        self.width, self.rows_per_chunk, n_chunks = layout(self.shape)
+
+        records = table.reshape(self.shape[0], -1)
+        self.chunks = []
+        for c in range(n_chunks):
+            block = records[c * self.rows_per_chunk:(c + 1) * self.rows_per_chunk]
+            slots = np.zeros((len(block), self.width), dtype=table.dtype)
+            slots[:, :records.shape[1]] = block
+            self.chunks.append(encode_item(slots.ravel().tolist()))
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def answer(self, ciphertexts: Iterable[EncryptedValue]) -> List[EncryptedValue]:
+        """Answers each query ciphertext (see `Query`) with a single response ciphertext."""
+        return [self._answer(query) for query in ciphertexts]
+
+    def _answer(self, query: EncryptedValue) -> EncryptedValue:
+        selected = [query * chunk for chunk in self.chunks]
+
+        # Shift chunk c by c * width, in a balanced tree
+        shift = self.width
+        while len(selected) > 1:
+            combined = [
+                a + b.rotate(-shift)
+                for a, b in zip(selected[::2], selected[1::2])
+            ]
+            if len(selected) % 2 == 1:
+                combined.append(selected[-1])
+            selected = combined
+            shift *= 2
+        return selected[0]
+
+
+class Query:
+    def __init__(self, indices: Iterable[int], shape: Tuple[int, ...]):
+        """
+        Encrypts a private lookup of the given row indices (client-side),
+        into a table of the given (public) shape.
+        The ciphertexts to send to the server are in `self.ciphertexts`.
+        """
+        self.indices = [int(i) for i in indices]
+        self.shape = tuple(shape)
+        self.width, self.rows_per_chunk, self.n_chunks = layout(self.shape)
+
+        for i in self.indices:
+            if not 0 <= i < self.shape[0]:
+                raise IndexError(f'Index {i} is out of range for a table of {self.shape[0]} rows.')
+
+        # Group indices whose responses do not overlap.
+        # The response to a row position includes that row of every chunk.
+        self._batches = []   # (row positions, occupied response positions)
+        self._batch_of = {}
+        for i in dict.fromkeys(self.indices):
+            position = i % self.rows_per_chunk
+            span = {(position + c) % self.rows_per_chunk for c in range(self.n_chunks)}
+            for b, (positions, occupied) in enumerate(self._batches):
+                if position in positions or not span & occupied:
+                    break
+            else:
+                b = len(self._batches)
+                self._batches.append((set(), set()))
+            self._batches[b][0].add(position)
+            self._batches[b][1].update(span)
+            self._batch_of[i] = b
+
+        fields = self.shape[1] if len(self.shape) == 2 else 1
+        self.ciphertexts = []
+        for positions, _ in self._batches:
+            selection = np.zeros((self.rows_per_chunk, self.width), dtype=int)
+            selection[sorted(positions), :fields] = 1
+            self.ciphertexts.append(simplefhe.encrypt(selection.ravel().tolist()))
+
+    def decrypt(self, responses: List[EncryptedValue]) -> np.ndarray:
+        """Decrypts the responses into the requested rows, in order."""
+        if len(responses) != len(self.ciphertexts):
+            raise ValueError(f'Expected {len(self.ciphertexts)} responses, got {len(responses)}.')
+        slots = [np.asarray(simplefhe.decrypt(response), dtype=object) for response in responses]
+
+        fields = self.shape[1] if len(self.shape) == 2 else 1
+        rows = []
+        for i in self.indices:
+            chunk, position = divmod(i, self.rows_per_chunk)
+            start = (position + chunk) % self.rows_per_chunk * self.width
+            rows.append(slots[self._batch_of[i]][start:start + fields])
+
+        output = np.array(rows).reshape((len(self.indices),) + self.shape[1:])
+        if simplefhe._mode['type'] == 'float':
+            output = output.astype(float)
+        return output
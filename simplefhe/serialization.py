@@ -0,0 +1,82 @@
+"""
+Pickle support for encrypted values and keys.
+
+Only the serialized SEAL object and the fingerprint of its
+encryption context are pickled. On unpickling, the object is
+rebound to the matching context, which must already have been
+initialized in the receiving process (see `simplefhe.import_context`).
+"""
+import copyreg
+import pickle
+
+import simplefhe
+from simplefhe import crt
+
+
+# Context method used to deserialize each kind of key
+KEY_LOADERS = {
+    'PublicKey': 'from_public_str',
+    'SecretKey': 'from_secret_str',
+    'RelinKeys': 'from_relin_str',
+    'GaloisKeys': 'from_galois_str',
+}
+
+
+def wrap_buffer(data: bytes, protocol: int):
+    """
+    Wraps serialized data for pickling.
+    With protocol 5 or higher, the data may be transferred out-of-band.
+    """
+    if protocol >= 5:
+        return pickle.PickleBuffer(data)
+    return data
+
+
+def lookup_mode(fingerprint: str) -> dict:
+    """Returns the cached context state with the given fingerprint."""
+    try:
+        return simplefhe._contexts[fingerprint]
+    except KeyError:
+        raise ValueError(
+            'No matching encryption context found for unpickled value.'
+            + ' Call `simplefhe.initialize` with the same parameters first.'
+        )
+
+
+def dump_ciphertext(mode: dict, ciphertext) -> bytes:
+    """Serializes the given ciphertext (or residues, in `crt` mode)."""
+    if mode['type'] == 'crt':
+        return crt.pack([ct.to_string() for ct in ciphertext])
+    return ciphertext.to_string()
+
+
+def load_ciphertext(mode: dict, data):
+    """Inverse of `dump_ciphertext`."""
+    if mode['type'] == 'crt':
+        return crt.load_ciphertext(mode, bytes(data))
+    return mode['context'].from_cipher_str(bytes(data))
+
+
+def load_key(mode: dict, kind: str, data):
+    """Deserializes a key of the given kind (e.g. `PublicKey`)."""
+    if mode['type'] == 'crt':
+        return crt.load_key(mode, kind, bytes(data))
+    return getattr(mode['context'], KEY_LOADERS[kind])(bytes(data))
+
+
+def _reduce_key(key):
+    return (_rebuild_key, (
+        type(key).__name__,
+        simplefhe._mode['fingerprint'],
+        key.to_string(),
+    ))
+
+
+def _rebuild_key(kind: str, fingerprint: str, data):
+    return load_key(lookup_mode(fingerprint), kind, data)
+
+
+def register_key_types(backend) -> None:
+    """Makes the key types of the given backend picklable."""
+    for kind in KEY_LOADERS:
+        copyreg.pickle(getattr(backend, kind), _reduce_key)
@@ -0,0 +1,218 @@
+"""
+Mergeable accumulators for encrypted aggregate statistics.
+
+Each accumulator consumes a stream of encrypted records and can be merged
+with accumulators computed on other shards or workers. Products are summed
+before relinearization, so each record costs a single ciphertext
+multiplication, and relinearization (and rescaling, in float mode) happens
+only once when the results are requested.
+
+Records may be scalars or packed values (e.g. `encrypt([x0, x1, x2])`),
+in which case statistics are computed per slot.
+"""
+from bisect import bisect_right
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+import simplefhe
+from simplefhe.datatypes import EncryptedValue
+
+
+class Accumulator:
+    """Base class for accumulators over a stream of encrypted records."""
+    # Attributes which must agree for accumulators to be merged
+    _parameters = ()
+
+    def __init__(self):
+        self.count = 0
+
+    def update(self, record: EncryptedValue) -> None:
+        raise NotImplementedError
+
+    def update_many(self, records: Iterable[EncryptedValue]) -> None:
+        """Consumes each record in the given stream."""
+        for record in records:
+            self.update(record)
+
+    def merge(self, other: 'Accumulator') -> 'Accumulator':
+        """Adds the contents of another accumulator into this one."""
+        if type(other) is not type(self):
+            raise TypeError(f'Cannot merge {type(other).__name__} into {type(self).__name__}')
+        for name in self._parameters:
+            if getattr(other, name) != getattr(self, name):
+                raise ValueError(
+                    f'Cannot merge {type(self).__name__} with {name}={getattr(other, name)}'
+                    + f' into {name}={getattr(self, name)}'
+                )
+        self.count += other.count
+        for name, value in vars(other).items():
+            if isinstance(value, EncryptedValue):
+                setattr(self, name, _add(getattr(self, name), value))
+            elif isinstance(value, list) and value and isinstance(value[0], EncryptedValue):
+                setattr(self, name, [_add(a, b) for a, b in zip(getattr(self, name), value)])
+        return self
+
+    def _check_nonempty(self):
+        if self.count == 0:
+            raise ValueError('No records have been accumulated.')
+
+
+class Moments(Accumulator):
+    """Streaming count, sum and sum of squares."""
+    def __init__(self):
+        super().__init__()
+        self._sum = None
+        self._squares = None
+
+    def update(self, record: EncryptedValue) -> None:
+        self.count += 1
+        self._sum = _add(self._sum, record)
+        self._squares = _add(self._squares, _product(record, record))
+
+    def sum(self) -> EncryptedValue:
+        self._check_nonempty()
+        return self._sum
+
+    def sum_of_squares(self) -> EncryptedValue:
+        self._check_nonempty()
+        return _relinearize(self._squares)
+
+    def mean(self) -> EncryptedValue:
+        return self.sum() / self.count
+
+    def variance(self) -> EncryptedValue:
+        """The (biased) variance. Uses two multiplicative levels."""
+        return self.sum_of_squares() / self.count - self.mean().square()
+
+    def decrypt(self) -> dict:
+        """
+        Decrypts the accumulated statistics (client-side).
+        The mean and variance are computed after decryption,
+        so no multiplicative depth is used.
+        """
+        total = np.array(simplefhe.decrypt(self.sum()), dtype=float)
+        squares = np.array(simplefhe.decrypt(self.sum_of_squares()), dtype=float)
+        mean = total / self.count
+        return {
+            'count': self.count,
+            'sum': total.tolist(),
+            'mean': mean.tolist(),
+            'variance': (squares / self.count - mean**2).tolist(),
+        }
+
+
+class Covariance(Accumulator):
+    """
+    Streaming sums and cross products of packed records of the given dimension.
+
+    Cross products are accumulated along diagonals: the kth diagonal holds
+    x[i] * x[i + k] in slot i, obtained by multiplying each record with a
+    rotated copy of itself. This takes `dimension - 1` rotations
+    and `dimension` multiplications per record.
+    """
+    _parameters = ('dimension',)
+
+    def __init__(self, dimension: int):
+        super().__init__()
+        self.dimension = dimension
+        self._sum = None
+        self._diagonals = [None] * dimension
+
+    def update(self, record: EncryptedValue) -> None:
+        self.count += 1
+        self._sum = _add(self._sum, record)
+
+        shifted = record
+        for k in range(self.dimension):
+            if k > 0:
+                shifted = shifted.rotate(1)
+            self._diagonals[k] = _add(self._diagonals[k], _product(record, shifted))
+
+    def sum(self) -> EncryptedValue:
+        self._check_nonempty()
+        return self._sum
+
+    def diagonals(self) -> List[EncryptedValue]:
+        """The accumulated diagonals of the (uncentered) cross-product matrix."""
+        self._check_nonempty()
+        return [_relinearize(diagonal) for diagonal in self._diagonals]
+
+    def decrypt(self) -> np.ndarray:
+        """Decrypts the covariance matrix (client-side)."""
+        d = self.dimension
+        mean = np.array(simplefhe.decrypt(self.sum())[:d], dtype=float) / self.count
+
+        products = np.zeros((d, d))
+        for k, diagonal in enumerate(self.diagonals()):
+            values = simplefhe.decrypt(diagonal)
+            for i in range(d - k):
+                products[i, i + k] = products[i + k, i] = values[i]
+        return products / self.count - np.outer(mean, mean)
+
+
+class Histogram(Accumulator):
+    """
+    Streaming bucket counts.
+    Each record must be a packed one-hot encoding of its bucket
+    (see `one_hot` and `bucket`).
+    """
+    _parameters = ('bins',)
+
+    def __init__(self, bins: int):
+        super().__init__()
+        self.bins = bins
+        self._counts = None
+
+    def update(self, record: EncryptedValue) -> None:
+        self.count += 1
+        self._counts = _add(self._counts, record)
+
+    def counts(self) -> EncryptedValue:
+        self._check_nonempty()
+        return self._counts
+
+    def decrypt(self) -> List[int]:
+        """Decrypts the bucket counts (client-side)."""
+        counts = simplefhe.decrypt(self.counts())[:self.bins]
+        return [int(round(x)) for x in counts]
+
+
+def bucket(value: float, edges: List[float]) -> int:
+    """
+    Returns the index of the bucket containing `value`,
+    where bucket i is [edges[i-1], edges[i]).
+    Values below edges[0] fall in bucket 0, and values at or above
+    edges[-1] fall in bucket len(edges).
+    """
+    return bisect_right(edges, value)
+
+
+def one_hot(index: int, bins: int) -> List[int]:
+    """Returns a one-hot encoding of the given index, to be packed and encrypted."""
+    output = [0] * bins
+    output[index] = 1
+    return output
+
+
+# Accumulated products are kept unrelinearized (and, in float mode, at the
+# squared scale) until the results are requested. Sums still go through
+# `EncryptedValue` addition, which matches the levels and scales of records
+# that have already been computed on (e.g. `encrypt(x) / 2`).
+def _add(total: Optional[EncryptedValue], value: EncryptedValue) -> EncryptedValue:
+    if total is None:
+        return value
+    return total + value
+
+
+def _product(a: EncryptedValue, b: EncryptedValue) -> EncryptedValue:
+    output = simplefhe._evaluator.multiply(a._ciphertext, b._ciphertext)
+    return EncryptedValue(output, a._length)
+
+
+def _relinearize(value: EncryptedValue) -> EncryptedValue:
+    evaluator = simplefhe._evaluator
+    output = evaluator.relinearize(value._ciphertext, simplefhe._relin_keys)
+    if value._is_float:
+        evaluator.rescale_to_next_inplace(output)
+    return EncryptedValue(output, value._length)
@@ -0,0 +1,322 @@
+"""
+Encrypted columnar tables, with filters and group-by aggregation.
+
+Each column is a packed 1-D `EncryptedArray`. Categorical columns are
+encrypted as one-hot indicator columns (one per category), so that the
+server can aggregate by group without learning any row's category:
+
+    table = encrypt_table(
+        {'region': regions, 'revenue': revenue, 'cost': cost},
+        categories={'region': ['eu', 'us', 'apac']},
+    )
+    table['profit'] = table['revenue'] - table['cost']     # column arithmetic
+    recent = table.filter(dates >= cutoff)                 # plaintext or encrypted 0/1 mask
+    sums = recent.groupby('region').sum('profit')          # {'eu': <encrypted>, ...}
+    counts = recent.groupby('region').count()
+    recent.save('recent.table')
+
+Filters do not remove rows: they set a 0/1 weight for each row, which
+aggregations multiply in. Aggregations use one multiplication per mask
+or indicator involved (at most two levels), and a logarithmic number of
+rotations per group.
+
+The schema (column names, and the categories of categorical columns)
+and the number of rows are public. Tables are supported in `float` and
+`crt` mode.
+
+Saved tables hold a JSON header (schema, number of rows, filter and
+context fingerprint) followed by the serialized ciphertexts, so that
+loading a table from an untrusted source cannot execute code.
+Categories must therefore be strings, numbers, booleans or None.
+"""
+import json
+import struct
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+import simplefhe
+from simplefhe import crt
+from simplefhe.arrays import EncryptedArray, encrypt_array
+from simplefhe.checkpoint import atomic_write
+from simplefhe.datatypes import EncryptedValue
+from simplefhe.serialization import dump_ciphertext, load_ciphertext
+
+
+TABLE_VERSION = 2
+
+Mask = Union[np.ndarray, EncryptedArray]
+
+
+class EncryptedTable:
+    def __init__(
+        self,
+        columns: Dict[str, EncryptedArray],
+        indicators: Dict[str, Dict[object, EncryptedArray]],
+        n_rows: int,
+        mask: Optional[Mask] = None,
+    ):
+        """
+        :param indicators:
+            For each categorical column, a 0/1 column per category.
+
+        :param mask:
+            Optional 0/1 weight of each row (see `filter`).
+        """
+        self.columns = columns
+        self.indicators = indicators
+        self.n_rows = n_rows
+        self.mask = mask
+
+    @property
+    def schema(self) -> Dict[str, Union[str, list]]:
+        """Maps each column to 'numeric', or to its list of categories."""
+        schema = {name: 'numeric' for name in self.columns}
+        schema.update({name: list(groups) for name, groups in self.indicators.items()})
+        return schema
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __repr__(self):
+        return f'<encrypted table rows={self.n_rows} columns={list(self.schema)}>'
+
+
+    # Columns
+    def __getitem__(self, name: str) -> EncryptedArray:
+        if name in self.indicators:
+            raise KeyError(f'{name!r} is categorical. Use `indicator` or `groupby`.')
+        return self.columns[name]
+
+    def __setitem__(self, name: str, column: EncryptedArray) -> None:
+        if name in self.indicators:
+            raise KeyError(f'{name!r} is categorical.')
+        if not isinstance(column, EncryptedArray):
+            raise TypeError('Columns must be encrypted arrays.')
+        if column.shape != (self.n_rows,) or column.stride != 1:
+            raise ValueError(f'Column must have shape ({self.n_rows},), with the layout of `encrypt_array`.')
+        self.columns[name] = column
+
+    def indicator(self, name: str, category) -> EncryptedArray:
+        """Returns the encrypted 0/1 column of rows in the given category."""
+        if name not in self.indicators:
+            raise KeyError(f'{name!r} is not a categorical column.')
+        if category not in self.indicators[name]:
+            raise KeyError(f'Unknown category {category!r} of column {name!r}.')
+        return self.indicators[name][category]
+
+
+    # Filters
+    def filter(self, mask: Mask) -> 'EncryptedTable':
+        """
+        Returns this table restricted to the rows where `mask` is 1.
+        The mask may be a plaintext or encrypted 0/1 array of shape (n_rows,);
+        filters are combined by multiplying their masks.
+        """
+        if isinstance(mask, EncryptedArray):
+            if mask.shape != (self.n_rows,) or mask.stride != 1:
+                raise ValueError(f'Mask must have shape ({self.n_rows},), with the layout of `encrypt_array`.')
+        else:
+            mask = np.asarray(mask)
+            if mask.shape != (self.n_rows,):
+                raise ValueError(f'Mask must have shape ({self.n_rows},).')
+            if not np.isin(mask, [0, 1]).all():
+                raise ValueError('Mask values must be 0 or 1.')
+            mask = mask.astype(int)
+
+        if self.mask is not None:
+            mask = self.mask * mask
+        return EncryptedTable(dict(self.columns), self.indicators, self.n_rows, mask)
+
+    def where(self, name: str, category) -> 'EncryptedTable':
+        """Returns this table restricted to the given category of a categorical column."""
+        return self.filter(self.indicator(name, category))
+
+
+    # Aggregation
+    def sum(self, name: str) -> EncryptedValue:
+        """Returns the sum of the given column over the selected rows."""
+        column = self[name]
+        if self.mask is not None:
+            column = column * self.mask
+        return column.sum()
+
+    def count(self) -> Union[int, EncryptedValue]:
+        """
+        Returns the number of selected rows.
+        This is public (an int) unless the table was filtered by an encrypted mask.
+        """
+        if self.mask is None:
+            return self.n_rows
+        if isinstance(self.mask, np.ndarray):
+            return int(self.mask.sum())
+        return self.mask.sum()
+
+    def groupby(self, name: str) -> 'GroupBy':
+        """Groups the selected rows by the given categorical column."""
+        if name not in self.indicators:
+            raise KeyError(f'{name!r} is not a categorical column.')
+        return GroupBy(self, name)
+
+
+    # Container file
+    def save(self, filepath: str) -> None:
+        """Atomically saves this table (with its schema and filter) to the given file."""
+        arrays = list(self.columns.values())
+        for groups in self.indicators.values():
+            arrays.extend(groups.values())
+
+        mask, mask_type = b'', None
+        if isinstance(self.mask, EncryptedArray):
+            arrays.append(self.mask)
+            mask_type = 'encrypted'
+        elif self.mask is not None:
+            mask, mask_type = self.mask.astype(np.uint8).tobytes(), 'plain'
+
+        header = {
+            'version': TABLE_VERSION,
+            'fingerprint': simplefhe._mode['fingerprint'],
+            'schema': {
+                name: groups if groups == 'numeric' else [_dump_category(g) for g in groups]
+                for name, groups in self.schema.items()
+            },
+            'n_rows': self.n_rows,
+            'mask': mask_type,
+            'arrays': [
+                {'lengths': [chunk._length for chunk in array.chunks], 'clean': array._clean}
+                for array in arrays
+            ],
+        }
+        parts = [json.dumps(header).encode(), mask]
+        for array in arrays:
+            parts.extend(dump_ciphertext(simplefhe._mode, chunk._ciphertext) for chunk in array.chunks)
+        atomic_write(filepath, crt.pack(parts), prefix='.table-')
+
+
+class GroupBy:
+    def __init__(self, table: EncryptedTable, name: str):
+        self.table = table
+        self.name = name
+
+    def _weights(self) -> Dict[object, EncryptedArray]:
+        # Indicators of the selected rows in each group
+        mask = self.table.mask
+        return {
+            group: indicator if mask is None else indicator * mask
+            for group, indicator in self.table.indicators[self.name].items()
+        }
+
+    def sum(self, name: str) -> Dict[object, EncryptedValue]:
+        """Returns the sum of the given column in each group."""
+        column = self.table[name]
+        return {
+            group: (column * weights).sum()
+            for group, weights in self._weights().items()
+        }
+
+    def count(self) -> Dict[object, EncryptedValue]:
+        """Returns the number of selected rows in each group."""
+        return {group: weights.sum() for group, weights in self._weights().items()}
+
+
+def encrypt_table(
+    data: Mapping[str, Sequence],
+    categories: Optional[Mapping[str, Iterable]] = None,
+) -> EncryptedTable:
+    """
+    Encrypts a table given as a mapping from column names to equal-length columns.
+
+    :param categories:
+        The possible values of each categorical column (public).
+        Categorical columns are encrypted as one 0/1 indicator column per value.
+    """
+    categories = {name: list(groups) for name, groups in (categories or {}).items()}
+    for name in categories:
+        if name not in data:
+            raise KeyError(f'Categorical column {name!r} is missing from the data.')
+
+    lengths = {len(column) for column in data.values()}
+    if len(lengths) != 1:
+        raise ValueError('Table must have at least one column, and all columns must have the same length.')
+    n_rows = lengths.pop()
+    if n_rows == 0:
+        raise ValueError('Table must not be empty.')
+
+    columns, indicators = {}, {}
+    for name, values in data.items():
+        if name not in categories:
+            columns[name] = encrypt_array(np.asarray(values))
+            continue
+
+        values = list(values)
+        unknown = set(values) - set(categories[name])
+        if unknown:
+            raise ValueError(f'Column {name!r} has values outside its categories: {sorted(map(str, unknown))}.')
+        indicators[name] = {
+            group: encrypt_array(np.array([int(v == group) for v in values]))
+            for group in categories[name]
+        }
+    return EncryptedTable(columns, indicators, n_rows)
+
+
+def load_table(filepath: str) -> EncryptedTable:
+    """
+    Loads a table saved by `EncryptedTable.save`.
+    The current context must match the one the table was saved under.
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    try:
+        parts = crt.unpack(data)
+        header = json.loads(parts[0])
+    except (struct.error, IndexError, ValueError):
+        raise ValueError(f'{filepath} is not a saved table.')
+
+    if not isinstance(header, dict) or header.get('version') != TABLE_VERSION:
+        raise ValueError(f'Unsupported table version in {filepath}.')
+    if header['fingerprint'] != simplefhe._mode['fingerprint']:
+        raise ValueError(
+            f'Table {filepath} was saved under different initialization parameters.'
+        )
+    n_rows = header['n_rows']
+    if len(parts) != 2 + sum(len(array['lengths']) for array in header['arrays']):
+        raise ValueError(f'Table {filepath} is truncated or corrupted.')
+
+    # Ciphertexts follow in the order of the header
+    ciphertexts = iter(parts[2:])
+    arrays = iter([
+        EncryptedArray(
+            [
+                EncryptedValue(load_ciphertext(simplefhe._mode, next(ciphertexts)), length)
+                for length in array['lengths']
+            ],
+            (n_rows,), clean=array['clean'],
+        )
+        for array in header['arrays']
+    ])
+
+    columns, indicators = {}, {}
+    for name, groups in header['schema'].items():
+        if groups == 'numeric':
+            columns[name] = next(arrays)
+        else:
+            indicators[name] = {group: next(arrays) for group in groups}
+
+    mask = None
+    if header['mask'] == 'encrypted':
+        mask = next(arrays)
+    elif header['mask'] == 'plain':
+        mask = np.frombuffer(parts[1], dtype=np.uint8).astype(int)
+    return EncryptedTable(columns, indicators, n_rows, mask)
+
+
+def _dump_category(category):
+    # Categories are stored in the JSON header
+    if isinstance(category, np.generic):
+        category = category.item()
+    if category is not None and not isinstance(category, (str, int, float)):
+        raise TypeError(
+            f'Category {category!r} cannot be saved.'
+            + ' Categories must be strings, numbers, booleans or None.'
+        )
+    return category
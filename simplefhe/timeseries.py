@@ -0,0 +1,242 @@
+"""
+Sliding-window operators over packed encrypted time series.
+
+A series is packed into the slots of as few ciphertexts ("chunks") as
+possible. Consecutive chunks overlap by `overlap` samples, so that
+windowed operators only rotate within each chunk:
+
+    x = encrypt_series(samples)
+    x.rolling_sum(60)       # log2(60) + popcount(60) - 1 rotations
+    x.rolling_mean(16)
+    x.diff()                # x[t] - x[t - 1]
+    x.convolve([0.25, 0.5, 0.25])   # causal FIR filter
+
+All operators are causal (the output at time t depends on samples up to t),
+with samples before the start of the series taken to be zero. Each chunk
+holds samples [c * step - overlap, c * step + step), where step is
+`slots - overlap`. An operator which looks back h samples invalidates the
+first h slots of each chunk; the total look-back of a computation must not
+exceed the overlap.
+
+Rotations are right rotations by powers of two (and, for long filters,
+by 1 and a baby step), so the default Galois keys suffice.
+Series are supported in `float` and `crt` mode.
+"""
+import numbers
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+import simplefhe
+from simplefhe.datatypes import EncryptedValue
+
+
+class EncryptedSeries:
+    # Defer numpy operands to the reflected operators below
+    __array_ufunc__ = None
+
+    def __init__(
+        self,
+        chunks: List[EncryptedValue],
+        length: int,
+        overlap: int,
+        lookback: int = 0,
+    ):
+        """
+        :param overlap:
+            Number of samples each chunk shares with the previous one.
+
+        :param lookback:
+            Number of leading slots of each chunk which no longer hold
+            valid values, i.e. the look-back of the operators applied so far.
+        """
+        self.chunks = chunks
+        self.length = length
+        self.overlap = overlap
+        self.lookback = lookback
+
+    @property
+    def step(self) -> int:
+        """Number of new samples in each chunk."""
+        return simplefhe._mode['slots'] - self.overlap
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self):
+        return f'<encrypted series length={self.length}>'
+
+    def _with_chunks(self, chunks: List[EncryptedValue], lookback: int = 0) -> 'EncryptedSeries':
+        lookback = self.lookback + lookback
+        if lookback > self.overlap:
+            raise ValueError(
+                f'This computation looks back {lookback} samples,'
+                + f' but chunks only overlap by {self.overlap}.'
+                + ' Increase `overlap` in `encrypt_series`.'
+            )
+        return EncryptedSeries(chunks, self.length, self.overlap, lookback)
+
+
+    # Elementwise arithmetic
+    def _binop(self, other, func):
+        if isinstance(other, EncryptedSeries):
+            if (other.length, other.overlap) != (self.length, self.overlap):
+                raise ValueError('Encrypted series must have the same length and overlap.')
+            chunks = [func(a, b) for a, b in zip(self.chunks, other.chunks)]
+            lookback = max(self.lookback, other.lookback)
+            return EncryptedSeries(chunks, self.length, self.overlap, lookback)
+        if isinstance(other, (numbers.Number, EncryptedValue)):
+            return self._with_chunks([func(a, other) for a in self.chunks])
+
+        # Plaintext sequences are laid out in chunks, as in `encrypt_series`
+        other = np.asarray(other)
+        if other.shape != (self.length,):
+            raise ValueError(
+                f'Plaintext operand must have shape ({self.length},),'
+                + f' not {other.shape}.'
+            )
+        chunks = []
+        for a, values in zip(self.chunks, _chunk_values(other, self.overlap)):
+            # SEAL does not allow multiplication by an all-zero plaintext
+            chunks.append(func(a, values.tolist() if values.any() else 0))
+        return self._with_chunks(chunks)
+
+    def __add__(self, other):
+        return self._binop(other, lambda a, b: a + b)
+
+    def __sub__(self, other):
+        return self._binop(other, lambda a, b: a - b)
+
+    def __mul__(self, other):
+        return self._binop(other, lambda a, b: a * b)
+
+    def __neg__(self):
+        return self._with_chunks([-chunk for chunk in self.chunks])
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+    def __rsub__(self, other):
+        return -self + other
+
+
+    # Windowed operators
+    def shift(self, lag: int = 1) -> 'EncryptedSeries':
+        """Returns the series delayed by `lag` samples: x[t - lag]."""
+        if lag < 0:
+            raise ValueError('Only non-negative lags are supported.')
+        if lag == 0:
+            return self
+        return self._with_chunks([chunk.rotate(-lag) for chunk in self.chunks], lag)
+
+    def diff(self, lag: int = 1) -> 'EncryptedSeries':
+        """Returns the lagged difference x[t] - x[t - lag]."""
+        return self - self.shift(lag)
+
+    def rolling_sum(self, window: int) -> 'EncryptedSeries':
+        """
+        Returns the sum over trailing windows, x[t - window + 1] + ... + x[t],
+        using about 2 * log2(window) rotations.
+        """
+        if window < 1:
+            raise ValueError('Window must be positive.')
+        return self._with_chunks([_rolling_sum(chunk, window) for chunk in self.chunks], window - 1)
+
+    def rolling_mean(self, window: int) -> 'EncryptedSeries':
+        """Returns the mean over trailing windows (`float` mode only)."""
+        return self.rolling_sum(window) * (1 / window)
+
+    def convolve(self, kernel: Sequence) -> 'EncryptedSeries':
+        """
+        Applies a causal FIR filter with the given plaintext kernel:
+        y[t] = kernel[0] * x[t] + kernel[1] * x[t - 1] + ...
+        Uses one plaintext multiplication per nonzero coefficient,
+        and about 2 * sqrt(len(kernel)) rotations.
+        """
+        kernel = list(kernel)
+        if not any(kernel):
+            raise ValueError('Kernel must have a nonzero coefficient.')
+        chunks = [_convolve(chunk, kernel) for chunk in self.chunks]
+        return self._with_chunks(chunks, len(kernel) - 1)
+
+
+    def decrypt(self) -> np.ndarray:
+        """Decrypts this series (client-side)."""
+        values = [
+            simplefhe.decrypt(chunk)[self.overlap:]
+            for chunk in self.chunks
+        ]
+        output = np.concatenate(values)[:self.length]
+        if simplefhe._mode['type'] == 'float':
+            output = output.astype(float)
+        return output
+
+
+def encrypt_series(values, overlap: Optional[int] = None) -> EncryptedSeries:
+    """
+    Encrypts a 1-D series into overlapping chunks.
+
+    :param overlap:
+        The longest look-back supported by computations on the series
+        (e.g. window - 1 for a rolling sum). Defaults to 1/16 of the slots.
+    """
+    values = np.asarray(values)
+    if values.ndim != 1:
+        raise ValueError('Only 1-D series are supported.')
+    slots = simplefhe._mode['slots']
+    if overlap is None:
+        overlap = slots // 16
+    if not 0 <= overlap < slots:
+        raise ValueError(f'Overlap must be between 0 and {slots - 1}.')
+
+    chunks = [
+        simplefhe.encrypt(chunk.tolist())
+        for chunk in _chunk_values(values, overlap)
+    ]
+    return EncryptedSeries(chunks, len(values), overlap)
+
+
+def _chunk_values(values: np.ndarray, overlap: int) -> List[np.ndarray]:
+    # Chunk c holds samples [c * step - overlap, c * step + step)
+    slots = simplefhe._mode['slots']
+    step = slots - overlap
+    padded = np.concatenate([np.zeros(overlap, dtype=values.dtype), values])
+    return [
+        padded[start:start + slots]
+        for start in range(0, max(len(values), 1), step)
+    ]
+
+
+def _rolling_sum(value: EncryptedValue, window: int) -> EncryptedValue:
+    # sums[b] holds trailing sums over 2^b samples
+    sums = [value]
+    while 2 ** len(sums) <= window:
+        sums.append(sums[-1] + sums[-1].rotate(-2 ** (len(sums) - 1)))
+
+    # Combine the binary digits of the window, highest first
+    bits = [b for b in range(len(sums)) if window >> b & 1]
+    output = sums[bits[-1]]
+    for b in reversed(bits[:-1]):
+        output = output.rotate(-2 ** b) + sums[b]
+    return output
+
+
+def _convolve(value: EncryptedValue, kernel: list) -> EncryptedValue:
+    # Baby steps x[t - b], shared by all giant steps
+    baby = 1 << (int(np.ceil(np.sqrt(len(kernel)))) - 1).bit_length()
+    delayed = [value]
+    for b in range(1, min(baby, len(kernel))):
+        delayed.append(delayed[-1].rotate(-1))
+
+    # Giant steps, in Horner form: y = sum_g (sum_b k[g B + b] x[t - b])[t - g B]
+    output = None
+    for g in reversed(range(-(-len(kernel) // baby))):
+        if output is not None:
+            output = output.rotate(-baby)
+        terms = [
+            delayed[b] * k
+            for b, k in enumerate(kernel[g * baby:(g + 1) * baby]) if k != 0
+        ]
+        if terms:
+            inner = sum(terms[1:], terms[0])
+            output = inner if output is None else output + inner
+    return output
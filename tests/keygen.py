@@ -0,0 +1,23 @@
+"""Shared test setup: initializes a context and sets freshly generated keys."""
+from simplefhe import (
+    initialize,
+    generate_keypair, generate_galois_keys,
+    set_public_key, set_private_key, set_relin_keys, set_galois_keys
+)
+
+
+def setup_keys(mode: str, galois_keys: bool = True, **kwargs):
+    """
+    Initializes the given mode, and sets a new keypair.
+
+    :param galois_keys:
+        Whether to also set Galois keys for every power-of-two rotation.
+        Tests which trace their rotations set these themselves.
+    """
+    initialize(mode, **kwargs)
+    pub, priv, relin = generate_keypair()
+    set_public_key(pub)
+    set_private_key(priv)
+    set_relin_keys(relin)
+    if galois_keys:
+        set_galois_keys(generate_galois_keys())
@@ -10,6 +10,8 @@ from simplefhe import (
     display_config
 )
 
+from keygen import setup_keys
+
 ITERATIONS = 25
 
 
@@ -46,6 +48,62 @@ class test_int(unittest.TestCase):
         a = lambda: encrypt(3)**-1
         self.assertRaises(TypeError, a)
 
+    def test_constants(self):
+        a = self.randint()
+        x = encrypt(a)
+        for c in [0, 1, -1, 2, 7, -16, 100]:
+            self.assertEqual(decrypt(x * c), a * c)
+            self.assertEqual(decrypt(c * x), a * c)
+        self.assertEqual(decrypt(-x), -a)
+        self.assertEqual(decrypt(5 - x), 5 - a)
+
+    def test_running_sum(self):
+        true = 0
+        target = 0
+        for i in range(ITERATIONS):
+            x = self.randint()
+            true += x
+            target += encrypt(x)
+        self.assertEqual(decrypt(target), true)
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        initialize('crt', max_int=pow(2, 64))
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+        display_config()
+
+    def randint(self):
+        return random.randint(-pow(2, 31), pow(2, 31))
+
+    def binop_test(self, binop):
+        for i in range(ITERATIONS):
+            a = self.randint()
+            b = self.randint()
+            self.assertEqual(decrypt(binop(encrypt(a), encrypt(b))), binop(a, b))
+            self.assertEqual(decrypt(binop(encrypt(a), b)), binop(a, b))
+
+    def test_addition(self): self.binop_test(op.add)
+    def test_subtraction(self): self.binop_test(op.sub)
+    def test_multiplication(self): self.binop_test(op.mul)
+
+    def test_pow(self):
+        for i in range(ITERATIONS):
+            a = random.randint(-1000, 1000)
+            b = random.randint(0, 6)
+            self.assertEqual(decrypt(encrypt(a)**b), a**b)
+
+    def test_constants(self):
+        a = self.randint()
+        x = encrypt([a, 1, -2])
+        for c in [0, -1, 3, 16, -12345]:
+            self.assertEqual(decrypt(x * c), [a * c, c, -2 * c])
+        self.assertEqual(decrypt(-x), [-a, -1, 2])
+
     def test_running_sum(self):
         true = 0
         target = 0
@@ -91,6 +149,32 @@ class test_float(unittest.TestCase):
                 places=3
             )
 
+    def test_constants(self):
+        a, b = self.rand(), self.rand() / 1000
+        x, y = encrypt(a), encrypt(b)
+        parms_id = x._ciphertext.parms_id()
+
+        # Integers, powers of two and negation use no levels
+        z = -(x * 3) / 4 * -2 + x / 2 - x * 0.125
+        self.assertEqual(z._ciphertext.parms_id(), parms_id)
+        self.assertAlmostEqual(decrypt(z), 1.875 * a, places=3)
+        for _ in range(10):
+            z = z * 2 / 8 * 4
+        self.assertEqual(z._ciphertext.parms_id(), parms_id)
+        self.assertAlmostEqual(decrypt(z * y * y + 1.5), 1.875 * a * b * b + 1.5, places=2)
+
+        self.assertAlmostEqual(decrypt(x * 0), 0, places=3)
+        self.assertAlmostEqual(decrypt(x / 16 + y), a / 16 + b, places=3)
+        self.assertAlmostEqual(decrypt(y + x / 16), a / 16 + b, places=3)
+        self.assertAlmostEqual(decrypt(x / 16 * y), a * b / 16, places=2)
+
+    def test_large_constant(self):
+        # Powers of two too large to encode as integers use a plaintext product
+        setup_keys('float', galois_keys=False, poly_modulus_degree=16384, depth=3)
+        x = encrypt(3.0)
+        self.assertAlmostEqual(decrypt(x * 2.0**70) / 2**70, 3.0, places=3)
+        self.assertAlmostEqual(decrypt(x * -2.0**66) / 2**66, -3.0, places=3)
+
     def test_pow(self):
         for i in range(ITERATIONS):
             a = self.rand() / 500
@@ -0,0 +1,129 @@
+import unittest
+
+import numpy as np
+
+from simplefhe import encrypt, decrypt, encrypt_array
+
+from keygen import setup_keys
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float')
+        self.x = np.array([1.5, -2.0, 3.25, 0.5])
+        self.W = np.array([[1.0, 0.0, 2.0, -1.0], [0.5, 0.5, 0.5, 0.5], [0.0, 1.0, 0.0, 3.0]])
+
+    def assertClose(self, actual, expected):
+        np.testing.assert_allclose(actual, expected, atol=1e-3)
+
+    def test_elementwise(self):
+        x = encrypt_array(self.x)
+        y = encrypt_array(self.x[::-1])
+        self.assertClose(decrypt(x + y), self.x + self.x[::-1])
+        self.assertClose(decrypt(x * y), self.x * self.x[::-1])
+        self.assertClose(decrypt(np.subtract(x, self.x)), 0)
+        self.assertClose(decrypt(1 - x), 1 - self.x)
+        self.assertClose(decrypt(-x), -self.x)
+        self.assertClose(decrypt(encrypt(2.0) * x), 2 * self.x)
+
+    def test_broadcast(self):
+        A = encrypt_array(self.W)
+        self.assertClose(decrypt(A), self.W)
+        self.assertClose(decrypt(A * self.x), self.W * self.x)
+        self.assertClose(decrypt(A + 1), self.W + 1)
+
+        # Encrypted rows and columns are replicated
+        x = encrypt_array(self.x)
+        self.assertClose(decrypt(A * x), self.W * self.x)
+        self.assertClose(decrypt(x - A), self.x - self.W)
+        self.assertClose(decrypt(A + encrypt_array(self.W[:, :1])), self.W + self.W[:, :1])
+        self.assertClose(decrypt(A.sum(axis=1) + encrypt_array(self.W[:, 0])), self.W.sum(1) + self.W[:, 0])
+
+    def test_sum(self):
+        x = encrypt_array(self.x)
+        A = encrypt_array(self.W)
+        self.assertClose(decrypt(np.sum(x)), self.x.sum())
+        self.assertClose(decrypt(np.sum(A * 2, axis=0)), 2 * self.W.sum(0))
+        self.assertClose(decrypt(A.sum(axis=1)), self.W.sum(1))
+        self.assertClose(decrypt(np.mean(x + 1)), self.x.mean() + 1)
+
+    def test_dot(self):
+        x = encrypt_array(self.x)
+        self.assertClose(decrypt(np.dot(x, self.x)), self.x @ self.x)
+        self.assertClose(decrypt(self.W @ x), self.W @ self.x)
+        self.assertClose(decrypt(np.dot(self.W, x) + 1), self.W @ self.x + 1)
+        self.assertClose(decrypt(x @ self.W.T), self.x @ self.W.T)
+        self.assertClose(decrypt(encrypt_array(self.W) @ self.x), self.W @ self.x)
+        self.assertClose(decrypt(encrypt_array(self.W) @ x), self.W @ self.x)
+
+    def test_matmul(self):
+        X = np.linspace(-1, 1, 3000 * 4).reshape(3000, 4)
+        W = self.W.T[:, :2]
+        self.assertClose(decrypt(encrypt_array(X) @ W), X @ W)
+        self.assertClose(decrypt(encrypt_array(self.x) @ encrypt_array(W)), self.x @ W)
+
+    def test_large(self):
+        # Layouts spanning several ciphertexts, with rotations across chunks
+        rng = np.random.default_rng(0)
+        A = rng.normal(size=(1000, 5))
+        w = rng.normal(size=1000)
+        X, x = encrypt_array(A), encrypt_array(w)
+        self.assertEqual(len(X.chunks), 2)
+        self.assertClose(decrypt(x @ X), w @ A)
+        self.assertClose(decrypt(X + encrypt_array(w[:, None])), A + w[:, None])
+        self.assertClose(decrypt(X @ np.ones(5) + x), A.sum(1) + w)
+
+    def test_chunks(self):
+        data = np.linspace(-1, 1, 5000)
+        x = encrypt_array(data)
+        self.assertEqual(len(x.chunks), 2)
+        self.assertClose(decrypt(x * 2), data * 2)
+        self.assertClose(decrypt(x * (data > 0.9)), data * (data > 0.9))
+        self.assertClose(decrypt(np.zeros((3, 5000)).T @ encrypt_array(self.x[:3])), 0)
+        self.assertClose(decrypt(x.sum()), data.sum())
+
+    def test_errors(self):
+        x = encrypt_array(self.x)
+        self.assertRaises(ValueError, lambda: x + encrypt_array(self.x[:2]))
+        self.assertRaises(ValueError, lambda: self.W.T @ x)
+        self.assertRaises(ValueError, lambda: encrypt_array(self.W) @ encrypt_array(self.W))
+        self.assertRaises(ValueError, lambda: encrypt_array(self.W) @ np.ones((4, 5)))
+        self.assertRaises(ValueError, lambda: encrypt_array(self.W) + encrypt_array(self.W[:2]))
+        self.assertRaises(ValueError, encrypt_array, np.zeros((2, 2, 2)))
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        setup_keys('crt', max_int=pow(2, 40))
+
+    def test_integers(self):
+        M = np.array([[1, -2, 3], [4, 5, -6]])
+        v = np.array([7, 8, -9])
+        x = encrypt_array(v)
+        self.assertEqual(decrypt(M @ x).tolist(), (M @ v).tolist())
+        self.assertEqual(decrypt(x * x - 3).tolist(), (v * v - 3).tolist())
+        self.assertEqual(decrypt(np.sum(encrypt_array(M), axis=0)).tolist(), M.sum(0).tolist())
+        self.assertEqual(decrypt(np.dot(x, v)), int(v @ v))
+
+    def test_matmul(self):
+        A = np.array([[1, -2, 3], [4, 5, -6]])
+        B = np.array([[2, 0], [-1, 3], [5, 7]])
+        v = np.array([7, 8])
+        expected = (A @ B).tolist()
+        self.assertEqual(decrypt(encrypt_array(A) @ B).tolist(), expected)
+        self.assertEqual(decrypt(A @ encrypt_array(B)).tolist(), expected)
+        self.assertEqual(decrypt(encrypt_array(A) @ encrypt_array(B)).tolist(), expected)
+        self.assertEqual(decrypt(encrypt_array(v) @ encrypt_array(A)).tolist(), (v @ A).tolist())
+
+        # The result has more columns than the encrypted operand has rows
+        C = np.array([[1, 2, 3], [0, -1, 4], [2, 2, -2], [5, 0, 1], [-3, 1, 0]])
+        D = np.arange(21).reshape(3, 7) - 10
+        self.assertEqual(decrypt(C @ encrypt_array(D)).tolist(), (C @ D).tolist())
+        self.assertEqual(decrypt(encrypt_array(C) @ D[:, :4]).tolist(), (C @ D[:, :4]).tolist())
+
+    def test_float_rejected(self):
+        self.assertRaises(ValueError, encrypt_array, [1.5, 2.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import pickle
+
+import numpy as np
+
+import simplefhe
+from simplefhe import (
+    initialize,
+    encrypt, decrypt,
+    generate_keypair,
+    set_private_key, set_galois_keys
+)
+from simplefhe.backends import simulation
+
+from keygen import setup_keys
+
+
+class test_initialize(unittest.TestCase):
+    def test_backend_error(self):
+        self.assertRaises(ValueError, initialize, 'int', backend='asdf')
+
+    def test_fingerprint(self):
+        initialize('int', backend='simulation')
+        fingerprint = simplefhe._mode['fingerprint']
+        self.assertIsInstance(generate_keypair()[0], simulation.PublicKey)
+        self.assertIs(simplefhe.Ciphertext, simulation.Ciphertext)
+
+        initialize('int', backend='seal')
+        self.assertNotEqual(simplefhe._mode['fingerprint'], fingerprint)
+
+
+class test_int(unittest.TestCase):
+    def setUp(self):
+        setup_keys('int', galois_keys=False, backend='simulation')
+
+    def test_arithmetic(self):
+        a, b = encrypt(-30), encrypt(17)
+        self.assertEqual(decrypt(a * b + 5), -505)
+        self.assertEqual(decrypt(a**3 - 3*a + 1), -26909)
+
+    def test_noise_budget(self):
+        # Matches SEAL: 5 successive multiplications fit in the noise budget
+        x = encrypt(2)
+        y = x
+        for i in range(4):
+            y = y * x
+        self.assertEqual(decrypt(y), 32)
+        self.assertRaises(ValueError, decrypt, y * x)
+
+    def test_wrong_key(self):
+        a = encrypt(5)
+        _, private_key, _ = generate_keypair()
+        set_private_key(private_key)
+        self.assertRaises(ValueError, decrypt, a)
+
+    def test_pickle(self):
+        a = pickle.loads(pickle.dumps(encrypt(12), protocol=5))
+        self.assertEqual(decrypt(a * 2), 24)
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float', backend='simulation')
+        simulation.reset_operation_counts()
+
+    def tearDown(self):
+        simulation.ERROR_INJECTION = False
+
+    def test_levels(self):
+        x = encrypt(1.5)
+        self.assertEqual(simulation.describe(x._ciphertext)['level'], 2)
+        y = x * x
+        self.assertEqual(simulation.describe(y._ciphertext)['level'], 1)
+        self.assertEqual(decrypt(y * x), 1.5**3)
+        self.assertRaises(ValueError, lambda: y * x * x)
+
+    def test_operation_counts(self):
+        x = encrypt([1.0, 2.0, 3.0, 4.0])
+        x.sum()
+        self.assertEqual(simulation.OPERATION_COUNTS['apply_galois'], 12)
+        self.assertEqual(simulation.OPERATION_COUNTS['add'], 12)
+        self.assertEqual(simulation.OPERATION_COUNTS['multiply'], 0)
+
+    def test_error_injection(self):
+        simulation.ERROR_INJECTION = True
+        values = np.linspace(-1, 1, 100)
+        x = encrypt(values)
+        error = np.std(np.array(decrypt(x)) - values)
+        self.assertGreater(error, 0)
+        self.assertLess(error, 1e-6)
+
+        estimate = simulation.describe(x.rotate(1)._ciphertext)['error']
+        self.assertGreater(estimate, simulation.describe(x._ciphertext)['error'])
+
+    def test_precision(self):
+        # Plaintexts are rounded at their scale, as in SEAL
+        x = encrypt(3.0) / pow(2, 40)
+        self.assertNotAlmostEqual(decrypt(x * 1.7) * pow(2, 40), 5.1, places=1)
+        self.assertRaises(RuntimeError, lambda: encrypt(3.0) / pow(2, 45) * 1.7)
+        self.assertRaises(ValueError, simplefhe._mode['encoder'].encode, 1e30, pow(2.0, 40))
+
+        # Values beyond the coefficient modulus wrap around
+        self.assertGreater(abs(decrypt(encrypt(3.0) * 1e20) - 3e20), 1e19)
+        self.assertAlmostEqual(decrypt(encrypt(3.0) * 1e10) / 1e10, 3.0)
+
+    def test_missing_rotation(self):
+        set_galois_keys(simplefhe.generate_galois_keys([1]))
+        x = encrypt([1.0, 2.0, 3.0])
+        self.assertEqual(decrypt(x.rotate(1))[:2], [2.0, 3.0])
+        self.assertRaises(ValueError, x.rotate, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
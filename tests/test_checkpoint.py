@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+
+from simplefhe import (
+    initialize,
+    encrypt, decrypt,
+    generate_keypair,
+    set_public_key, set_private_key, set_relin_keys
+)
+from simplefhe.stats import Moments
+from simplefhe.checkpoint import Checkpointer, save_checkpoint, load_checkpoint
+
+
+class Crash(Exception):
+    pass
+
+
+UNPICKLED = []
+
+class Tripwire:
+    def __reduce__(self):
+        return (UNPICKLED.append, (True,))
+
+
+class test_checkpoint(unittest.TestCase):
+    def setUp(self):
+        initialize('int')
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, 'state.ckpt')
+        self.inputs = [encrypt(x) for x in range(1, 11)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip(self):
+        moments = Moments()
+        moments.update(encrypt(5))
+        save_checkpoint(moments, self.filepath, position=1)
+        payload = load_checkpoint(self.filepath)
+        self.assertEqual(payload['position'], 1)
+        self.assertEqual(decrypt(payload['state'].sum()), 5)
+        self.assertEqual(os.listdir(self.directory.name), ['state.ckpt'])
+
+    def test_fingerprint(self):
+        save_checkpoint(Tripwire(), self.filepath)
+        initialize('int', max_int=1024)
+        self.assertRaises(ValueError, load_checkpoint, self.filepath)
+        self.assertEqual(UNPICKLED, [])
+
+        with open(self.filepath, 'wb') as f:
+            f.write(b'not a checkpoint')
+        self.assertRaises(ValueError, load_checkpoint, self.filepath)
+
+    def test_resume(self):
+        checkpointer = Checkpointer(self.filepath, Moments, every=3)
+        try:
+            for i in range(checkpointer.position, len(self.inputs)):
+                if i == 7: raise Crash()
+                checkpointer.update(self.inputs[i])
+        except Crash:
+            pass
+
+        # Inputs 0-5 were checkpointed; 6 is lost and must be redone.
+        checkpointer = Checkpointer(self.filepath, Moments, every=3)
+        self.assertEqual(checkpointer.position, 6)
+        for i in range(checkpointer.position, len(self.inputs)):
+            checkpointer.update(self.inputs[i])
+        checkpointer.save()
+
+        state = Checkpointer(self.filepath, Moments).state
+        self.assertEqual(state.count, 10)
+        self.assertEqual(decrypt(state.sum()), 55)
+        self.assertEqual(decrypt(state.sum_of_squares()), 385)
+
+    def test_interval(self):
+        checkpointer = Checkpointer(self.filepath, Moments, every=None, interval=0)
+        checkpointer.update(self.inputs[0])
+        self.assertEqual(load_checkpoint(self.filepath)['position'], 1)
@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+
+from simplefhe import decrypt, encrypt_array, generate_galois_keys, set_galois_keys
+from simplefhe.galois import trace_rotations
+from simplefhe.clustering import squared_distances, assign, centroid_sums
+
+from keygen import setup_keys
+
+
+class test_distances(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.points = np.round(rng.normal(size=(20, 3)) * 20)
+        self.centroids = np.array([[30, 0, 0], [-30, 0, 0], [0, 30, 10]])
+        self.expected = ((self.points[:, None] - self.centroids[None]) ** 2).sum(-1)
+
+    def test_float(self):
+        setup_keys('float')
+        X = encrypt_array(self.points)
+        for centroids in [self.centroids, [encrypt_array(c * 1.0) for c in self.centroids]]:
+            distances = squared_distances(X, centroids)
+            self.assertEqual(len(distances), 3)
+            result = np.stack([decrypt(d) for d in distances], axis=1)
+            np.testing.assert_allclose(result, self.expected, atol=1e-2)
+
+    def test_crt(self):
+        setup_keys('crt', max_int=pow(2, 30))
+        X = encrypt_array(self.points.astype(int))
+        distances = squared_distances(X, self.centroids)
+        result = np.stack([decrypt(d) for d in distances], axis=1)
+        np.testing.assert_array_equal(result, self.expected)
+
+        self.assertRaises(ValueError, squared_distances, X, np.zeros((2, 4), dtype=int))
+        self.assertRaises(ValueError, assign, distances, 1e4)
+
+
+class test_assignment(unittest.TestCase):
+    def test_kmeans_step(self):
+        setup_keys('float', galois_keys=False, poly_modulus_degree=16384, depth=7)
+        rng = np.random.default_rng(1)
+        centroids = np.array([[3.0, 0.0], [-3.0, 0.0], [0.0, 3.0]])
+        points = centroids[np.arange(12) % 3] + rng.normal(size=(12, 2)) * 0.5
+        expected = ((points[:, None] - centroids[None]) ** 2).sum(-1).argmin(1)
+
+        X = encrypt_array(points)
+        def step():
+            assignments = assign(squared_distances(X, centroids), bound=60.0)
+            return assignments, centroid_sums(X, assignments)
+
+        with trace_rotations() as steps:
+            step()
+        set_galois_keys(generate_galois_keys(steps))
+        assignments, (sums, counts) = step()
+
+        weights = np.stack([decrypt(a) for a in assignments], axis=1)
+        np.testing.assert_array_equal(weights.argmax(1), expected)
+        self.assertTrue(np.all(weights.max(1) > 0.5))
+
+        sums = np.stack([decrypt(s) for s in sums])
+        counts = np.array([decrypt(c) for c in counts])
+        np.testing.assert_allclose(sums, weights.T @ points, atol=1e-2)
+        np.testing.assert_allclose(counts, weights.sum(0), atol=1e-2)
+
+        self.assertRaises(ValueError, assign, [squared_distances(X, centroids)[0]], 60.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
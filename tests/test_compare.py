@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from simplefhe import encrypt, decrypt, encrypt_array
+from simplefhe.compare import equal, less_than, greater_than, maximum, minimum, sign
+
+from keygen import setup_keys
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        setup_keys('crt', max_int=pow(2, 17), poly_modulus_degree=16384)
+        rng = np.random.default_rng(0)
+        self.a = rng.integers(-1000, 1000, size=500)
+        self.b = self.a + rng.integers(-10, 11, size=500)
+        self.ea = encrypt(list(self.a))
+        self.eb = encrypt(list(self.b))
+
+    def test_bounded(self):
+        result = decrypt(less_than(self.ea, self.eb, bound=32))
+        np.testing.assert_array_equal(result, self.a < self.b)
+        result = decrypt(greater_than(self.ea, self.eb, bound=32))
+        np.testing.assert_array_equal(result, self.a > self.b)
+        result = decrypt(equal(self.ea, self.eb, bound=16))
+        np.testing.assert_array_equal(result, self.a == self.b)
+
+    def test_extrema(self):
+        np.testing.assert_array_equal(decrypt(maximum(self.ea, self.eb, bound=32)), np.maximum(self.a, self.b))
+        np.testing.assert_array_equal(decrypt(minimum(self.ea, self.eb, bound=32)), np.minimum(self.a, self.b))
+
+    def test_arrays(self):
+        a = encrypt_array(self.a.reshape(20, 25))
+        b = encrypt_array(self.b.reshape(20, 25))
+        result = decrypt(less_than(a, b, bound=32))
+        np.testing.assert_array_equal(result, (self.a < self.b).reshape(20, 25))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            less_than(self.ea, self.eb, bound=1)
+        with self.assertRaises(ValueError):
+            sign(self.ea - self.eb, bound=32)
+
+        setup_keys('crt', max_int=pow(2, 40))
+        with self.assertRaises(ValueError):
+            equal(encrypt(1), encrypt(2), bound=4)
+
+
+class test_fermat(unittest.TestCase):
+    def test_equal(self):
+        setup_keys('crt', max_int=pow(2, 17), poly_modulus_degree=32768)
+        a = [5, -3, 70000, 0, 12]
+        b = [5, 3, 70000, 1, -12]
+        result = decrypt(equal(encrypt(a), encrypt(b)))
+        self.assertEqual(list(result), [1, 0, 1, 0, 0])
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float', poly_modulus_degree=16384, depth=7)
+        rng = np.random.default_rng(1)
+        self.a = rng.uniform(-50, 50, size=200)
+        self.b = self.a + rng.choice([-1, 1], size=200) * rng.uniform(15, 40, size=200)
+
+    def test_sign(self):
+        value = encrypt(list(self.a - self.b))
+        np.testing.assert_allclose(decrypt(sign(value, bound=50))[:200], np.sign(self.a - self.b), atol=0.1)
+
+    def test_compare(self):
+        a, b = encrypt(list(self.a)), encrypt(list(self.b))
+        result = decrypt(less_than(a, b, bound=50))[:200]
+        np.testing.assert_allclose(result, self.a < self.b, atol=0.05)
+
+        # Errors are proportional to the difference
+        result = decrypt(maximum(a, b, bound=50))[:200]
+        error = np.abs(result - np.maximum(self.a, self.b))
+        self.assertTrue(np.all(error < 0.05 * np.abs(self.a - self.b) + 1e-3))
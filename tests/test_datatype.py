@@ -4,8 +4,8 @@ import random
 from simplefhe import (
     initialize,
     encrypt, decrypt,
-    generate_keypair,
-    set_public_key, set_private_key, set_relin_keys
+    generate_keypair, generate_galois_keys,
+    set_public_key, set_private_key, set_relin_keys, set_galois_keys
 )
 from simplefhe.datatypes import EncryptedValue
 
@@ -29,3 +29,45 @@ class test_init(unittest.TestCase):
     def test_repr(self):
         a = encrypt(3)
         self.assertEqual(repr(a), '<encrypted int>')
+
+
+class test_packed(unittest.TestCase):
+    def setUp(self):
+        initialize('crt', max_int=pow(2, 40))
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+        set_galois_keys(generate_galois_keys())
+
+    def test_arithmetic(self):
+        xs = [random.randint(-1000, 1000) for i in range(10)]
+        ys = [random.randint(-1000, 1000) for i in range(10)]
+        a = encrypt(xs)
+        self.assertEqual(decrypt(a), xs)
+        self.assertEqual(decrypt(a * encrypt(ys)), [x*y for x, y in zip(xs, ys)])
+        self.assertEqual(decrypt(a + ys), [x+y for x, y in zip(xs, ys)])
+        self.assertEqual(decrypt(a * 3), [3*x for x in xs])
+
+    def test_rotate(self):
+        a = encrypt([1, 2, 3, 4])
+        self.assertEqual(decrypt(a.rotate(1)), [2, 3, 4, 0])
+        self.assertEqual(decrypt(a.rotate(-1)), [0, 1, 2, 3])
+
+    def test_sum(self):
+        a = encrypt([1, 2, 3, 4]).sum()
+        self.assertEqual(decrypt(a), 10)
+        self.assertEqual(decrypt(a * encrypt([1, 2])), [10, 20])
+
+    def test_repr(self):
+        self.assertEqual(repr(encrypt([1, 2, 3])), '<encrypted crt[3]>')
+
+    def test_errors(self):
+        set_galois_keys(None)
+        self.assertRaises(ValueError, encrypt([1, 2]).rotate, 1)
+        self.assertRaises(ValueError, encrypt, [0] * 5000)
+
+        initialize('int')
+        set_public_key(generate_keypair()[0])
+        self.assertRaises(ValueError, encrypt, [1, 2])
+        self.assertRaises(ValueError, generate_galois_keys)
@@ -0,0 +1,141 @@
+import unittest
+import os
+import tempfile
+import time
+from functools import partial
+from multiprocessing.connection import Client
+from unittest import mock
+
+from simplefhe import (
+    initialize,
+    encrypt, decrypt,
+    generate_keypair,
+    set_public_key, set_private_key, set_relin_keys
+)
+from simplefhe.stats import Moments
+from simplefhe.distributed import LocalCluster, merge, shard
+
+
+# Worker functions must be importable
+def partial_sum(values):
+    return sum(values[1:], values[0])
+
+
+def product(a, b):
+    return a * b
+
+
+def moments(values):
+    output = Moments()
+    output.update_many(values)
+    return output
+
+
+def fail_once(marker, values):
+    """Fails (or kills the worker) the first time it is called."""
+    try:
+        # Atomic, so that only one worker fails
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        pass
+    else:
+        if marker.endswith('.exit'):
+            os._exit(1)
+        raise RuntimeError('Simulated failure')
+    return partial_sum(values)
+
+
+def always_fail(values):
+    raise RuntimeError('Simulated failure')
+
+
+def slow_sum(values):
+    time.sleep(0.5)
+    return sum(values)
+
+
+class test_distributed(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cluster = LocalCluster(3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cluster.close()
+
+    def setUp(self):
+        initialize('int')
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+        self.values = list(range(-10, 20))
+        self.inputs = [encrypt(x) for x in self.values]
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shard(self):
+        self.assertEqual(list(shard(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_map_reduce(self):
+        with self.cluster.coordinator() as coordinator:
+            total = coordinator.map_reduce(partial_sum, shard(self.inputs, 4))
+            self.assertEqual(decrypt(total), sum(self.values))
+
+            stats = coordinator.map_reduce(moments, shard(self.inputs, 7), reduce=merge)
+            self.assertEqual(stats.count, len(self.values))
+            self.assertEqual(decrypt(stats.sum_of_squares()), sum(x*x for x in self.values))
+
+    def test_tree_depth(self):
+        # A product of 8 values only fits in the noise budget
+        # when multiplied in a balanced tree (depth 3, rather than 7).
+        values = [2, -1, 3, 1, -2, 1, 1, 2]
+        with self.cluster.coordinator() as coordinator:
+            result = coordinator.map_reduce(
+                partial_sum, shard(map(encrypt, values), 1), reduce=product
+            )
+        self.assertEqual(decrypt(result), 24)
+
+    def test_retry(self):
+        marker = os.path.join(self.directory.name, 'task.error')
+        with self.cluster.coordinator() as coordinator:
+            total = coordinator.map_reduce(partial(fail_once, marker), shard(self.inputs, 10))
+        self.assertEqual(decrypt(total), sum(self.values))
+
+    def test_worker_failure(self):
+        marker = os.path.join(self.directory.name, 'task.exit')
+        with LocalCluster(2) as cluster, cluster.coordinator() as coordinator:
+            total = coordinator.map_reduce(partial(fail_once, marker), shard(self.inputs, 10))
+            self.assertEqual(decrypt(total), sum(self.values))
+            self.assertEqual(len(coordinator._workers), 1)
+
+    def test_lost_coordinator(self):
+        with LocalCluster(1) as cluster:
+            # A bad context, and a coordinator which leaves before the result
+            conn = Client(cluster.addresses[0], authkey=cluster.authkey)
+            conn.send(('context', {'params': {'mode': 'asdf'}}))
+            self.assertEqual(conn.recv()[0], 'error')
+            conn.send(('task', 0, slow_sum, ([1, 2, 3],)))
+            conn.close()
+
+            # The worker still serves other coordinators
+            with cluster.coordinator() as coordinator:
+                total = coordinator.map_reduce(partial_sum, shard(self.inputs, 10))
+            self.assertEqual(decrypt(total), sum(self.values))
+
+            with mock.patch('simplefhe.export_context', return_value={'params': {'mode': 'asdf'}}):
+                with self.assertRaisesRegex(RuntimeError, 'could not import the context'):
+                    cluster.coordinator()
+
+    def test_errors(self):
+        with self.cluster.coordinator(retries=1) as coordinator:
+            with self.assertRaises(RuntimeError):
+                coordinator.map_reduce(always_fail, shard(self.inputs, 10))
+            self.assertRaises(ValueError, coordinator.map_reduce, partial_sum, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
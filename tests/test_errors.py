@@ -64,6 +64,35 @@ class test_int(unittest.TestCase):
         self.assertRaises(ValueError, encrypt, -pow(2, 30))
 
 
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        initialize('crt', max_int=pow(2, 40))
+
+    def test_key_type_error(self):
+        public_key, private_key, relin_keys = generate_keypair()
+        self.assertRaises(AssertionError, set_public_key, private_key)
+        self.assertRaises(AssertionError, set_private_key, relin_keys)
+        self.assertRaises(AssertionError, set_relin_keys, public_key)
+
+        initialize('int')
+        self.assertRaises(AssertionError, set_public_key, public_key)
+
+    def test_overflow(self):
+        public_key, private_key, relin_keys = generate_keypair()
+        set_public_key(public_key)
+        set_private_key(private_key)
+        set_relin_keys(relin_keys)
+        encrypt(pow(2, 40))
+        self.assertRaises(ValueError, encrypt, pow(2, 80))
+        self.assertRaises(ValueError, encrypt, 1.5)
+
+    def test_max_int(self):
+        # There are only 5 batching-friendly 20-bit primes for poly_modulus_degree=8192
+        with self.assertRaisesRegex(ValueError, 'at most'):
+            initialize('crt', max_int=pow(2, 128))
+        initialize('crt', max_int=pow(2, 96))
+
+
 class test_float(unittest.TestCase):
     def setUp(self):
         initialize('float')
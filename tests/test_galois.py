@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+
+import simplefhe
+from simplefhe import (
+    initialize,
+    encrypt, decrypt, encrypt_array,
+    generate_keypair, generate_galois_keys,
+    set_public_key, set_private_key, set_relin_keys, set_galois_keys
+)
+from simplefhe.galois import trace_rotations, rotation_steps, galois_element
+
+
+W = np.array([[1.0, 0.0, 2.0, -1.0], [0.5, 0.5, 0.5, 0.5], [0.0, 1.0, 0.0, 3.0]])
+
+
+def process(x):
+    return W @ x + np.sum(x)
+
+
+class test_galois(unittest.TestCase):
+    def setUp(self):
+        initialize('float')
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+        set_galois_keys(None)
+        self.x = np.array([1.5, -2.0, 3.25, 0.5])
+
+    def test_trace(self):
+        with trace_rotations() as steps:
+            process(encrypt_array(np.zeros(4)))
+        self.assertTrue(steps)
+
+        keys = generate_galois_keys(steps)
+        self.assertEqual(rotation_steps(keys), sorted(s % 4096 for s in steps))
+        self.assertLess(len(keys.to_string()), len(generate_galois_keys().to_string()))
+
+        set_galois_keys(keys)
+        np.testing.assert_allclose(
+            decrypt(process(encrypt_array(self.x))),
+            W @ self.x + self.x.sum(),
+            atol=1e-3
+        )
+
+    def test_missing_rotation(self):
+        set_galois_keys(generate_galois_keys([1]))
+        x = encrypt([1.0, 2.0, 3.0])
+        self.assertAlmostEqual(decrypt(x.rotate(1))[0], 2.0, places=3)
+        with self.assertRaises(ValueError):
+            x.rotate(3)
+
+        # Rotations by other steps are composed from signed powers of two (3 = 4 - 1)
+        set_galois_keys(generate_galois_keys([-1, 4]))
+        self.assertAlmostEqual(decrypt(x.rotate(3))[0], 0.0, places=3)
+
+    def test_keypair(self):
+        keyset = generate_keypair(rotations=[1, -1])
+        self.assertEqual(len(keyset), 4)
+        self.assertEqual(rotation_steps(keyset[3]), [1, 4095])
+
+    def test_crt(self):
+        initialize('crt', max_int=pow(2, 40))
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+        x = encrypt([1, 2, 3, 4])
+        with trace_rotations() as steps:
+            x.rotate(2)
+        set_galois_keys(generate_galois_keys(steps))
+        self.assertEqual(simplefhe._galois_steps, [2])
+        self.assertEqual(decrypt(x.rotate(2))[:2], [3, 4])
+
+    def test_galois_element(self):
+        self.assertEqual(galois_element(1, 8192), 3)
+        self.assertEqual(galois_element(0, 8192), 2 * 8192 - 1)
+        self.assertRaises(ValueError, galois_element, 4096, 8192)
+        self.assertRaises(ValueError, generate_galois_keys, [5000])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+
+import numpy as np
+
+from simplefhe import initialize, generate_galois_keys, set_galois_keys
+from simplefhe.galois import trace_rotations
+from simplefhe.models import Model, Linear, Polynomial, sigmoid_polynomial
+
+from keygen import setup_keys
+
+
+def _evaluate(model, samples, layout):
+    batch = model.encrypt(samples, layout)
+    with trace_rotations() as steps:
+        model(batch)
+    set_galois_keys(generate_galois_keys(steps) if steps else None)
+    return model(batch).decrypt()
+
+
+class test_models(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float', galois_keys=False)
+        rng = np.random.default_rng(0)
+        self.W = rng.normal(size=(3, 5))
+        self.b = rng.normal(size=3)
+        self.X = rng.normal(size=(7, 5))
+
+    def assertClose(self, actual, expected):
+        np.testing.assert_allclose(actual, expected, atol=1e-3)
+
+    def test_linear(self):
+        model = Model([Linear(self.W, self.b)])
+        self.assertEqual(model.depth, 1)
+        for layout in ['features', 'diagonal']:
+            self.assertClose(_evaluate(model, self.X, layout), self.X @ self.W.T + self.b)
+
+    def test_activation(self):
+        t = self.X @ self.W.T + self.b
+        for a in [[0.1, 0.5, 0.25], [0.0, 0.0, -1.0]]:
+            model = Model([Linear(self.W, self.b), Polynomial(a)])
+            self.assertEqual(model.depth, 2)
+            for layout in ['features', 'diagonal']:
+                self.assertClose(_evaluate(model, self.X, layout), np.polynomial.polynomial.polyval(t, a))
+
+    def test_merge(self):
+        # Consecutive linear layers (and affine activations) use a single level
+        W2 = np.ones((2, 3))
+        model = Model([Linear(self.W, self.b), Polynomial([1, 2]), Linear(W2)])
+        self.assertEqual(model.depth, 1)
+        self.assertClose(_evaluate(model, self.X, 'features'), (1 + 2 * (self.X @ self.W.T + self.b)) @ W2.T)
+
+    def test_zero_weights(self):
+        W = self.W.copy()
+        W[1] = 0
+        model = Model([Linear(W, self.b)])
+        for layout in ['features', 'diagonal']:
+            self.assertClose(_evaluate(model, self.X, layout), self.X @ W.T + self.b)
+
+    def test_scaled_inputs(self):
+        # Inputs divided by powers of two keep their scale, and are not modified
+        a = [0.1, 0.5, 0.25]
+        model = Model([Linear(self.W, self.b), Polynomial(a)])
+        X = self.X * 4
+        for layout, factors in [('features', [1, 2, 4, 1, 2]), ('diagonal', [4])]:
+            batch = model.encrypt(X, layout)
+            batch.chunks = [[value / f for value, f in zip(chunk, factors)] for chunk in batch.chunks]
+            inputs = batch.decrypt()
+            expected = np.polynomial.polynomial.polyval((X / np.resize(factors, 5)) @ self.W.T + self.b, a)
+
+            with trace_rotations() as steps:
+                model(batch)
+            set_galois_keys(generate_galois_keys(steps) if steps else None)
+            self.assertClose(model(batch).decrypt(), expected)
+            np.testing.assert_array_equal(batch.decrypt(), inputs)
+
+    def test_layout(self):
+        model = Model([Linear(np.ones((32, 32)))])
+        self.assertEqual(model.layout(1), 'diagonal')
+        self.assertEqual(model.layout(10000), 'features')
+        self.assertEqual(Model([Linear(self.W)]).layout(1), 'features')
+
+        batch = model.encrypt(np.ones((2, 32)))
+        self.assertEqual(batch.layout, 'diagonal')
+        self.assertEqual(len(batch.chunks), 2)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, Model, [Polynomial([0, 0, 1])])
+        self.assertRaises(ValueError, Model, [Linear(self.W), Linear(self.W)])
+        self.assertRaises(ValueError, Polynomial, [0, 0, 0, 0, 1])
+        self.assertRaises(ValueError, initialize, 'float', depth=3)
+
+        model = Model([Linear(self.W), Polynomial([0, 0, 0, 1])])
+        self.assertEqual(model.depth, 3)
+        self.assertRaises(ValueError, model, model.encrypt(self.X))
+
+
+class test_deep(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float', galois_keys=False, poly_modulus_degree=16384, depth=3)
+        rng = np.random.default_rng(1)
+        self.X = rng.normal(size=(4, 6))
+        self.W1 = rng.normal(size=(8, 6))
+        self.W2 = rng.normal(size=(2, 8))
+
+    def test_logistic(self):
+        w = np.linspace(-1, 1, 6)
+        sigmoid = sigmoid_polynomial()
+        model = Model([Linear(w, 0.5), sigmoid])
+        t = self.X @ w + 0.5
+        for layout in ['features', 'diagonal']:
+            result = _evaluate(model, self.X, layout)[:, 0]
+            np.testing.assert_allclose(result, np.polynomial.polynomial.polyval(t, sigmoid.coefficients), atol=1e-3)
+            np.testing.assert_allclose(result, 1 / (1 + np.exp(-t)), atol=0.1)
+
+    def test_mlp(self):
+        model = Model([Linear(self.W1, 0.1), Polynomial([0, 0, 1]), Linear(self.W2, -1)])
+        self.assertEqual(model.depth, 3)
+        expected = (self.X @ self.W1.T + 0.1) ** 2 @ self.W2.T - 1
+        for layout in ['features', 'diagonal']:
+            np.testing.assert_allclose(_evaluate(model, self.X, layout), expected, atol=1e-2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from simplefhe import initialize
+from simplefhe.pir import Database, Query
+
+from keygen import setup_keys
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        setup_keys('crt', max_int=pow(2, 40))
+        rng = np.random.default_rng(0)
+        self.table = rng.integers(-pow(2, 39), pow(2, 39), size=10000)
+
+    def test_lookup(self):
+        database = Database(self.table)
+        self.assertEqual(len(database.chunks), 3)
+
+        indices = [17, 4200, 9999, 17, 0]
+        query = Query(indices, database.shape)
+        self.assertEqual(len(query.ciphertexts), 1)
+        response = database.answer(query.ciphertexts)
+        self.assertEqual(len(response), 1)
+        np.testing.assert_array_equal(query.decrypt(response), self.table[indices])
+
+    def test_batching(self):
+        # Row positions 0 and 1 have overlapping responses (3 chunks each)
+        database = Database(self.table)
+        query = Query([0, 1, 4096, 3], database.shape)
+        self.assertEqual(len(query.ciphertexts), 2)
+        result = query.decrypt(database.answer(query.ciphertexts))
+        np.testing.assert_array_equal(result, self.table[[0, 1, 4096, 3]])
+
+    def test_records(self):
+        records = self.table[:3000].reshape(1000, 3)
+        database = Database(records)
+        query = Query([999, 5], database.shape)
+        result = query.decrypt(database.answer(query.ciphertexts))
+        np.testing.assert_array_equal(result, records[[999, 5]])
+
+    def test_errors(self):
+        database = Database(self.table)
+        self.assertRaises(IndexError, Query, [10000], database.shape)
+        self.assertRaises(ValueError, Database, np.zeros((1, 5000), dtype=int))
+        # Too many chunks to shift side by side
+        self.assertRaises(ValueError, Database, np.zeros((2, 4096), dtype=int))
+        query = Query([1], database.shape)
+        self.assertRaises(ValueError, query.decrypt, [])
+
+
+class test_float(unittest.TestCase):
+    def test_lookup(self):
+        setup_keys('float')
+        table = np.linspace(-5, 5, 5000).reshape(2500, 2)
+        database = Database(table)
+        query = Query([2499, 1, 1300], database.shape)
+        result = query.decrypt(database.answer(query.ciphertexts))
+        np.testing.assert_allclose(result, table[[2499, 1, 1300]], atol=1e-3)
+
+    def test_int_mode(self):
+        initialize('int')
+        self.assertRaises(ValueError, Database, [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
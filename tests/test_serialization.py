@@ -0,0 +1,109 @@
+import unittest
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import simplefhe
+from simplefhe import (
+    initialize,
+    encrypt, decrypt,
+    generate_keypair,
+    set_public_key, set_private_key, set_relin_keys,
+    export_context, import_context
+)
+
+
+def cube(x):
+    return x**3
+
+
+class test_int(unittest.TestCase):
+    def setUp(self):
+        initialize('int')
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+    def test_roundtrip(self):
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            a = pickle.loads(pickle.dumps(encrypt(-1234), protocol=protocol))
+            self.assertEqual(decrypt(a), -1234)
+            self.assertEqual(decrypt(a * 2), -2468)
+
+    def test_out_of_band(self):
+        buffers = []
+        data = pickle.dumps(encrypt(17), protocol=5, buffer_callback=buffers.append)
+        self.assertEqual(len(buffers), 1)
+        self.assertLess(len(data), 1000)
+        self.assertEqual(decrypt(pickle.loads(data, buffers=buffers)), 17)
+
+    def test_keys(self):
+        pub, priv, relin = generate_keypair()
+        set_public_key(pickle.loads(pickle.dumps(pub)))
+        set_private_key(pickle.loads(pickle.dumps(priv)))
+        set_relin_keys(pickle.loads(pickle.dumps(relin)))
+        self.assertEqual(decrypt(encrypt(5) * encrypt(7)), 35)
+
+    def test_missing_context(self):
+        data = pickle.dumps(encrypt(1))
+        simplefhe._contexts.clear()
+        initialize('int', max_int=1024)
+        self.assertRaises(ValueError, pickle.loads, data)
+
+    def test_export_context(self):
+        data = pickle.dumps(encrypt(9))
+        import_context(pickle.loads(pickle.dumps(export_context())))
+        self.assertEqual(decrypt(pickle.loads(data)), 9)
+
+    def test_process_pool(self):
+        values = [-3, 0, 4, 11]
+        ctx = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(2, mp_context=ctx) as pool:
+            results = list(pool.map(cube, map(encrypt, values)))
+        self.assertEqual([decrypt(x) for x in results], [x**3 for x in values])
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        initialize('crt', max_int=pow(2, 64))
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+    def test_roundtrip(self):
+        N = pow(2, 50) + 3
+        a = pickle.loads(pickle.dumps(encrypt(N), protocol=5))
+        self.assertEqual(decrypt(a - 3), pow(2, 50))
+
+    def test_keys(self):
+        pub, priv, relin = generate_keypair()
+        set_public_key(pickle.loads(pickle.dumps(pub)))
+        set_private_key(pickle.loads(pickle.dumps(priv)))
+        set_relin_keys(pickle.loads(pickle.dumps(relin)))
+        self.assertEqual(decrypt(encrypt(-pow(10, 9)) * 1000), -pow(10, 12))
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        initialize('float')
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+
+    def test_roundtrip(self):
+        a = pickle.loads(pickle.dumps(encrypt(2.5), protocol=5))
+        self.assertAlmostEqual(decrypt(a * a), 6.25, places=3)
+
+    def test_spawn_pool(self):
+        values = [-1.5, 0.25, 2.0]
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            2, mp_context=ctx,
+            initializer=import_context, initargs=(export_context(),)
+        ) as pool:
+            results = list(pool.map(cube, map(encrypt, values)))
+        for x, result in zip(values, results):
+            self.assertAlmostEqual(decrypt(result), x**3, places=3)
@@ -0,0 +1,107 @@
+import unittest
+import random
+import pickle
+
+import numpy as np
+
+from simplefhe import (
+    initialize,
+    encrypt, decrypt,
+    generate_keypair, generate_galois_keys,
+    set_public_key, set_private_key, set_relin_keys, set_galois_keys
+)
+from simplefhe.stats import Moments, Covariance, Histogram, bucket, one_hot
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        initialize('float')
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+        set_galois_keys(generate_galois_keys())
+
+        self.data = np.random.normal(size=(20, 3)) * [1, 5, 10] + [0, 2, -1]
+
+    def test_moments(self):
+        moments = Moments()
+        moments.update_many(encrypt(row) for row in self.data)
+        np.testing.assert_allclose(decrypt(moments.mean()), self.data.mean(0), atol=1e-3)
+        np.testing.assert_allclose(decrypt(moments.variance()), self.data.var(0), atol=1e-2)
+
+        result = moments.decrypt()
+        self.assertEqual(result['count'], 20)
+        np.testing.assert_allclose(result['variance'], self.data.var(0), atol=1e-4)
+
+    def test_merge(self):
+        shards = [Moments(), Moments(), Moments()]
+        for i, row in enumerate(self.data):
+            shards[i % 3].update(encrypt(row))
+        merged = shards[0].merge(shards[1]).merge(pickle.loads(pickle.dumps(shards[2])))
+        self.assertEqual(merged.count, 20)
+        np.testing.assert_allclose(merged.decrypt()['mean'], self.data.mean(0), atol=1e-4)
+        self.assertRaises(TypeError, merged.merge, Histogram(3))
+        self.assertRaises(ValueError, Covariance(2).merge, Covariance(3))
+        self.assertRaises(ValueError, Histogram(4).merge, Histogram(5))
+
+    def test_scaled_records(self):
+        # Records at different levels and scales
+        factors = np.resize([1, 0.5, 0.3, 0.25], 20)
+        scaled = self.data * factors[:, None]
+        records = [encrypt(row) * factor for row, factor in zip(self.data, factors)]
+
+        moments = Moments()
+        moments.update_many(records)
+        result = moments.decrypt()
+        np.testing.assert_allclose(result['mean'], scaled.mean(0), atol=1e-4)
+        np.testing.assert_allclose(result['variance'], scaled.var(0), atol=1e-4)
+
+        covariance = Covariance(3)
+        covariance.update_many(records)
+        np.testing.assert_allclose(
+            covariance.decrypt(), np.cov(scaled.T, bias=True), atol=1e-3
+        )
+
+    def test_empty(self):
+        for accumulator in [Moments(), Covariance(3), Histogram(4)]:
+            self.assertRaises(ValueError, accumulator.decrypt)
+
+    def test_covariance(self):
+        covariance = Covariance(3)
+        covariance.update_many(encrypt(row) for row in self.data)
+        np.testing.assert_allclose(
+            covariance.decrypt(), np.cov(self.data.T, bias=True), atol=1e-3
+        )
+
+    def test_histogram(self):
+        edges = [-1, 0, 1]
+        histogram = Histogram(4)
+        for x in self.data[:, 0]:
+            histogram.update(encrypt(one_hot(bucket(x, edges), 4)))
+        expected = [sum(bucket(x, edges) == i for x in self.data[:, 0]) for i in range(4)]
+        self.assertEqual(histogram.decrypt(), expected)
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        initialize('crt', max_int=pow(2, 50))
+        pub, priv, relin = generate_keypair()
+        set_public_key(pub)
+        set_private_key(priv)
+        set_relin_keys(relin)
+        set_galois_keys(generate_galois_keys())
+
+    def test_moments(self):
+        data = [[random.randint(-pow(10, 6), pow(10, 6)) for j in range(4)] for i in range(10)]
+        moments = Moments()
+        moments.update_many(map(encrypt, data))
+        self.assertEqual(decrypt(moments.sum()), [sum(col) for col in zip(*data)])
+        self.assertEqual(
+            decrypt(moments.sum_of_squares()),
+            [sum(x*x for x in col) for col in zip(*data)]
+        )
+        self.assertRaises(NotImplementedError, moments.mean)
+
+    def test_empty(self):
+        self.assertRaises(ValueError, Moments().sum)
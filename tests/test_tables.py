@@ -0,0 +1,140 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from simplefhe import initialize, decrypt, encrypt_array
+from simplefhe.tables import encrypt_table, load_table
+
+from keygen import setup_keys
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float')
+        rng = np.random.default_rng(0)
+        n = 5000   # Two chunks per column
+        self.region = rng.choice(['eu', 'us', 'apac'], size=n)
+        self.revenue = rng.uniform(0, 10, size=n)
+        self.cost = rng.uniform(0, 5, size=n)
+        self.recent = rng.integers(0, 2, size=n)
+        self.table = encrypt_table(
+            {'region': self.region, 'revenue': self.revenue, 'cost': self.cost},
+            categories={'region': ['eu', 'us', 'apac']},
+        )
+
+    def assertClose(self, actual, expected):
+        np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-2)
+
+    def test_schema(self):
+        self.assertEqual(self.table.schema, {'revenue': 'numeric', 'cost': 'numeric', 'region': ['eu', 'us', 'apac']})
+        self.assertEqual(len(self.table), 5000)
+        self.assertEqual(len(self.table['revenue'].chunks), 2)
+        with self.assertRaises(KeyError):
+            self.table['region']
+        with self.assertRaises(ValueError):
+            encrypt_table({'region': ['eu', 'mars']}, categories={'region': ['eu', 'us']})
+        with self.assertRaises(ValueError):
+            encrypt_table({'a': [1.0, 2.0], 'b': [1.0]})
+
+    def test_aggregates(self):
+        self.table['profit'] = self.table['revenue'] - self.table['cost']
+        profit = self.revenue - self.cost
+        self.assertClose(decrypt(self.table.sum('profit')), profit.sum())
+        self.assertEqual(self.table.count(), 5000)
+
+        recent = self.table.filter(self.recent)
+        self.assertEqual(recent.count(), self.recent.sum())
+        sums = recent.groupby('region').sum('profit')
+        counts = recent.groupby('region').count()
+        for group in ['eu', 'us', 'apac']:
+            selected = (self.region == group) & (self.recent == 1)
+            self.assertClose(decrypt(sums[group]), profit[selected].sum())
+            self.assertClose(decrypt(counts[group]), selected.sum())
+
+    def test_cutoff(self):
+        # The filter is zero over the whole second chunk
+        first = np.arange(5000) < 100
+        table = self.table.filter(first)
+        self.assertClose(decrypt(table.sum('cost')), self.cost[first].sum())
+        us = table.groupby('region').sum('revenue')['us']
+        self.assertClose(decrypt(us), self.revenue[first & (self.region == 'us')].sum())
+
+    def test_encrypted_filter(self):
+        table = self.table.filter(encrypt_array(self.recent))
+        self.assertClose(decrypt(table.count()), self.recent.sum())
+        self.assertClose(decrypt(table.sum('cost')), self.cost[self.recent == 1].sum())
+
+        # Encrypted mask, indicator and column use both levels
+        eu = table.groupby('region').sum('revenue')['eu']
+        selected = (self.region == 'eu') & (self.recent == 1)
+        self.assertClose(decrypt(eu), self.revenue[selected].sum())
+
+        us = table.where('region', 'us')
+        selected = (self.region == 'us') & (self.recent == 1)
+        self.assertClose(decrypt(us.count()), selected.sum())
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'sales.table')
+            self.table.filter(self.recent).save(filepath)
+            table = load_table(filepath)
+
+            self.assertEqual(table.schema, self.table.schema)
+            self.assertEqual(os.listdir(directory), ['sales.table'])
+            self.assertClose(decrypt(table.sum('revenue')), self.revenue[self.recent == 1].sum())
+            counts = table.groupby('region').count()
+            self.assertClose(decrypt(counts['us']), ((self.region == 'us') & (self.recent == 1)).sum())
+
+            # Tables are not pickles
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            self.assertNotIn(b'simplefhe', data)
+            with open(filepath, 'wb') as f:
+                f.write(pickle.dumps({'version': 2}))
+            with self.assertRaises(ValueError):
+                load_table(filepath)
+
+            with self.assertRaises(TypeError):
+                encrypt_table({'a': [(1, 2)]}, categories={'a': [(1, 2)]}).save(filepath)
+
+            self.table.save(filepath)
+            initialize('crt', max_int=pow(2, 40))
+            with self.assertRaises(ValueError):
+                load_table(filepath)
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        setup_keys('crt', max_int=pow(2, 40))
+
+    def test_exact(self):
+        rng = np.random.default_rng(1)
+        group = rng.integers(0, 4, size=3000)
+        amount = rng.integers(-1000, 1000, size=3000)
+        flag = rng.integers(0, 2, size=3000)
+        table = encrypt_table({'group': group, 'amount': amount}, categories={'group': range(4)})
+        table['amount2'] = table['amount'] * table['amount'] + 1
+
+        first = np.arange(3000) < 1000
+        self.assertEqual(decrypt(table.filter(first).sum('amount')), amount[first].sum())
+
+        filtered = table.filter(encrypt_array(flag)).filter(amount > 0)
+        sums = filtered.groupby('group').sum('amount2')
+        counts = filtered.groupby('group').count()
+        for g in range(4):
+            selected = (group == g) & (flag == 1) & (amount > 0)
+            self.assertEqual(decrypt(sums[g]), (amount[selected] ** 2 + 1).sum())
+            self.assertEqual(decrypt(counts[g]), selected.sum())
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'amounts.table')
+            filtered.save(filepath)
+            table = load_table(filepath)
+        self.assertEqual(table.schema, filtered.schema)
+        sums = table.groupby('group').sum('amount2')
+        for g in range(4):
+            selected = (group == g) & (flag == 1) & (amount > 0)
+            self.assertEqual(decrypt(sums[g]), (amount[selected] ** 2 + 1).sum())
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from simplefhe.galois import trace_rotations
+from simplefhe.timeseries import encrypt_series
+
+from keygen import setup_keys
+
+
+def _lagged(x, lag):
+    return np.concatenate([np.zeros(lag, dtype=x.dtype), x[:len(x) - lag]])
+
+
+class test_float(unittest.TestCase):
+    def setUp(self):
+        setup_keys('float')
+        rng = np.random.default_rng(0)
+        # Longer than one ciphertext (4096 slots)
+        self.x = rng.uniform(-10, 10, size=9000)
+        self.series = encrypt_series(self.x, overlap=100)
+
+    def test_layout(self):
+        self.assertEqual(len(self.series.chunks), 3)
+        self.assertEqual(self.series.step, 3996)
+        np.testing.assert_allclose(self.series.decrypt(), self.x, atol=1e-3)
+
+    def test_rolling(self):
+        expected = np.convolve(self.x, np.ones(60))[:len(self.x)]
+        with trace_rotations() as steps:
+            encrypt_series([0.0] * 16, overlap=100).rolling_sum(60)
+        self.assertTrue(all(step < 0 and (-step & (-step - 1)) == 0 for step in steps))
+
+        np.testing.assert_allclose(self.series.rolling_sum(60).decrypt(), expected, atol=1e-2)
+        np.testing.assert_allclose(self.series.rolling_mean(60).decrypt(), expected / 60, atol=1e-3)
+
+    def test_diff(self):
+        expected = self.x - _lagged(self.x, 7)
+        np.testing.assert_allclose(self.series.diff(7).decrypt(), expected, atol=1e-3)
+
+    def test_convolve(self):
+        kernel = [0.5, 0, -0.25, 1.0, 0.1, 0, 0, 0, 0, 2.0]
+        expected = np.convolve(self.x, kernel)[:len(self.x)]
+        output = self.series.convolve(kernel)
+        self.assertEqual(output.lookback, 9)
+        np.testing.assert_allclose(output.decrypt(), expected, atol=1e-2)
+
+    def test_plaintext(self):
+        series = encrypt_series(np.arange(10.0), overlap=4)
+        np.testing.assert_allclose((series + np.arange(10)).decrypt(), 2 * np.arange(10), atol=1e-3)
+
+        weights = np.zeros(len(self.x))
+        weights[5000:] = np.linspace(-1, 1, len(self.x) - 5000)
+        output = (self.series * weights - self.x).diff(3)
+        expected = self.x * weights - self.x
+        np.testing.assert_allclose(output.decrypt(), expected - _lagged(expected, 3), atol=1e-3)
+
+        self.assertRaises(ValueError, lambda: series + np.arange(9))
+        self.assertRaises(ValueError, lambda: series * [[1.0]])
+
+    def test_overlap(self):
+        with self.assertRaises(ValueError):
+            self.series.rolling_sum(102)
+        with self.assertRaises(ValueError):
+            self.series.rolling_sum(60).diff(42)
+        self.series.rolling_sum(60).diff(41)
+
+
+class test_crt(unittest.TestCase):
+    def setUp(self):
+        setup_keys('crt', max_int=pow(2, 40))
+        rng = np.random.default_rng(1)
+        self.x = rng.integers(-1000, 1000, size=5000)
+
+    def test_exact(self):
+        series = encrypt_series(self.x, overlap=32)
+        squares = series * series
+        output = (squares.rolling_sum(13) - series.diff(3) * 2).decrypt()
+        expected = np.convolve(self.x ** 2, np.ones(13, dtype=int))[:len(self.x)]
+        expected -= 2 * (self.x - _lagged(self.x, 3))
+        np.testing.assert_array_equal(output, expected)
+
+        kernel = [3, -1, 0, 2]
+        expected = np.convolve(self.x, kernel)[:len(self.x)]
+        np.testing.assert_array_equal(series.convolve(kernel).decrypt(), expected)
+
+        offsets = np.arange(len(self.x))
+        np.testing.assert_array_equal((offsets - series * 3).decrypt(), offsets - 3 * self.x)